@@ -0,0 +1,127 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+from collections import namedtuple
+import numpy as np
+
+# Approximate alpha from a random sample of whole articles (Highlighter)
+# or units (Data Hunt), so a segment or rating is never separated from
+# the rest of its article or unit. Articles are sampled in batches that
+# double in size. After each batch alpha is computed from the sampled
+# coincidences, and its standard error is estimated with a delete-a-fold
+# jackknife: every sampled article belongs to one of `folds` random
+# folds, and alpha is recomputed without each fold in turn. Sampling
+# stops when the standard error is below the tolerance, when the time
+# budget runs out or when everything has been sampled.
+
+ApproximateAlpha = namedtuple(
+    'ApproximateAlpha', 'alpha standard_error groups_used group_count seconds stopped'
+)
+
+class Approximation:
+    def __init__(self, tolerance=0.01, time_budget=None, seed=None, folds=20, first_batch=200):
+        self.tolerance = tolerance
+        self.time_budget = time_budget
+        self.seed = seed
+        self.folds = folds
+        self.first_batch = first_batch
+
+    def estimate(self, group_count, fold_coincidences, alpha_of):
+        # fold_coincidences(groups, folds, fold_count) returns the
+        # coincidences of the given groups added up per fold, with the
+        # fold as first axis.
+        # alpha_of computes alpha from the added up coincidences, or an
+        # array of alphas if they are a stack of variables.
+        started = time.perf_counter()
+        rng = np.random.default_rng(self.seed)
+        order = rng.permutation(group_count)
+        fold_of = np.arange(group_count) % self.folds
+        fold_o = None
+        used = 0
+        batch = max(self.first_batch, int(np.ceil(group_count * 0.01)))
+        while True:
+            end = min(group_count, used + batch)
+            batch_o = fold_coincidences(order[used:end], fold_of[used:end], self.folds)
+            fold_o = batch_o if fold_o is None else fold_o + batch_o
+            used = end
+            seconds = time.perf_counter() - started
+            k_alpha, standard_error = self.jackknife(fold_o, used, group_count, alpha_of)
+            if used == group_count:
+                stopped = 'all units'
+            elif np.all(standard_error <= self.tolerance):
+                stopped = 'tolerance'
+            elif self.time_budget is not None and seconds >= self.time_budget:
+                stopped = 'time budget'
+            else:
+                batch = used
+                if self.time_budget is not None:
+                    # Only as many more groups as the budget left allows.
+                    remaining = (self.time_budget - seconds) * used / max(seconds, 1e-9)
+                    batch = max(1, min(batch, int(remaining)))
+                continue
+            return ApproximateAlpha(k_alpha, standard_error, used, group_count, seconds, stopped)
+
+    def jackknife(self, fold_o, used, group_count, alpha_of):
+        total_o = fold_o.sum(axis=0)
+        k_alpha = alpha_of(total_o)
+        if used == group_count:
+            return k_alpha, np.zeros_like(np.asarray(k_alpha, dtype=float))
+        folds = len(fold_o)
+        fold_alphas = np.stack([alpha_of(total_o - o) for o in fold_o])
+        with np.errstate(invalid='ignore'):
+            variance = (folds - 1) / folds * ((fold_alphas - fold_alphas.mean(axis=0)) ** 2).sum(axis=0)
+        # Finite population correction, as groups are drawn without
+        # replacement.
+        return k_alpha, np.sqrt(variance * (1 - used / group_count))
+
+def sampled_rows(group_codes, groups, group_count):
+    # Which rows belong to the sampled groups, and the position of each
+    # such row's group in groups.
+    position = np.full(group_count, -1, dtype=np.int64)
+    position[groups] = np.arange(len(groups))
+    local_codes = position[group_codes]
+    kept = local_codes >= 0
+    return local_codes[kept], kept
+
+def approximate_summary(label, estimate, unit_name):
+    return (
+        "Approximate Krippendorff alpha is {:.3f} +/- {:.3f} for '{}' "
+        "(standard error, from {:.1f}% of {}, stopped at {})"
+        .format(
+            estimate.alpha, estimate.standard_error, label,
+            100 * estimate.groups_used / max(estimate.group_count, 1), unit_name, estimate.stopped,
+        )
+    )
+
+def add_approximate_args(parser):
+    parser.add_argument(
+        '--approximate',
+        action='store_true',
+        help='Estimate alpha from a random sample of articles or units, with its standard error.')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.01,
+        help='--approximate stops sampling once the standard error is below this.')
+    parser.add_argument(
+        '--time-budget',
+        type=float,
+        metavar='SECONDS',
+        help='--approximate stops sampling a topic or question after about this many seconds.')
+
+def approximation_from_args(args):
+    if args.approximate:
+        return Approximation(tolerance=args.tolerance, time_budget=args.time_budget, seed=args.seed)
+    return None
@@ -0,0 +1,106 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import numpy as np
+from columnar import ColumnarExport, sorted_categories, CODE_DTYPE
+
+# pyarrow is only needed for Parquet and Arrow IPC (Feather) exports.
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.dataset
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Exports stored as Parquet or Arrow IPC files are read straight into a
+# ColumnarExport: only the columns a tool uses are read, and dictionary
+# encoded string columns become category codes without building a
+# string per row. Filters on categorical columns are pushed down to the
+# reader, so Parquet row groups whose statistics rule out every wanted
+# value are skipped, e.g. in files the warehouse writes sorted by
+# question. Row order is kept, as both tools depend on it.
+
+ARROW_FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'ipc', '.feather': 'ipc', '.ipc': 'ipc'}
+ARROW_ROW_GROUP_ROWS = 1 << 16
+
+def arrow_format(input_path):
+    # 'parquet' or 'ipc' for Parquet and Arrow IPC files, else None.
+    return ARROW_FORMATS.get(os.path.splitext(input_path)[1].lower())
+
+def require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("Parquet and Arrow files need pyarrow: pip install pyarrow")
+
+def load_arrow_columns(input_path, int_columns=(), categorical_columns=(), filters=None):
+    # filters maps a categorical column to the values of the rows to keep.
+    require_pyarrow()
+    dataset = pyarrow.dataset.dataset(input_path, format=arrow_format(input_path))
+    names = list(int_columns) + list(categorical_columns)
+    missing = [name for name in names if name not in dataset.schema.names]
+    if missing:
+        raise ValueError("Missing columns {} in '{}'.".format(", ".join(missing), input_path))
+    expression = None
+    for name, values in (filters or {}).items():
+        condition = pyarrow.compute.field(name).isin(list(values))
+        expression = condition if expression is None else expression & condition
+    table = dataset.to_table(columns=names, filter=expression)
+    columns = {}
+    categories = {}
+    for name in int_columns:
+        column = table.column(name)
+        if column.null_count:
+            raise ValueError("Empty values in integer column '{}' of '{}'.".format(name, input_path))
+        columns[name] = column.to_numpy().astype(np.int64)
+    for name in categorical_columns:
+        columns[name], categories[name] = arrow_categories(table.column(name))
+    return ColumnarExport(columns, categories)
+
+def arrow_categories(column):
+    # Codes into sorted category strings, like load_columns. Values that
+    # are not strings, e.g. timestamps, are cast to strings, and empty
+    # values become ''.
+    value_type = column.type.value_type if pyarrow.types.is_dictionary(column.type) else column.type
+    if column.null_count or not (pyarrow.types.is_string(value_type) or pyarrow.types.is_large_string(value_type)):
+        column = pyarrow.compute.fill_null(column.cast(pyarrow.string()), '')
+    if not pyarrow.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    # Every chunk (row group) may have its own dictionary.
+    column = pyarrow.Table.from_arrays([column], ['column']).unify_dictionaries().column(0)
+    if column.num_chunks == 0:
+        return np.zeros(0, dtype=CODE_DTYPE), np.zeros(0, dtype=str)
+    codes = np.concatenate([chunk.indices.to_numpy(zero_copy_only=False) for chunk in column.chunks])
+    names = np.array(column.chunk(0).dictionary.to_pylist(), dtype=str)
+    # Only categories some row uses, like a CSV file.
+    used, codes = np.unique(codes, return_inverse=True)
+    return sorted_categories(codes.astype(np.int64), list(names[used]))
+
+def write_arrow_columns(export, output_path, row_group_rows=ARROW_ROW_GROUP_ROWS):
+    # Categorical columns are written dictionary encoded.
+    require_pyarrow()
+    arrays = []
+    for name, values in export.columns.items():
+        if name in export.categories:
+            arrays.append(pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(values, type=pyarrow.int32()), pyarrow.array(export.categories[name].tolist())
+            ))
+        else:
+            arrays.append(pyarrow.array(values))
+    table = pyarrow.Table.from_arrays(arrays, list(export.columns))
+    if arrow_format(output_path) == 'parquet':
+        pyarrow.parquet.write_table(table, output_path, row_group_size=row_group_rows, compression='zstd')
+    else:
+        pyarrow.feather.write_feather(table, output_path, chunksize=row_group_rows)
@@ -0,0 +1,213 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import csv
+import argparse
+import resource
+import traceback
+import multiprocessing
+from collections import namedtuple
+from contextlib import closing, redirect_stdout
+from hl_to_reliability import split_highlighter, gunzip_if_needed
+from dh_to_reliability import calculate_alphas_for_datahunt
+
+# Runs many Highlighter and Data Hunt exports in one pool of forked
+# worker processes, so Python, NumPy and krippendorff are imported once.
+# Every project gets a fresh worker, optionally with a limit on its
+# address space, so one project running out of memory only fails that
+# project. The report each project prints goes to <project>.log in the
+# output directory, Highlighter uAlpha files go there too, and all
+# alphas are collected in one summary CSV.
+
+Project = namedtuple('Project', 'name kind input_file schema_file')
+
+HIGHLIGHTER_HEADER = {'article_sha256', 'start_pos', 'end_pos'}
+DATA_HUNT_HEADER = {'answer_uuid', 'quiz_task_uuid', 'contributor_uuid'}
+SCHEMA_HEADER = {'answer_label', 'question_type', 'question_uuid'}
+SUMMARY_COLUMNS = ('project', 'kind', 'variable', 'alpha', 'status', 'input_file')
+
+def find_projects(input_dir):
+    # Exports are recognized by their CSV header. Each Data Hunt export
+    # is paired with the schema whose project name is the longest prefix
+    # of the export's file name, or with the only schema there is.
+    exports = []
+    schemas = {}
+    for filename in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, filename)
+        if not (filename.endswith('.csv') or filename.endswith('.csv.gz')) or not os.path.isfile(path):
+            continue
+        header = read_header(path)
+        if SCHEMA_HEADER <= header:
+            schemas[project_name(path, suffix='-Schema')] = path
+        elif HIGHLIGHTER_HEADER <= header:
+            exports.append((path, 'highlighter'))
+        elif DATA_HUNT_HEADER <= header:
+            exports.append((path, 'datahunt'))
+    projects = []
+    for path, kind in exports:
+        schema_file = None
+        if kind == 'datahunt':
+            filename = os.path.basename(path)
+            prefixes = [name for name in schemas if filename.startswith(name)]
+            if prefixes:
+                schema_file = schemas[max(prefixes, key=len)]
+            elif len(schemas) == 1:
+                schema_file = list(schemas.values())[0]
+        projects.append(Project(project_name(path), kind, path, schema_file))
+    return projects
+
+def read_manifest(manifest_path):
+    # CSV with columns kind (highlighter or datahunt), input_file and,
+    # for Data Hunts, schema_file, plus an optional project name.
+    # Relative paths are relative to the manifest.
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    projects = []
+    with open(manifest_path, newline='') as manifest_file:
+        for row in csv.DictReader(manifest_file):
+            input_file = os.path.join(base_dir, row['input_file'])
+            schema_file = row.get('schema_file') or None
+            if schema_file:
+                schema_file = os.path.join(base_dir, schema_file)
+            name = row.get('project') or project_name(input_file)
+            projects.append(Project(name, row['kind'], input_file, schema_file))
+    return projects
+
+def read_header(path):
+    try:
+        with closing(gunzip_if_needed(path)) as csv_file:
+            return set(next(csv.reader(csv_file), []))
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return set()
+
+def project_name(path, suffix=''):
+    name = os.path.basename(path)
+    for extension in ('.gz', '.csv'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    if suffix and name.endswith(suffix):
+        name = name[:-len(suffix)]
+    return name
+
+def limit_memory(memory_mb):
+    if memory_mb:
+        limit = int(memory_mb * 2**20)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def run_project(task):
+    project, output_dir, use_cache = task
+    log_path = os.path.join(output_dir, project.name + '.log')
+    results = []
+    with open(log_path, 'w') as log_file, redirect_stdout(log_file):
+        try:
+            if project.kind == 'highlighter':
+                results = split_highlighter(
+                    project.input_file, output_dir, project.name + '-uAlpha-{}.csv', use_cache=use_cache
+                )
+            elif not project.schema_file:
+                raise ValueError("No schema file for Data Hunt export.")
+            else:
+                results = calculate_alphas_for_datahunt(
+                    project.schema_file, project.input_file, use_cache=use_cache
+                )
+            status = 'ok'
+        except MemoryError:
+            print("Stopped: the worker memory budget was exceeded.")
+            status = 'error: memory budget exceeded'
+        except Exception as error:
+            traceback.print_exc(file=log_file)
+            status = 'error: {}'.format(error)
+    return project, [(label, float(k_alpha)) for label, k_alpha in results], status
+
+def run_batch(projects, output_dir, workers=1, memory_mb=None, use_cache=True):
+    # Returns the summary rows, in the order of projects.
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(project, output_dir, use_cache) for project in projects]
+    context = multiprocessing.get_context('fork')
+    finished = {}
+    with context.Pool(workers, initializer=limit_memory, initargs=(memory_mb,), maxtasksperchild=1) as pool:
+        for project, results, status in pool.imap_unordered(run_project, tasks):
+            print("{} ({}): {}, {} alphas".format(project.name, project.kind, status, len(results)))
+            finished[project] = (results, status)
+    summary = []
+    for project in projects:
+        results, status = finished[project]
+        rows = results or [('', float('nan'))]
+        for label, k_alpha in rows:
+            summary.append({
+                'project': project.name, 'kind': project.kind, 'variable': label,
+                'alpha': k_alpha, 'status': status, 'input_file': project.input_file,
+            })
+    return summary
+
+def write_summary(summary, summary_path):
+    with open(summary_path, 'w', newline='') as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        for row in summary:
+            writer.writerow(dict(row, alpha='{:.6f}'.format(row['alpha'])))
+
+def print_summary(summary):
+    print("{:<40} {:<12} {:<30} {:>7}".format('project', 'kind', 'variable', 'alpha'))
+    for row in summary:
+        print("{:<40} {:<12} {:<30} {:>7.3f}{}".format(
+            row['project'], row['kind'], row['variable'], row['alpha'],
+            '' if row['status'] == 'ok' else '  ' + row['status']))
+
+def load_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-d', '--input-dir',
+        help='Directory of Highlighter exports, Data Hunt exports and Data Hunt schemas.')
+    parser.add_argument(
+        '-m', '--manifest',
+        help='CSV with kind, input_file, schema_file and optional project columns, instead of --input-dir.')
+    parser.add_argument(
+        '-o', '--output-dir',
+        default='.',
+        help='Directory for logs, uAlpha files and the summary.')
+    parser.add_argument(
+        '-s', '--summary-file',
+        help='Summary CSV (default: reliability-summary.csv in the output directory).')
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of worker processes.')
+    parser.add_argument(
+        '--memory-mb',
+        type=float,
+        help='Address space limit for each worker, in MB.')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always parse the CSV files instead of using or writing parse caches.')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = load_args()
+    if args.manifest:
+        projects = read_manifest(args.manifest)
+    elif args.input_dir:
+        projects = find_projects(args.input_dir)
+    else:
+        raise SystemExit("Give --input-dir or --manifest.")
+    print("Processing {} projects with {} workers.".format(len(projects), args.workers))
+    summary = run_batch(
+        projects, args.output_dir, workers=args.workers, memory_mb=args.memory_mb, use_cache=not args.no_cache
+    )
+    summary_path = args.summary_file or os.path.join(args.output_dir, 'reliability-summary.csv')
+    write_summary(summary, summary_path)
+    print_summary(summary)
+    print("Summary written to '{}'.".format(summary_path))
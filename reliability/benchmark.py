@@ -0,0 +1,185 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout
+from synthetic_exports import write_highlighter_export, write_data_hunt_export
+from hl_to_reliability import split_highlighter
+from dh_to_reliability import calculate_alphas_for_datahunt
+from profiling import profile
+
+# Times split_highlighter and calculate_alphas_for_datahunt end to end,
+# stage by stage, on synthetic exports of increasing size. Every run is
+# done in a fresh forked process, so its peak RSS is its own. Results
+# are appended to a JSON lines file together with the git commit, and
+# compared with the latest earlier result for the same run.
+
+TIERS = {
+    'small': {
+        'highlighter': {'articles': 100, 'article_length': 2000, 'raters': 5, 'topics': 4},
+        'datahunt': {'units': 500, 'raters': 5, 'questions': 10, 'checkbox_questions': 10, 'answers': 4},
+    },
+    'medium': {
+        'highlighter': {'articles': 1000, 'article_length': 4000, 'raters': 5, 'topics': 6},
+        'datahunt': {'units': 5000, 'raters': 5, 'questions': 20, 'checkbox_questions': 20, 'answers': 4},
+    },
+    'large': {
+        'highlighter': {'articles': 10000, 'article_length': 4000, 'raters': 8, 'topics': 8},
+        'datahunt': {'units': 50000, 'raters': 8, 'questions': 30, 'checkbox_questions': 30, 'answers': 5},
+    },
+}
+KINDS = ('highlighter', 'datahunt')
+
+def run_benchmark(kind, parameters, work_dir, seed=0, jobs=1):
+    # Returns the profile report of one end to end run.
+    input_path = os.path.join(work_dir, '{}.csv'.format(kind))
+    schema_path = os.path.join(work_dir, 'schema.csv')
+    report_path = os.path.join(work_dir, '{}-profile.json'.format(kind))
+    started = time.perf_counter()
+    if kind == 'highlighter':
+        rows = write_highlighter_export(input_path, seed=seed, **parameters)
+    else:
+        rows = write_data_hunt_export(schema_path, input_path, seed=seed, **parameters)
+    generate_seconds = time.perf_counter() - started
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), profile(report_path):
+        if kind == 'highlighter':
+            split_highlighter(input_path, work_dir, 'uAlpha-{}.csv', jobs=jobs, use_cache=False)
+        else:
+            calculate_alphas_for_datahunt(schema_path, input_path, jobs=jobs, use_cache=False)
+    with open(report_path) as report_file:
+        report = json.load(report_file)
+    report.update(rows=rows, generate_seconds=generate_seconds, input_bytes=os.path.getsize(input_path))
+    return report
+
+def run_in_fresh_process(kind, parameters, seed=0, jobs=1, work_dir=None):
+    # Not a Pool, whose daemonic workers could not start their own pool
+    # for jobs > 1.
+    context = multiprocessing.get_context('fork')
+    with tempfile.TemporaryDirectory(prefix='tagworks-benchmark-', dir=work_dir) as directory:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=send_benchmark, args=(sender, kind, parameters, directory, seed, jobs)
+        )
+        process.start()
+        sender.close()
+        try:
+            report, error = receiver.recv()
+        except EOFError:
+            report, error = None, "benchmark process exited with code {}".format(process.exitcode)
+        process.join()
+    if error:
+        raise RuntimeError("{} benchmark failed: {}".format(kind, error))
+    return report
+
+def send_benchmark(sender, *benchmark_args):
+    try:
+        sender.send((run_benchmark(*benchmark_args), None))
+    except Exception:
+        sender.send((None, traceback.format_exc()))
+    finally:
+        sender.close()
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_results(results_path):
+    if not os.path.exists(results_path):
+        return []
+    with open(results_path) as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+def previous_result(results, result):
+    # Latest earlier result of the same run from another commit.
+    for earlier in reversed(results):
+        same_run = all(earlier.get(key) == result[key] for key in ('kind', 'tier', 'parameters', 'seed', 'jobs'))
+        if same_run and earlier['commit'] != result['commit']:
+            return earlier
+    return None
+
+def print_result(result, earlier):
+    print("{} {}: {} rows, {:.2f}s, peak RSS {:.1f} MB"
+          .format(result['kind'], result['tier'], result['rows'], result['seconds'], result['peak_rss_mb']))
+    if earlier:
+        print("    vs {}: {:.2f}x time, {:.2f}x peak RSS".format(
+            earlier['commit'], result['seconds'] / earlier['seconds'],
+            result['peak_rss_mb'] / earlier['peak_rss_mb']))
+    for stage in result['stages']:
+        line = "    {:<28} {:>9.3f}s".format(stage['name'], stage['seconds'])
+        earlier_stage = earlier and {record['name']: record for record in earlier['stages']}.get(stage['name'])
+        if earlier_stage and earlier_stage['seconds'] > 0:
+            line += " {:>6.2f}x".format(stage['seconds'] / earlier_stage['seconds'])
+        print(line)
+
+def load_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-t', '--tiers',
+        nargs='+',
+        choices=list(TIERS),
+        default=['small'],
+        help='Size tiers to run.')
+    parser.add_argument(
+        '-k', '--kinds',
+        nargs='+',
+        choices=KINDS,
+        default=list(KINDS),
+        help='Exports to benchmark.')
+    parser.add_argument(
+        '-r', '--results-file',
+        default='benchmark-results.jsonl',
+        help='JSON lines file the results are appended to.')
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='--jobs for the benchmarked runs.')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Random seed for the synthetic exports.')
+    parser.add_argument(
+        '--work-dir',
+        help='Directory for the synthetic exports (default: system temp).')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = load_args()
+    results = load_results(args.results_file)
+    commit = git_commit()
+    for tier in args.tiers:
+        for kind in args.kinds:
+            parameters = TIERS[tier][kind]
+            report = run_in_fresh_process(kind, parameters, seed=args.seed, jobs=args.jobs, work_dir=args.work_dir)
+            result = dict(
+                report, kind=kind, tier=tier, parameters=parameters, seed=args.seed, jobs=args.jobs,
+                commit=commit, time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+            )
+            print_result(result, previous_result(results, result))
+            results.append(result)
+            with open(args.results_file, 'a') as results_file:
+                results_file.write(json.dumps(result) + "\n")
@@ -0,0 +1,77 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import numpy as np
+from coincidences import disagreement_metric
+
+# Krippendorff's bootstrap for alpha: each resample draws as many pairs
+# of values as the data has pairs within units, with the probabilities
+# of the coincidence matrix o / n. The average distance of the drawn
+# pairs is the resample's observed disagreement, and the expected
+# disagreement is kept from the data.
+# All resamples are drawn at once as one (resamples x cells) multinomial.
+
+class Bootstrap:
+    def __init__(self, resamples, seed=None, alpha_min=0.667, confidence=0.95):
+        self.resamples = resamples
+        self.seed = seed
+        self.alpha_min = alpha_min
+        self.confidence = confidence
+
+    def sample_alphas(self, o, value_domain, level_of_measurement, pairs):
+        if pairs < 1 or o.sum() < 2:
+            return np.full(self.resamples, np.nan)
+        d, expected_disagreement = disagreement_metric(o, value_domain, level_of_measurement)
+        # Clip tiny negative rounding errors before normalizing.
+        probabilities = np.clip(o.ravel(), 0, None)
+        probabilities = probabilities / probabilities.sum()
+        rng = np.random.default_rng(self.seed)
+        drawn_pairs = rng.multinomial(pairs, probabilities, size=self.resamples)
+        observed_disagreement = drawn_pairs @ d.ravel() / pairs
+        return 1 - observed_disagreement / expected_disagreement
+
+    def summary(self, o, value_domain, level_of_measurement, pairs):
+        alphas = self.sample_alphas(o, value_domain, level_of_measurement, pairs)
+        if np.isnan(alphas).all():
+            return "Bootstrap: no pairable values to resample."
+        tail = (1 - self.confidence) / 2 * 100
+        low, high = np.percentile(alphas, [tail, 100 - tail])
+        below_minimum = (alphas < self.alpha_min).mean()
+        return (
+            "Bootstrap ({} resamples): {:.0f}% CI [{:.3f}, {:.3f}] P(alpha < {}) = {:.3f}"
+            .format(self.resamples, self.confidence * 100, low, high, self.alpha_min, below_minimum)
+        )
+
+def add_bootstrap_args(parser):
+    parser.add_argument(
+        '--bootstrap',
+        type=int,
+        default=0,
+        metavar='N',
+        help='Also report a bootstrapped confidence interval for alpha from N resamples.')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=None,
+        help='Random seed for --bootstrap.')
+    parser.add_argument(
+        '--alpha-min',
+        type=float,
+        default=0.667,
+        help='Report the bootstrapped probability that alpha is below this value.')
+
+def bootstrap_from_args(args):
+    if args.bootstrap > 0:
+        return Bootstrap(args.bootstrap, seed=args.seed, alpha_min=args.alpha_min)
+    return None
@@ -0,0 +1,122 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+import os
+import csv
+import gzip
+import itertools
+import multiprocessing
+from collections import deque
+import numpy as np
+from columnar import ColumnarExport, column_indices, parse_rows, sorted_categories
+
+# Parses one large CSV export in a pool of forked worker processes.
+# The parent reads the export (decompressing gzip, including files of
+# several gzip members) and cuts it into chunks of whole records: a
+# chunk ends after a newline with an even number of quote characters
+# before it, since quotes inside a quoted field are doubled. Workers
+# parse chunks while the parent decompresses the next ones, and number
+# the strings of each categorical column in first appearance order
+# within their chunk. The parent renumbers them in chunk order, so the
+# result is the same as load_columns on the whole file.
+
+CHUNK_BYTES = 16 << 20
+NEWLINE = ord('\n')
+QUOTE = ord('"')
+ENCODING = 'utf-8'
+
+def open_binary(input_path):
+    # Raw bytes of the export, like gunzip_if_needed in text mode.
+    if os.path.splitext(input_path)[1] == '.gz':
+        return gzip.open(input_path, mode='rb')
+    return open(input_path, mode='rb')
+
+def record_ends(data):
+    # Index just past every newline of data that ends a record, for data
+    # starting at the beginning of a record.
+    data = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(data == NEWLINE)
+    quotes_before = np.searchsorted(np.flatnonzero(data == QUOTE), newlines)
+    return newlines[quotes_before % 2 == 0] + 1
+
+def record_chunks(binary_file, chunk_bytes=CHUNK_BYTES):
+    # Yields the file in chunks of whole records of about chunk_bytes.
+    pending = b''
+    while True:
+        block = binary_file.read(chunk_bytes)
+        if not block:
+            if pending:
+                yield pending
+            return
+        pending += block
+        ends = record_ends(pending)
+        if len(ends):
+            yield pending[:ends[-1]]
+            pending = pending[ends[-1]:]
+
+def split_header(chunk):
+    # The header fields and the records after the header.
+    ends = record_ends(chunk)
+    header_end = int(ends[0]) if len(ends) else len(chunk)
+    header_file = io.TextIOWrapper(io.BytesIO(chunk[:header_end]), encoding='utf-8-sig', errors='strict')
+    return next(csv.reader(header_file), []), chunk[header_end:]
+
+def parse_chunk(chunk, int_indices, categorical_indices):
+    chunk_file = io.TextIOWrapper(io.BytesIO(chunk), encoding=ENCODING, errors='strict')
+    return parse_rows(csv.reader(chunk_file), int_indices, categorical_indices)
+
+def load_columns_parallel(input_path, int_columns=(), categorical_columns=(), jobs=2, chunk_bytes=CHUNK_BYTES):
+    # Same result as load_columns(gunzip_if_needed(input_path), ...).
+    with open_binary(input_path) as binary_file:
+        chunks = record_chunks(binary_file, chunk_bytes)
+        header, first = split_header(next(chunks, b''))
+        int_indices, categorical_indices = column_indices(header, int_columns, categorical_columns)
+        second = next(chunks, None)
+        if second is None:
+            parsed = [parse_chunk(first, int_indices, categorical_indices)]
+        else:
+            chunks = itertools.chain((first, second), chunks)
+            parsed = parse_in_pool(chunks, jobs, (int_indices, categorical_indices))
+    return merge_chunks(parsed, int_columns, categorical_columns)
+
+def parse_in_pool(chunks, jobs, indices):
+    # At most two chunks per worker are waiting at a time, so the file is
+    # never held in memory as a whole.
+    parsed = []
+    waiting = deque()
+    context = multiprocessing.get_context('fork')
+    with context.Pool(jobs) as pool:
+        for chunk in chunks:
+            if len(waiting) >= 2 * jobs:
+                parsed.append(waiting.popleft().get())
+            waiting.append(pool.apply_async(parse_chunk, (chunk,) + indices))
+        while waiting:
+            parsed.append(waiting.popleft().get())
+    return parsed
+
+def merge_chunks(parsed, int_columns, categorical_columns):
+    columns = {}
+    categories = {}
+    for position, name in enumerate(int_columns):
+        columns[name] = np.concatenate([int_values[position] for int_values, code_values in parsed])
+    for position, name in enumerate(categorical_columns):
+        mapping = {}
+        codes = []
+        for int_values, code_values in parsed:
+            chunk_names, chunk_codes = code_values[position]
+            renumber = np.array([mapping.setdefault(value, len(mapping)) for value in chunk_names], dtype=np.int64)
+            codes.append(renumber[chunk_codes])
+        columns[name], categories[name] = sorted_categories(np.concatenate(codes), list(mapping))
+    return ColumnarExport(columns, categories)
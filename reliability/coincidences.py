@@ -0,0 +1,336 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from functools import lru_cache
+from collections import namedtuple
+import numpy as np
+
+# Krippendorff's alpha only depends on the reliability data through the
+# coincidence matrix, so these helpers let callers build that matrix
+# without first materializing a (raters x units) reliability matrix.
+# The distances and expected coincidences follow the krippendorff
+# package, so alphas match krippendorff.alpha.
+
+LEVELS_OF_MEASUREMENT = ('nominal', 'ordinal', 'interval', 'ratio')
+
+# Everything alpha_from_ratings computes on the way to alpha.
+RatingsAlpha = namedtuple('RatingsAlpha', 'value_counts o pairable_values pairs expected_disagreement alpha')
+
+def coincidences_from_value_counts(value_counts, weights=None):
+    # value_counts has one row per unit and one column per value.
+    # Each unit contributes (c c^T - diag(c)) / (m - 1), where m is the
+    # number of values in the unit. Units with fewer than two values
+    # are not pairable and contribute nothing.
+    # weights, if given, multiplies each unit's contribution, e.g. the
+    # number of characters a run of identical units covers.
+    value_counts = np.asarray(value_counts, dtype=float)
+    pairable = value_counts.sum(axis=1)
+    mask = pairable >= 2
+    value_counts = value_counts[mask]
+    scale = 1.0 / (pairable[mask] - 1)
+    if weights is not None:
+        scale = scale * np.asarray(weights, dtype=float)[mask]
+    o = (value_counts * scale[:, np.newaxis]).T @ value_counts
+    o -= np.diag(scale @ value_counts)
+    return o
+
+def value_counts_from_ratings(unit_codes, value_codes, value_count, unit_count=None):
+    # Number of times each value was given to each unit, one row per unit.
+    unit_codes = np.asarray(unit_codes, dtype=np.int64)
+    if unit_count is None:
+        unit_count = int(unit_codes.max()) + 1 if len(unit_codes) else 0
+    return np.bincount(
+        unit_codes * value_count + np.asarray(value_codes, dtype=np.int64),
+        minlength=unit_count * value_count,
+    ).reshape(unit_count, value_count)
+
+def missing_raters(rater_counts, minimum):
+    # Raters to add to every unit with at least one rater to bring it up
+    # to minimum, which may be given per unit.
+    return np.where((rater_counts > 0) & (rater_counts < minimum), minimum - rater_counts, 0)
+
+def add_constant_raters(value_counts, rater_counts, value_code):
+    # value_counts with rater_counts more raters per unit, all giving
+    # value_code, e.g. negative task runs. A unit's coincidences only
+    # depend on its value counts, so these raters cost the same however
+    # many there are, and need no rows or reliability matrix cells.
+    value_counts = np.array(value_counts)
+    value_counts[..., value_code] += rater_counts
+    return value_counts
+
+def compact_code_dtype(value_count):
+    # Smallest unsigned integer dtype for a reliability matrix of value
+    # codes 0 .. value_count - 1, keeping its largest value free for
+    # missing_code.
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if value_count < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError("Too many values for a reliability matrix: {}".format(value_count))
+
+def missing_code(dtype):
+    # Marks a cell with no value, in place of np.nan.
+    return np.iinfo(dtype).max
+
+def value_counts_from_codes(reliability_codes, value_count):
+    # Value counts per unit of a (raters x units) matrix of value codes.
+    rater_count, unit_count = reliability_codes.shape
+    codes = reliability_codes.ravel()
+    present = np.flatnonzero(codes != missing_code(codes.dtype))
+    return value_counts_from_ratings(present % unit_count, codes[present], value_count, unit_count)
+
+def grouped_coincidences(value_counts, group_codes, group_count, weights=None):
+    # One coincidence matrix per group of units, e.g. per article, with
+    # shape (groups, values, values). Adding them up gives
+    # coincidences_from_value_counts.
+    value_counts = np.asarray(value_counts, dtype=float)
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+    pairable = value_counts.sum(axis=1)
+    scale = np.divide(1.0, pairable - 1, out=np.zeros_like(pairable), where=pairable >= 2)
+    if weights is not None:
+        scale = scale * np.asarray(weights, dtype=float)
+    value_count = value_counts.shape[1]
+    o = np.zeros((group_count, value_count, value_count))
+    for i in range(value_count):
+        for j in range(value_count):
+            contribution = value_counts[:, i] * value_counts[:, j]
+            if i == j:
+                contribution = contribution - value_counts[:, i]
+            o[:, i, j] = np.bincount(group_codes, weights=contribution * scale, minlength=group_count)
+    return o
+
+def grouped_pair_counts(value_counts, group_codes, group_count, weights=None):
+    # pair_count for every group of units.
+    pairable = np.asarray(value_counts).sum(axis=1)
+    pairs = pairable * (pairable - 1) // 2
+    if weights is not None:
+        pairs = pairs * np.asarray(weights)
+    return np.bincount(group_codes, weights=pairs, minlength=group_count).astype(np.int64)
+
+def grouped_disagreement(value_counts, distances, group_codes, group_count, weights=None):
+    # Pairable values and observed disagreement, sum(o * d), of every
+    # group of units, without a coincidence matrix per group. A unit
+    # contributes c^T d c / (m - 1), as d is zero on the diagonal.
+    value_counts = np.asarray(value_counts, dtype=float)
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+    pairable = value_counts.sum(axis=1)
+    scale = np.divide(1.0, pairable - 1, out=np.zeros_like(pairable), where=pairable >= 2)
+    if weights is not None:
+        scale = scale * np.asarray(weights, dtype=float)
+    disagreement = ((value_counts @ distances) * value_counts).sum(axis=1) * scale
+    pairable_values = np.where(pairable >= 2, pairable, 0) * (1.0 if weights is None else np.asarray(weights))
+    return (
+        np.bincount(group_codes, weights=pairable_values, minlength=group_count),
+        np.bincount(group_codes, weights=disagreement, minlength=group_count),
+    )
+
+def pair_count(value_counts, weights=None):
+    # Number of pairs of values within units, m (m - 1) / 2 per unit.
+    pairable = np.asarray(value_counts).sum(axis=1)
+    pairs = pairable * (pairable - 1) // 2
+    if weights is not None:
+        pairs = pairs * np.asarray(weights)
+    return int(pairs.sum())
+
+def span_value_counts(starts, ends, value_codes, value_count):
+    # Sweep over the boundaries of half open [start, end) spans. Between
+    # two consecutive boundaries the number of spans carrying each value
+    # is constant, so each of those runs acts as a single unit weighted
+    # by its length. Spans from the same rater must not overlap.
+    # Returns the value counts, length and start position of every run.
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    value_codes = np.asarray(value_codes, dtype=np.int64)
+    positions = np.unique(np.concatenate((starts, ends)))
+    if len(positions) < 2:
+        return np.zeros((0, value_count)), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    start_index = np.searchsorted(positions, starts) * value_count + value_codes
+    end_index = np.searchsorted(positions, ends) * value_count + value_codes
+    size = len(positions) * value_count
+    delta = (
+        np.bincount(start_index, minlength=size)
+        - np.bincount(end_index, minlength=size)
+    ).reshape(len(positions), value_count)
+    value_counts = np.cumsum(delta, axis=0)[:-1]
+    lengths = np.diff(positions)
+    return value_counts, lengths, positions[:-1]
+
+def distance_matrix(value_domain, level_of_measurement, n_v):
+    # Squared distance between every two values of the sorted value
+    # domain. Only ordinal distances depend on the number of pairable
+    # values n_v, shape (..., values), and then have shape
+    # (..., values, values) like n_v. The others are cached per value
+    # domain.
+    if level_of_measurement == 'ordinal':
+        return ordinal_distances(n_v)
+    return fixed_distances(tuple(np.asarray(value_domain).tolist()), level_of_measurement)
+
+@lru_cache(maxsize=256)
+def fixed_distances(value_domain, level_of_measurement):
+    values = np.asarray(value_domain, dtype=float)
+    first = values[:, np.newaxis]
+    second = values[np.newaxis, :]
+    if level_of_measurement == 'nominal':
+        d = (first != second).astype(float)
+    elif level_of_measurement == 'interval':
+        d = (first - second) ** 2
+    elif level_of_measurement == 'ratio':
+        total = first + second
+        d = np.divide(first - second, total, out=np.zeros_like(total), where=total != 0) ** 2
+    else:
+        raise ValueError(
+            "Level of measurement must be one of {}, not '{}'."
+            .format(", ".join(LEVELS_OF_MEASUREMENT), level_of_measurement)
+        )
+    # Shared by every caller through the cache.
+    d.setflags(write=False)
+    return d
+
+def ordinal_distances(n_v):
+    # The pairable values from one value to the other, both included,
+    # less half of the two values' own, squared.
+    n_v = np.asarray(n_v, dtype=float)
+    indices = np.arange(n_v.shape[-1])
+    low = np.minimum.outer(indices, indices)
+    high = np.maximum.outer(indices, indices)
+    cumulative = np.concatenate((np.zeros(n_v.shape[:-1] + (1,)), np.cumsum(n_v, axis=-1)), axis=-1)
+    between = cumulative[..., high + 1] - cumulative[..., low]
+    return (between - (n_v[..., low] + n_v[..., high]) / 2) ** 2
+
+def expected_coincidences(n_v):
+    # Coincidences expected by chance, (n_v n_v^T - diag(n_v)) / (n - 1),
+    # for n_v with shape (..., values).
+    n_v = np.asarray(n_v, dtype=float)
+    n = n_v.sum(axis=-1)[..., np.newaxis, np.newaxis]
+    e = n_v[..., :, np.newaxis] * n_v[..., np.newaxis, :]
+    e -= n_v[..., np.newaxis] * np.eye(n_v.shape[-1])
+    return e / (n - 1)
+
+def alpha_from_coincidences(o, value_domain, level_of_measurement='nominal'):
+    # Also takes a stack of coincidence matrices with shape
+    # (..., values, values) and returns the alpha of each. It is nan
+    # where there is nothing to disagree on.
+    o = np.asarray(o, dtype=float)
+    n_v = o.sum(axis=-2)
+    d = distance_matrix(value_domain, level_of_measurement, n_v)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 - (o * d).sum(axis=(-2, -1)) / (expected_coincidences(n_v) * d).sum(axis=(-2, -1))
+
+def disagreement_metric(o, value_domain, level_of_measurement='nominal'):
+    # The distance between every two values and the expected
+    # disagreement per pairable value, as alpha_from_coincidences uses
+    # them, so a pair of raters' mean distance can be compared with the
+    # expected disagreement.
+    n_v = o.sum(axis=0)
+    d = distance_matrix(value_domain, level_of_measurement, n_v)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return d, (expected_coincidences(n_v) * d).sum() / n_v.sum()
+
+def alpha_from_ratings(unit_codes, value_codes, value_domain, level_of_measurement='nominal', unit_count=None):
+    # From one (unit, value) pair per cell of a reliability matrix to
+    # value counts, coincidences, the number of pairable values and of
+    # pairs, the expected disagreement per pairable value and alpha,
+    # each computed once.
+    value_counts = value_counts_from_ratings(unit_codes, value_codes, len(value_domain), unit_count)
+    o = coincidences_from_value_counts(value_counts)
+    n_v = o.sum(axis=0)
+    n = n_v.sum()
+    d = distance_matrix(value_domain, level_of_measurement, n_v)
+    expected = (expected_coincidences(n_v) * d).sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k_alpha = 1 - (o * d).sum() / expected
+        expected_disagreement = expected / n
+    return RatingsAlpha(
+        value_counts, o, int(round(n, 0)), pair_count(value_counts), expected_disagreement, k_alpha
+    )
+
+def leave_one_out_coincidences(unit_codes, rater_codes, value_codes, value_count, rater_count):
+    # Each (unit, rater, value) triple is one cell of a reliability matrix.
+    # Returns the coincidence matrix o for all ratings, plus for every
+    # rater the share of o that disappears when that rater is left out,
+    # so o - impact[r] is the coincidence matrix without rater r.
+    # Removing one value from a unit with value counts c changes the
+    # unit's contribution from C(c) to C(c - e_v), which only depends on
+    # the unit's counts, so every rater's share is one weighted bincount.
+    unit_codes = np.asarray(unit_codes, dtype=np.int64)
+    rater_codes = np.asarray(rater_codes, dtype=np.int64)
+    value_codes = np.asarray(value_codes, dtype=np.int64)
+    value_counts = value_counts_from_ratings(unit_codes, value_codes, value_count)
+    o = coincidences_from_value_counts(value_counts)
+    impact = np.zeros((rater_count, value_count, value_count))
+    for i, j, delta in leave_one_out_deltas(value_counts, unit_codes, value_codes):
+        impact[:, i, j] = np.bincount(rater_codes, weights=delta, minlength=rater_count)
+    return o, impact
+
+def grouped_leave_one_out_coincidences(
+        group_codes, unit_codes, rater_codes, value_codes, value_count, group_count, rater_count,
+        fixed_counts=None
+    ):
+    # leave_one_out_coincidences for several variables at once, e.g. the
+    # answers of a CHECKBOX question. Units must not be shared between
+    # groups. Returns o with shape (groups, values, values) and impact
+    # with shape (groups, raters, values, values).
+    # fixed_counts, if given, holds the value counts per unit of raters
+    # without ratings that are never left out (see add_constant_raters).
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+    unit_codes = np.asarray(unit_codes, dtype=np.int64)
+    rater_codes = np.asarray(rater_codes, dtype=np.int64)
+    value_codes = np.asarray(value_codes, dtype=np.int64)
+    if fixed_counts is None:
+        value_counts = value_counts_from_ratings(unit_codes, value_codes, value_count)
+    else:
+        value_counts = fixed_counts + value_counts_from_ratings(
+            unit_codes, value_codes, value_count, unit_count=len(fixed_counts)
+        )
+    unit_groups = np.zeros(len(value_counts), dtype=np.int64)
+    unit_groups[unit_codes] = group_codes
+    o = grouped_coincidences(value_counts, unit_groups, group_count)
+    impact = np.zeros((group_count, rater_count, value_count, value_count))
+    group_raters = group_codes * rater_count + rater_codes
+    for i, j, delta in leave_one_out_deltas(value_counts, unit_codes, value_codes):
+        impact[:, :, i, j] = np.bincount(
+            group_raters, weights=delta, minlength=group_count * rater_count
+        ).reshape(group_count, rater_count)
+    return o, impact
+
+def leave_one_out_deltas(value_counts, unit_codes, value_codes):
+    # For every pair of values (i, j), the change of o[i, j] when each
+    # rating is removed from its unit.
+    value_count = value_counts.shape[1]
+    counts = value_counts[unit_codes].astype(float)
+    pairable = counts.sum(axis=1)
+    scale_with = np.divide(1.0, pairable - 1, out=np.zeros_like(pairable), where=pairable >= 2)
+    scale_without = np.divide(1.0, pairable - 2, out=np.zeros_like(pairable), where=pairable >= 3)
+    for i in range(value_count):
+        count_i = counts[:, i]
+        count_i_without = count_i - (value_codes == i)
+        for j in range(value_count):
+            count_j = counts[:, j]
+            count_j_without = count_j - (value_codes == j)
+            with_rater = count_i * count_j
+            without_rater = count_i_without * count_j_without
+            if i == j:
+                with_rater -= count_i
+                without_rater -= count_i_without
+            yield i, j, with_rater * scale_with - without_rater * scale_without
+
+def binary_alpha(o):
+    # Alpha of binary variables from coincidence matrices with shape
+    # (..., 2, 2). With only two values every distance metric reduces to
+    # a constant, so this is the nominal alpha 1 - (n - 1) o01 / (n0 n1)
+    # for any level of measurement. It is nan where only one value
+    # occurs, like alpha_from_coincidences.
+    n_v = o.sum(axis=-2)
+    n = n_v.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 - (n - 1) * o[..., 0, 1] / (n_v[..., 0] * n_v[..., 1])
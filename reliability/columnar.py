@@ -0,0 +1,189 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import csv
+from array import array
+import numpy as np
+
+# TagWorks exports are read into one typed array per column instead of
+# one dict per row. Integer columns hold int64 values. String columns
+# that are only compared or grouped (uuids, hashes, names, timestamps)
+# are stored as int32 codes into a sorted array of categories, so code
+# order is the same as string order.
+
+CODE_DTYPE = np.int32
+
+class UnknownLabelError(ValueError):
+    # A topic or question asked for by name that the export or schema
+    # does not have.
+    pass
+
+class ColumnarExport:
+    def __init__(self, columns, categories):
+        # columns maps a column name to an array with one entry per row.
+        # categories maps a categorical column name to its strings,
+        # indexed by code.
+        self.columns = columns
+        self.categories = categories
+
+    def __len__(self):
+        for values in self.columns.values():
+            return len(values)
+        return 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __setitem__(self, name, values):
+        self.columns[name] = values
+
+    def take(self, indices):
+        # Subset of rows. Categories are shared with the parent.
+        columns = {name: values[indices] for name, values in self.columns.items()}
+        return ColumnarExport(columns, self.categories)
+
+    def append(self, columns):
+        # Append rows given as a dict of arrays for every column.
+        for name in self.columns:
+            self.columns[name] = np.concatenate(
+                (self.columns[name], np.asarray(columns[name], dtype=self.columns[name].dtype))
+            )
+
+    def decode(self, name, codes=None):
+        if codes is None:
+            codes = self.columns[name]
+        return self.categories[name][codes]
+
+    def encode(self, name, value):
+        # Code for a category, adding it if needed. Categories added this
+        # way go after the loaded ones, so they do not keep string order.
+        found = np.flatnonzero(self.categories[name] == value)
+        if len(found):
+            return found[0]
+        self.categories[name] = np.append(self.categories[name], value)
+        return len(self.categories[name]) - 1
+
+def load_columns(csv_file, int_columns=(), categorical_columns=()):
+    # Only the requested columns are kept. Every distinct string is
+    # stored once, however many rows repeat it.
+    reader = csv.reader(csv_file)
+    header = next(reader, [])
+    int_indices, categorical_indices = column_indices(header, int_columns, categorical_columns)
+    int_values, code_values = parse_rows(reader, int_indices, categorical_indices)
+    columns = {}
+    categories = {}
+    for name, values in zip(int_columns, int_values):
+        columns[name] = values
+    for name, (names, codes) in zip(categorical_columns, code_values):
+        columns[name], categories[name] = sorted_categories(codes, names)
+    return ColumnarExport(columns, categories)
+
+def column_indices(header, int_columns, categorical_columns):
+    missing = [name for name in list(int_columns) + list(categorical_columns) if name not in header]
+    if missing:
+        raise ValueError("Missing columns {} in CSV header.".format(", ".join(missing)))
+    return [header.index(name) for name in int_columns], [header.index(name) for name in categorical_columns]
+
+def parse_rows(reader, int_indices, categorical_indices):
+    # Returns an int64 array for every int column, and for every
+    # categorical column its strings in first appearance order with the
+    # int64 code of every row into them.
+    int_values = [(index, array('q')) for index in int_indices]
+    code_values = [(index, {}, array('q')) for index in categorical_indices]
+    for row in reader:
+        for index, values in int_values:
+            values.append(int(row[index]))
+        for index, mapping, codes in code_values:
+            value = row[index]
+            code = mapping.get(value)
+            if code is None:
+                code = mapping[value] = len(mapping)
+            codes.append(code)
+    return (
+        [np.frombuffer(values, dtype=np.int64).copy() for index, values in int_values],
+        [(list(mapping), np.frombuffer(codes, dtype=np.int64)) for index, mapping, codes in code_values],
+    )
+
+def filter_rows(export, filters):
+    # Rows whose categorical columns hold one of the given values, for
+    # every column in filters. Categories that no row left uses are
+    # dropped, as if the rows had been read from a smaller file.
+    if not filters:
+        return export
+    keep = np.ones(len(export), dtype=bool)
+    for name, values in filters.items():
+        codes = np.flatnonzero(np.isin(export.categories[name], list(values)))
+        keep &= np.isin(export[name], codes)
+    rows = export.take(np.flatnonzero(keep))
+    categories = {}
+    for name, names in export.categories.items():
+        used, codes = np.unique(rows[name], return_inverse=True)
+        rows[name] = codes.astype(CODE_DTYPE)
+        categories[name] = names[used]
+    return ColumnarExport(rows.columns, categories)
+
+def sorted_categories(codes, names):
+    # Renumber codes given in first appearance order so that they follow
+    # the sorted order of the category strings.
+    names = np.array(names, dtype=str)
+    order = np.argsort(names, kind='stable')
+    rank = np.empty(len(names), dtype=CODE_DTYPE)
+    rank[order] = np.arange(len(names), dtype=CODE_DTYPE)
+    return rank[codes], names[order]
+
+def group_starts(sorted_keys):
+    # Index of the first row of every run of equal keys in sorted_keys.
+    if len(sorted_keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+
+def pair_codes(first, second):
+    # Combine two non negative code arrays into one int64 key that sorts
+    # by first, then second.
+    second = np.asarray(second, dtype=np.int64)
+    width = int(second.max()) + 1 if len(second) else 1
+    return np.asarray(first, dtype=np.int64) * width + second
+
+def first_appearance_order(codes):
+    # Distinct codes, ordered by the row where each first appears.
+    distinct, first_rows = np.unique(codes, return_index=True)
+    return distinct[np.argsort(first_rows, kind='stable')]
+
+def sequence_raters(unit_codes, rater_codes, created_codes):
+    # Number the raters of each unit 0, 1, 2... in the order of their
+    # first row by created time, ties broken by row order. Returns the
+    # sequence id for every row and the largest number of raters of
+    # any unit.
+    if len(unit_codes) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    order = np.lexsort((np.arange(len(unit_codes)), created_codes, unit_codes))
+    pairs = pair_codes(unit_codes, rater_codes)
+    # np.unique returns the first index in sorted-by-created order.
+    distinct_pairs, first_index, inverse = np.unique(
+        pairs[order], return_index=True, return_inverse=True
+    )
+    first_index_order = np.argsort(first_index, kind='stable')
+    pair_units = unit_codes[order][first_index[first_index_order]]
+    starts = group_starts(pair_units)
+    sizes = np.diff(np.append(starts, len(pair_units)))
+    pair_sequence = np.empty(len(distinct_pairs), dtype=np.int64)
+    pair_sequence[first_index_order] = np.arange(len(pair_units)) - np.repeat(starts, sizes)
+    sequence = np.empty(len(unit_codes), dtype=np.int64)
+    sequence[order] = pair_sequence[inverse]
+    return sequence, int(sizes.max())
+
+def last_rows(keys):
+    # Index of the last row for every distinct key, in row order.
+    distinct, last_from_end = np.unique(keys[::-1], return_index=True)
+    return np.sort(len(keys) - 1 - last_from_end)
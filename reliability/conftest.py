@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The reliability scripts import their sibling modules directly, the same
+# way they do when run as `python3 reliability/<script>.py`.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -18,14 +18,43 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 import argparse
 import gzip
-from contextlib import closing
-import csv
+from contextlib import ExitStack
 import re
-from collections import defaultdict, OrderedDict
+from collections import defaultdict, OrderedDict, namedtuple
 from operator import itemgetter
-from itertools import groupby, chain
+from functools import partial
+from itertools import groupby
 import numpy as np
-from krippendorff.krippendorff import alpha, _coincidences, _reliability_data_to_value_counts
+from coincidences import (
+    leave_one_out_coincidences, alpha_from_coincidences, value_counts_from_ratings,
+    coincidences_from_value_counts, pair_count, compact_code_dtype, missing_code,
+    grouped_coincidences, grouped_pair_counts,
+    grouped_leave_one_out_coincidences, binary_alpha, disagreement_metric, grouped_disagreement,
+    alpha_from_ratings, missing_raters, add_constant_raters,
+)
+from bootstrap import add_bootstrap_args, bootstrap_from_args
+from approximate import add_approximate_args, approximation_from_args, approximate_summary, sampled_rows
+from pairwise import (
+    add_rater_pair_args, rating_rater_pairs, rater_pair_table, concatenate_tables, write_rater_pairs,
+    print_rater_pair_summary,
+)
+from diagnostics import (
+    add_diagnostic_args, unit_diagnostic_table, concatenate_diagnostics, write_unit_diagnostics,
+    print_unit_diagnostics,
+)
+from pruning import IncrementalImpact, add_pruning_args, pruning_from_args
+from windowed import (
+    add_window_args, windows_from_args, group_times, print_undated, window_rows, print_window_rows, write_window_rows,
+)
+from columnar import (
+    load_columns, pair_codes, first_appearance_order, last_rows, sequence_raters, UnknownLabelError,
+)
+from parallel import run_in_order
+from parse_cache import load_columns_cached
+from arrow_io import arrow_format
+from streaming import partitioned_csv, open_partition, DEFAULT_PARTITIONS
+from incremental import load_state, save_state, changed_groups, watermark_of
+from profiling import stage, record_arrays, add_profile_args, profile_from_args
 
 ANSWER_LABEL_RE = re.compile(
     r'\s*T(?P<topic_number>\d+)\.'
@@ -33,12 +62,11 @@ ANSWER_LABEL_RE = re.compile(
     r'A(?P<answer_number>\d+)'
 )
 
-def calc_pairable_values(reliability_data, value_domain):
-    value_domain = np.asarray(value_domain)
-    value_counts = _reliability_data_to_value_counts(reliability_data, value_domain)
-    o = _coincidences(value_counts, value_domain, dtype=float)
-    pairable_values = int(round(o.sum(), 0))
-    return pairable_values
+DATA_HUNT_CATEGORICAL_COLUMNS = ('answer_uuid', 'quiz_task_uuid', 'contributor_uuid', 'created')
+SCHEMA_COLUMNS = (
+    'answer_uuid', 'answer_label', 'question_type', 'question_label',
+    'question_uuid', 'alpha_distance', 'question_text',
+)
 
 # This code takes a Data Hunt Schema file and Data Hunt data file and
 # organizes it into reliability matrices to calculate Krippendorff's alpha.
@@ -50,11 +78,12 @@ def calc_pairable_values(reliability_data, value_domain):
 # to a RADIO question are grouped together for comparison.
 # We ignore TEXT answers.
 
-# In the case of CHECKBOX questions, it gathers just the one
-# schema row for the answer, since each CHECKBOX is analyzed
-# in isolation.
+# In the case of CHECKBOX questions, each answer is analyzed in
+# isolation as a binary variable: chosen or not chosen.
 # DataHunt CSVs currently do not include enough information to
-# determine or infer if a checkbox was not shown vs. not chosen.
+# determine if a checkbox was not shown vs. not chosen, so a rater
+# is taken to have seen all answers of a question in a unit if
+# they chose at least one of them.
 
 # This class gathers the data for the reliability matrix for
 # RADIO questions. It gathers the schema rows
@@ -73,95 +102,725 @@ class RadioVariable:
             answer_uuid = row['answer_uuid']
             answer_number = row['answer_number']
             self.values_map[answer_uuid] = int(answer_number)
-        self.data_rows = []
-
-    def add_data_row(self, data_row):
-        # Make a copy
-        data_row = dict(data_row)
-        answer_uuid = data_row['answer_uuid']
-        if answer_uuid in self.values_map:
-            self.data_rows.append(data_row)
+        self.data = None
+
+    def add_data(self, data):
+        # data holds this question's rows of the Data Hunt export.
+        answer_uuids = data.decode('answer_uuid', np.unique(data['answer_uuid']))
+        for answer_uuid in answer_uuids:
+            if answer_uuid not in self.values_map:
+                raise Exception(
+                    "Data row with answer_uuid {} does not belong to {}."
+                    .format(answer_uuid, self.label)
+                )
+        if self.data is None:
+            self.data = data
         else:
-            raise Exception(
-                "Data row with answer_uuid {} does not belong to {}."
-                .format(answer_uuid, self.label)
-            )
+            self.data.append(data.columns)
+
+    def answer_numbers(self):
+        # Answer number for each answer_uuid code of the export.
+        answer_uuids = self.data.categories['answer_uuid']
+        return np.array([self.values_map.get(answer_uuid, -1) for answer_uuid in answer_uuids], dtype=np.int64)
 
     def alpha_for_question(self, raters_to_exclude=set()):
-        reliability_data = self.to_reliability(raters_to_exclude=raters_to_exclude)
+        return self.ratings_alpha(raters_to_exclude).alpha
+
+    def print_alpha_for_question(self, raters_to_exclude=set(), bootstrap=None, diagnostics=None):
+        # With a diagnostics list, the unit diagnostic tables of the
+        # question are added to it from the value counts of its alpha.
         value_domain = sorted(self.values_map.values())
-        k_alpha = alpha(
-            reliability_data=reliability_data,
-            value_domain=value_domain,
-            level_of_measurement=self.alpha_distance
+        ratings_alpha = self.ratings_alpha(raters_to_exclude)
+        unit_columns, total_units = self.unit_columns()
+        maximum_raters = self.maximum_raters()
+        print_question_alpha(
+            self, total_units, maximum_raters, ratings_alpha.pairable_values, ratings_alpha.alpha, value_domain
         )
-        return k_alpha
+        if bootstrap:
+            print(bootstrap.summary(ratings_alpha.o, value_domain, self.alpha_distance, ratings_alpha.pairs))
+        if diagnostics is not None:
+            with stage('unit_diagnostics'):
+                diagnostics.extend(self.unit_diagnostics(ratings_alpha.value_counts, ratings_alpha.o))
+        return [(self.label, ratings_alpha.alpha)]
+
+    def ratings_alpha(self, raters_to_exclude=set()):
+        # Value counts, coincidences and alpha straight from the ratings,
+        # without a reliability matrix.
+        value_domain = sorted(self.values_map.values())
+        unit_codes, contributor_codes, value_codes = self.encode_ratings(value_domain, raters_to_exclude)
+        unit_columns, total_units = self.unit_columns()
+        return alpha_from_ratings(unit_codes, value_codes, value_domain, self.alpha_distance, unit_count=total_units)
+
+    def maximum_raters(self):
+        # Most raters of any unit, counting raters that are excluded,
+        # like the rows of to_reliability.
+        unit_columns, total_units = self.unit_columns()
+        return int(np.bincount(unit_columns[self.cell_rows()]).max()) if total_units else 0
 
-    def print_alpha_for_question(self, raters_to_exclude=set()):
-        reliability_data = self.to_reliability(raters_to_exclude=raters_to_exclude)
+    def approximate_alpha(self, approximation):
+        # Samples whole units of the question.
         value_domain = sorted(self.values_map.values())
-        pairable_values = calc_pairable_values(reliability_data, value_domain)
-        k_alpha = alpha(
-            reliability_data=reliability_data,
-            value_domain=value_domain,
-            level_of_measurement=self.alpha_distance
+        unit_codes, contributor_codes, value_codes = self.encode_ratings(value_domain)
+        unit_columns, total_units = self.unit_columns()
+        return approximation.estimate(
+            total_units,
+            partial(radio_fold_coincidences, unit_codes, value_codes, len(value_domain), total_units),
+            partial(alpha_from_coincidences, value_domain=value_domain, level_of_measurement=self.alpha_distance),
         )
-        maximum_raters = reliability_data.shape[0]
-        total_units = reliability_data.shape[1]
-        print("----{}".format(self.label))
-        print("{}".format(self.question_text))
-        print("Units: {} Max raters: {} Pairable values: {}"
-              .format(total_units, maximum_raters, pairable_values)
+
+    def print_approximate_alpha(self, approximation):
+        estimate = self.approximate_alpha(approximation)
+        print(approximate_summary(self.label, estimate, 'units'))
+        return [(self.label, estimate.alpha)]
+
+    def bucket_coincidences(self, unit_buckets, bucket_count):
+        # Coincidences with shape (buckets x values x values) and the
+        # number of units in every time bucket, given the bucket of every
+        # quiz_task_uuid code.
+        value_domain = sorted(self.values_map.values())
+        unit_codes, contributor_codes, value_codes = self.encode_ratings(value_domain)
+        column_buckets = unit_buckets[first_appearance_order(self.data['quiz_task_uuid'])]
+        value_counts = value_counts_from_ratings(
+            unit_codes, value_codes, len(value_domain), unit_count=len(column_buckets)
         )
-        print("Krippendorff alpha for '{}' is {:.3f} Alpha distance: {} Value domain: {}"
-              .format(self.label, k_alpha, self.alpha_distance, value_domain)
+        # Units without a created time are in no bucket.
+        dated = column_buckets >= 0
+        o = grouped_coincidences(value_counts[dated], column_buckets[dated], bucket_count)
+        return o, np.bincount(column_buckets[dated], minlength=bucket_count)
+
+    def window_alphas(self, window_o):
+        # (label, alpha of every window) for every variable of the question.
+        value_domain = sorted(self.values_map.values())
+        return [(self.label, alpha_from_coincidences(window_o, value_domain, self.alpha_distance))]
+
+    def incremental_impacts(self, rater_count):
+        # (label, IncrementalImpact) for every variable of the question,
+        # for RaterPruning.
+        value_domain = sorted(self.values_map.values())
+        unit_codes, contributor_codes, value_codes = self.encode_ratings(value_domain)
+        alphas_of = partial(alpha_from_coincidences, value_domain=value_domain, level_of_measurement=self.alpha_distance)
+        return [(self.label, IncrementalImpact(
+            unit_codes, contributor_codes, value_codes, len(value_domain), rater_count, alphas_of
+        ))]
+
+    def rater_pairs(self):
+        # (label, values shared and disagreement of every two raters,
+        # expected disagreement) for every variable of the question.
+        value_domain = sorted(self.values_map.values())
+        unit_codes, contributor_codes, value_codes = self.encode_ratings(value_domain)
+        value_counts = value_counts_from_ratings(unit_codes, value_codes, len(value_domain))
+        d, expected_disagreement = disagreement_metric(
+            coincidences_from_value_counts(value_counts), value_domain, self.alpha_distance
         )
+        pairs = rating_rater_pairs(unit_codes, contributor_codes, value_codes, d)
+        return [(self.label, pairs, expected_disagreement)]
+
+    def unit_diagnostics(self, value_counts=None, o=None):
+        # Unit diagnostic table of every variable of the question, from
+        # the value counts and coincidences of its alpha if given, with
+        # one row of value counts per unit in unit_columns order.
+        value_domain = sorted(self.values_map.values())
+        unit_columns, total_units = self.unit_columns()
+        if value_counts is None:
+            ratings_alpha = self.ratings_alpha()
+            value_counts, o = ratings_alpha.value_counts, ratings_alpha.o
+        d, expected_disagreement = disagreement_metric(o, value_domain, self.alpha_distance)
+        pairable, disagreement = grouped_disagreement(value_counts, d, np.arange(len(value_counts)), total_units)
+        return [unit_diagnostic_table(self.label, self.unit_names(), pairable, disagreement, expected_disagreement)]
+
+    def unit_names(self):
+        # quiz_task_uuid of every unit, in unit_columns order.
+        return self.data.decode('quiz_task_uuid', first_appearance_order(self.data['quiz_task_uuid']))
 
     def to_reliability(self, raters_to_exclude=set()):
-        dtype=float
-        unit_dict = defaultdict(list)
-        for data_row in self.data_rows:
-            quiz_task_uuid = data_row['quiz_task_uuid']
-            unit_dict[quiz_task_uuid].append(data_row)
-        total_units = len(unit_dict)
-        maximum_raters = self.seq_raters_per_unit(unit_dict)
-        reliability_data = np.full((maximum_raters, total_units), np.nan, dtype=dtype)
-        for column, rows in enumerate(unit_dict.values()):
-            for row in rows:
-                contributor_uuid = row['contributor_uuid']
-                if contributor_uuid in raters_to_exclude:
-                    continue
-                user_sequence_id = row['user_sequence_id']
-                value = self.values_map[row['answer_uuid']]
-                reliability_data[user_sequence_id][column] = value
-        return reliability_data
-
-    def seq_raters_per_unit(self, unit_dict):
+        # Cells hold the index of the answer number in the sorted value
+        # domain, or missing_code(dtype) if the rater did not answer.
+        value_domain = sorted(self.values_map.values())
+        dtype = compact_code_dtype(len(value_domain))
+        unit_columns, total_units = self.unit_columns()
         # Number each task run ordered by time submitted for that task.
         # Because of case numbers, rows may repeat for the same rater.
         # The answer_uuid's won't conflict so will be flattened by
         # assigning consistent rater sequence id.
-        maximum_raters = 0
-        for quiz_task_uuid, rows in unit_dict.items():
-            rater_map = {}
-            counter = 0
-            sortkey = itemgetter('created')
-            rows_by_date = sorted(rows, key=sortkey)
-            for row in rows_by_date:
-                contributor_uuid = row['contributor_uuid']
-                if contributor_uuid not in rater_map:
-                    rater_map[contributor_uuid] = counter
-                    counter += 1
-            for row in rows:
-                row['user_sequence_id'] = rater_map[row['contributor_uuid']]
-            maximum_raters = max(counter, maximum_raters)
-        return maximum_raters
+        user_sequence_ids, maximum_raters = sequence_raters(
+            self.data['quiz_task_uuid'], self.data['contributor_uuid'], self.data['created']
+        )
+        reliability_codes = np.full((maximum_raters, total_units), missing_code(dtype), dtype=dtype)
+        cells = self.without_raters(self.cell_rows(), raters_to_exclude)
+        values = self.answer_numbers()[self.data['answer_uuid'][cells]]
+        reliability_codes[user_sequence_ids[cells], unit_columns[cells]] = np.searchsorted(value_domain, values)
+        return reliability_codes
+
+    def unit_columns(self):
+        # Reliability matrix column of every row: units are numbered in
+        # the order they first appear in the export.
+        unit_codes = self.data['quiz_task_uuid']
+        units = first_appearance_order(unit_codes)
+        column_of_unit = np.zeros(len(self.data.categories['quiz_task_uuid']), dtype=np.int64)
+        column_of_unit[units] = np.arange(len(units))
+        return column_of_unit[unit_codes], len(units)
+
+    def cell_rows(self):
+        # A rater that answered a unit more than once keeps the last
+        # answer, so only the last row per (unit, rater) fills a cell.
+        return last_rows(pair_codes(self.data['quiz_task_uuid'], self.data['contributor_uuid']))
+
+    def without_raters(self, rows, raters_to_exclude):
+        excluded = np.isin(self.data.categories['contributor_uuid'], list(raters_to_exclude))
+        return rows[~excluded[self.data['contributor_uuid'][rows]]]
+
+    def rater_impact(self):
+        # Alpha with all raters, and alpha without each rater, from a
+        # single pass over the ratings instead of one alpha per rater.
+        value_domain = sorted(self.values_map.values())
+        value_counts, o, impact, raters = self.rater_coincidences()
+        return impact_alphas(o, impact, raters, value_domain, self.alpha_distance)
+
+    def rater_impacts(self):
+        # (label, alpha with all raters, alpha without each rater) for
+        # every variable of the question, here just the one.
+        return [(self.label,) + self.rater_impact()]
+
+    def rater_coincidences(self):
+        # Value counts per unit, the coincidence matrix, each rater's
+        # share of it and the contributor_uuid of each rater.
+        value_domain = sorted(self.values_map.values())
+        unit_codes, contributor_codes, value_codes = self.encode_ratings(value_domain)
+        raters, rater_codes = np.unique(contributor_codes, return_inverse=True)
+        value_counts = value_counts_from_ratings(unit_codes, value_codes, len(value_domain))
+        o, impact = leave_one_out_coincidences(
+            unit_codes, rater_codes, value_codes, len(value_domain), len(raters)
+        )
+        return value_counts, o, impact, self.data.decode('contributor_uuid', raters)
+
+    def encode_ratings(self, value_domain, raters_to_exclude=set()):
+        # One (unit, contributor, value) triple per cell of to_reliability.
+        unit_columns, total_units = self.unit_columns()
+        cells = self.without_raters(self.cell_rows(), raters_to_exclude)
+        values = self.answer_numbers()[self.data['answer_uuid'][cells]]
+        value_codes = np.searchsorted(value_domain, values)
+        return unit_columns[cells], self.data['contributor_uuid'][cells], value_codes
 
     def unique_raters(self):
-        raters = set()
-        for row in self.data_rows:
-            raters.add(row['contributor_uuid'])
-        return raters
+        return set(self.data.decode('contributor_uuid', np.unique(self.data['contributor_uuid'])))
+
+
+def radio_fold_coincidences(unit_codes, value_codes, value_count, unit_count, units, folds, fold_count):
+    # Coincidences of the sampled units added up per fold.
+    local_codes, kept = sampled_rows(unit_codes, units, unit_count)
+    value_counts = value_counts_from_ratings(local_codes, value_codes[kept], value_count, unit_count=len(units))
+    return grouped_coincidences(value_counts, folds, fold_count)
+
+def impact_alphas(o, impact, raters, value_domain, alpha_distance):
+    alpha_with_all = alpha_from_coincidences(o, value_domain, alpha_distance)
+    alpha_without = {}
+    for contributor_uuid, rater_impact in zip(raters, impact):
+        alpha_without[contributor_uuid] = alpha_from_coincidences(
+            o - rater_impact, value_domain, alpha_distance
+        )
+    return alpha_with_all, alpha_without
+
+def print_question_alpha(variable, total_units, maximum_raters, pairable_values, k_alpha, value_domain):
+    print("----{}".format(variable.label))
+    print("{}".format(variable.question_text))
+    print("Units: {} Max raters: {} Pairable values: {}"
+          .format(total_units, maximum_raters, pairable_values)
+    )
+    print("Krippendorff alpha for '{}' is {:.3f} Alpha distance: {} Value domain: {}"
+          .format(variable.label, k_alpha, variable.alpha_distance, value_domain)
+    )
+
+# Running totals of a RadioVariable's coincidences, added up over
+# partitions of an export that is too large to load at once. Units
+# must not be split between partitions.
+class RadioTotals:
+    def __init__(self, variable):
+        self.label = variable.label
+        self.question_uuid = variable.question_uuid
+        self.alpha_distance = variable.alpha_distance
+        self.question_text = variable.question_text
+        self.value_domain = sorted(variable.values_map.values())
+        value_count = len(self.value_domain)
+        self.o = np.zeros((value_count, value_count))
+        self.impact = {}
+        self.total_units = 0
+        self.maximum_raters = 0
+        self.pairs = 0
+
+    def add(self, variable):
+        value_counts, o, impact, raters = variable.rater_coincidences()
+        self.o += o
+        self.total_units += len(value_counts)
+        if len(value_counts):
+            self.maximum_raters = max(self.maximum_raters, int(value_counts.sum(axis=1).max()))
+        self.pairs += pair_count(value_counts)
+        for contributor_uuid, rater_impact in zip(raters, impact):
+            self.impact[contributor_uuid] = self.impact.get(contributor_uuid, 0) + rater_impact
+
+    def print_alpha_for_question(self, bootstrap=None):
+        k_alpha = alpha_from_coincidences(self.o, self.value_domain, self.alpha_distance)
+        pairable_values = int(round(self.o.sum(), 0))
+        print_question_alpha(
+            self, self.total_units, self.maximum_raters, pairable_values, k_alpha, self.value_domain
+        )
+        if bootstrap:
+            print(bootstrap.summary(self.o, self.value_domain, self.alpha_distance, self.pairs))
+        return [(self.label, k_alpha)]
+
+    def rater_impact(self):
+        return impact_alphas(
+            self.o, self.impact.values(), self.impact.keys(), self.value_domain, self.alpha_distance
+        )
+
+    def rater_impacts(self):
+        return [(self.label,) + self.rater_impact()]
+
+    def unique_raters(self):
+        return set(self.impact)
+
+
+# RadioTotals that also keeps every cell (unit, contributor, value) it
+# was given, so the units of a newer export that changed can be taken
+# out again before their new rows are added. Used by --update.
+class RadioState(RadioTotals):
+    def __init__(self, variable):
+        super().__init__(variable)
+        self.units = np.zeros(0, dtype=str)
+        self.contributors = np.zeros(0, dtype=str)
+        self.values = np.zeros(0, dtype=np.int64)
+
+    def add(self, variable):
+        super().add(variable)
+        cells = variable.cell_rows()
+        values = variable.answer_numbers()[variable.data['answer_uuid'][cells]]
+        self.units = np.concatenate(
+            (self.units, variable.data.decode('quiz_task_uuid', variable.data['quiz_task_uuid'][cells]))
+        )
+        self.contributors = np.concatenate(
+            (self.contributors, variable.data.decode('contributor_uuid', variable.data['contributor_uuid'][cells]))
+        )
+        self.values = np.concatenate((self.values, np.searchsorted(self.value_domain, values)))
+        self.count_units()
+
+    def remove_units(self, unit_names):
+        # Subtract the coincidences of these units, computed from their
+        # stored cells the same way add computed them.
+        removed = np.isin(self.units, unit_names)
+        if not removed.any():
+            return
+        units, unit_codes = np.unique(self.units[removed], return_inverse=True)
+        raters, rater_codes = np.unique(self.contributors[removed], return_inverse=True)
+        value_codes = self.values[removed]
+        value_count = len(self.value_domain)
+        o, impact = leave_one_out_coincidences(unit_codes, rater_codes, value_codes, value_count, len(raters))
+        self.o -= o
+        self.pairs -= pair_count(value_counts_from_ratings(unit_codes, value_codes, value_count))
+        for contributor_uuid, rater_impact in zip(raters.tolist(), impact):
+            self.impact[contributor_uuid] = self.impact[contributor_uuid] - rater_impact
+        self.units = self.units[~removed]
+        self.contributors = self.contributors[~removed]
+        self.values = self.values[~removed]
+        # Raters with no cells left no longer count.
+        remaining = set(self.contributors.tolist())
+        self.impact = {uuid: impact for uuid, impact in self.impact.items() if uuid in remaining}
+        self.count_units()
+
+    def count_units(self):
+        units, unit_codes = np.unique(self.units, return_inverse=True)
+        self.total_units = len(units)
+        self.maximum_raters = int(np.bincount(unit_codes).max()) if len(units) else 0
+
+    def state_arrays(self, prefix):
+        value_count = len(self.value_domain)
+        return {
+            prefix + 'o': self.o,
+            prefix + 'raters': np.array(list(self.impact), dtype=str),
+            prefix + 'impact': np.array(list(self.impact.values())).reshape(-1, value_count, value_count),
+            prefix + 'pairs': np.array(self.pairs),
+            prefix + 'units': self.units,
+            prefix + 'contributors': self.contributors,
+            prefix + 'values': self.values,
+        }
+
+    def restore(self, arrays, prefix):
+        self.o = arrays[prefix + 'o']
+        self.impact = dict(zip(arrays[prefix + 'raters'].tolist(), arrays[prefix + 'impact']))
+        self.pairs = int(arrays[prefix + 'pairs'])
+        self.units = arrays[prefix + 'units']
+        self.contributors = arrays[prefix + 'contributors']
+        self.values = arrays[prefix + 'values']
+        self.count_units()
+
+
+CheckboxAnswer = namedtuple('CheckboxAnswer', 'label question_text alpha_distance')
+
+# This class gathers the data for all answers of a CHECKBOX question.
+# Every answer is a binary variable, and all answers are built and
+# scored together: as a stacked (answers x raters x units) reliability
+# matrix, or, for alpha, as value counts with shape
+# (answers x units x 2) computed directly from the rows.
+# Data handling is the same as for RADIO questions, except that
+# values_map maps each answer_uuid to its index among the answers.
+class CheckboxVariable(RadioVariable):
+    def __init__(self, schema_rows):
+        schema_rows = sorted(schema_rows, key=itemgetter('answer_number'))
+        super().__init__(schema_rows)
+        self.values_map = {row['answer_uuid']: index for index, row in enumerate(schema_rows)}
+        self.answers = [
+            CheckboxAnswer(row['answer_label'], self.question_text, self.alpha_distance)
+            for row in schema_rows
+        ]
+        # Units seen by fewer raters are brought up to this many with
+        # implicit raters that chose none of the answers, like negative
+        # task runs (see checkbox_value_counts).
+        self.minimum_redundancy = 0
+
+    def print_alpha_for_question(self, raters_to_exclude=set(), bootstrap=None, diagnostics=None):
+        unit_codes, contributor_codes, chosen = self.encode_ratings(raters_to_exclude=raters_to_exclude)
+        value_counts = checkbox_value_counts(unit_codes, chosen, minimum_redundancy=self.minimum_redundancy)
+        if self.minimum_redundancy:
+            padded_units = np.count_nonzero(missing_raters(np.bincount(unit_codes), self.minimum_redundancy))
+            print(
+                "Added negative raters to {} units of '{}' to bring up to {} raters."
+                .format(padded_units, self.label, self.minimum_redundancy)
+            )
+        o, pairs = checkbox_coincidences(value_counts)
+        maximum_raters = int(value_counts[0].sum(axis=1).max()) if value_counts.shape[1] else 0
+        results = print_checkbox_alphas(self.answers, value_counts.shape[1], maximum_raters, o, pairs, bootstrap)
+        if diagnostics is not None:
+            with stage('unit_diagnostics'):
+                diagnostics.extend(self.unit_diagnostics(value_counts, o))
+        return results
+
+    def alpha_for_question(self, raters_to_exclude=set()):
+        # Alpha of every answer.
+        unit_codes, contributor_codes, chosen = self.encode_ratings(raters_to_exclude=raters_to_exclude)
+        o, pairs = checkbox_coincidences(
+            checkbox_value_counts(unit_codes, chosen, minimum_redundancy=self.minimum_redundancy)
+        )
+        return binary_alpha(o)
+
+    def approximate_alpha(self, approximation):
+        # Alpha and standard error of every answer, from sampled units.
+        unit_codes, contributor_codes, chosen = self.encode_ratings()
+        unit_columns, total_units = self.unit_columns()
+        return approximation.estimate(
+            total_units,
+            partial(checkbox_fold_coincidences, unit_codes, chosen, total_units, minimum_redundancy=self.minimum_redundancy),
+            binary_alpha,
+        )
+
+    def print_approximate_alpha(self, approximation):
+        estimate = self.approximate_alpha(approximation)
+        results = []
+        for answer, k_alpha, standard_error in zip(self.answers, estimate.alpha, estimate.standard_error):
+            answer_estimate = estimate._replace(alpha=k_alpha, standard_error=standard_error)
+            print(approximate_summary(answer.label, answer_estimate, 'units'))
+            results.append((answer.label, k_alpha))
+        return results
+
+    def bucket_coincidences(self, unit_buckets, bucket_count):
+        # Coincidences with shape (buckets x answers x 2 x 2).
+        unit_codes, contributor_codes, chosen = self.encode_ratings()
+        column_buckets = unit_buckets[first_appearance_order(self.data['quiz_task_uuid'])]
+        value_counts = checkbox_value_counts(
+            unit_codes, chosen, unit_count=len(column_buckets), minimum_redundancy=self.minimum_redundancy
+        )
+        dated = column_buckets >= 0
+        o = checkbox_grouped_coincidences(value_counts[:, dated], column_buckets[dated], bucket_count)
+        return o, np.bincount(column_buckets[dated], minlength=bucket_count)
+
+    def window_alphas(self, window_o):
+        alphas = binary_alpha(window_o)
+        return [(answer.label, alphas[:, index]) for index, answer in enumerate(self.answers)]
+
+    def incremental_impacts(self, rater_count):
+        # Negative raters added by minimum_redundancy are never removed.
+        unit_codes, contributor_codes, chosen = self.encode_ratings()
+        fixed_counts = None
+        if self.minimum_redundancy:
+            seen = np.bincount(unit_codes)
+            fixed_counts = add_constant_raters(
+                np.zeros((len(seen), 2), dtype=np.int64), missing_raters(seen, self.minimum_redundancy), 0
+            )
+        return [
+            (answer.label, IncrementalImpact(
+                unit_codes, contributor_codes, answer_chosen, 2, rater_count, binary_alpha, fixed_counts=fixed_counts
+            ))
+            for answer, answer_chosen in zip(self.answers, chosen)
+        ]
+
+    def rater_pairs(self):
+        # Implicit negative raters are not listed, but do count towards
+        # the expected disagreement.
+        unit_codes, contributor_codes, chosen = self.encode_ratings()
+        o, pairs = checkbox_coincidences(
+            checkbox_value_counts(unit_codes, chosen, minimum_redundancy=self.minimum_redundancy)
+        )
+        results = []
+        for answer, answer_chosen, answer_o in zip(self.answers, chosen, o):
+            d, expected_disagreement = disagreement_metric(answer_o, [0, 1], answer.alpha_distance)
+            answer_pairs = rating_rater_pairs(unit_codes, contributor_codes, answer_chosen.astype(np.int64), d)
+            results.append((answer.label, answer_pairs, expected_disagreement))
+        return results
+
+    def unit_diagnostics(self, value_counts=None, o=None):
+        unit_columns, total_units = self.unit_columns()
+        if value_counts is None:
+            unit_codes, contributor_codes, chosen = self.encode_ratings()
+            value_counts = checkbox_value_counts(unit_codes, chosen, minimum_redundancy=self.minimum_redundancy)
+            o, pairs = checkbox_coincidences(value_counts)
+        unit_names = self.unit_names()
+        tables = []
+        for answer, answer_counts, answer_o in zip(self.answers, value_counts, o):
+            d, expected_disagreement = disagreement_metric(answer_o, [0, 1], answer.alpha_distance)
+            pairable, disagreement = grouped_disagreement(
+                answer_counts, d, np.arange(len(answer_counts)), total_units
+            )
+            tables.append(unit_diagnostic_table(answer.label, unit_names, pairable, disagreement, expected_disagreement))
+        return tables
+
+    def to_reliability(self, raters_to_exclude=set()):
+        # Cells hold 1 if the rater chose the answer, 0 if the rater saw
+        # the question but did not, or missing_code(uint8).
+        unit_columns, total_units = self.unit_columns()
+        user_sequence_ids, maximum_raters = sequence_raters(
+            self.data['quiz_task_uuid'], self.data['contributor_uuid'], self.data['created']
+        )
+        dtype = compact_code_dtype(2)
+        reliability_codes = np.full(
+            (len(self.answers), maximum_raters, total_units), missing_code(dtype), dtype=dtype
+        )
+        cells = self.without_raters(self.cell_rows(), raters_to_exclude)
+        unit_codes, contributor_codes, chosen = self.encode_ratings(raters_to_exclude=raters_to_exclude)
+        reliability_codes[:, user_sequence_ids[cells], unit_columns[cells]] = chosen
+        return reliability_codes
+
+    def encode_ratings(self, value_domain=None, raters_to_exclude=set()):
+        # One (unit, contributor) pair per rater that saw the question in
+        # a unit, in the order of cell_rows, and whether they chose each
+        # answer, with shape (answers x pairs).
+        unit_columns, total_units = self.unit_columns()
+        cells = self.without_raters(self.cell_rows(), raters_to_exclude)
+        pairs = pair_codes(self.data['quiz_task_uuid'], self.data['contributor_uuid'])
+        cell_order = np.argsort(pairs[cells])
+        sorted_cell_pairs = pairs[cells][cell_order]
+        found = np.searchsorted(sorted_cell_pairs, pairs).clip(0, max(len(cells) - 1, 0))
+        seen = sorted_cell_pairs[found] == pairs if len(cells) else np.zeros(len(pairs), dtype=bool)
+        chosen = np.zeros((len(self.answers), len(cells)), dtype=bool)
+        chosen[self.answer_numbers()[self.data['answer_uuid'][seen]], cell_order[found[seen]]] = True
+        return unit_columns[cells], self.data['contributor_uuid'][cells], chosen
+
+    def rater_coincidences(self):
+        # Value counts, coincidences and each rater's share of them for
+        # every answer, and the contributor_uuid of each rater. Implicit
+        # negative raters are never left out.
+        unit_codes, contributor_codes, chosen = self.encode_ratings()
+        raters, rater_codes = np.unique(contributor_codes, return_inverse=True)
+        value_counts = checkbox_value_counts(unit_codes, chosen, minimum_redundancy=self.minimum_redundancy)
+        o, impact = checkbox_leave_one_out(
+            unit_codes, rater_codes, chosen, len(raters), minimum_redundancy=self.minimum_redundancy
+        )
+        return value_counts, o, impact, self.data.decode('contributor_uuid', raters)
+
+    def rater_impact(self):
+        value_counts, o, impact, raters = self.rater_coincidences()
+        return checkbox_impact_alphas(o, impact, raters)
+
+    def rater_impacts(self):
+        alphas_with_all, alphas_without = self.rater_impact()
+        return [
+            (answer.label, alpha_with_all, {contributor_uuid: alphas[index] for contributor_uuid, alphas in alphas_without.items()})
+            for index, (answer, alpha_with_all) in enumerate(zip(self.answers, alphas_with_all))
+        ]
+
+
+def checkbox_value_counts(unit_codes, chosen, unit_count=None, minimum_redundancy=0):
+    # Not chosen and chosen counts with shape (answers x units x 2).
+    # Units seen by fewer than minimum_redundancy raters count the
+    # missing raters as not choosing any answer.
+    if unit_count is None:
+        unit_count = int(unit_codes.max()) + 1 if len(unit_codes) else 0
+    seen = np.bincount(unit_codes, minlength=unit_count)
+    chosen_counts = np.stack([
+        np.bincount(unit_codes, weights=answer_chosen, minlength=unit_count) for answer_chosen in chosen
+    ]).reshape(len(chosen), unit_count).astype(np.int64)
+    value_counts = np.stack((seen - chosen_counts, chosen_counts), axis=-1)
+    if minimum_redundancy:
+        value_counts = add_constant_raters(value_counts, missing_raters(seen, minimum_redundancy), 0)
+    return value_counts
+
+def checkbox_coincidences(value_counts):
+    # Coincidences with shape (answers x 2 x 2), and pairs per answer.
+    answer_count, unit_count = value_counts.shape[:2]
+    answer_codes = np.repeat(np.arange(answer_count), unit_count)
+    flat_counts = value_counts.reshape(answer_count * unit_count, 2)
+    o = grouped_coincidences(flat_counts, answer_codes, answer_count)
+    return o, grouped_pair_counts(flat_counts, answer_codes, answer_count)
+
+def checkbox_grouped_coincidences(value_counts, group_codes, group_count):
+    # Coincidences of every group of units with shape
+    # (groups x answers x 2 x 2), given the group of every unit.
+    answer_count, unit_count = value_counts.shape[:2]
+    answer_group_codes = np.repeat(np.arange(answer_count), unit_count) * group_count + np.tile(group_codes, answer_count)
+    o = grouped_coincidences(value_counts.reshape(-1, 2), answer_group_codes, answer_count * group_count)
+    return o.reshape(answer_count, group_count, 2, 2).swapaxes(0, 1)
+
+def checkbox_fold_coincidences(unit_codes, chosen, unit_count, units, folds, fold_count, minimum_redundancy=0):
+    # Coincidences of the sampled units with shape (folds x answers x 2 x 2).
+    local_codes, kept = sampled_rows(unit_codes, units, unit_count)
+    value_counts = checkbox_value_counts(
+        local_codes, chosen[:, kept], unit_count=len(units), minimum_redundancy=minimum_redundancy
+    )
+    return checkbox_grouped_coincidences(value_counts, folds, fold_count)
+
+def checkbox_leave_one_out(unit_codes, rater_codes, chosen, rater_count, minimum_redundancy=0):
+    # Units of different answers are kept apart by numbering them
+    # answer * units + unit.
+    answer_count, cell_count = chosen.shape
+    unit_count = int(unit_codes.max()) + 1 if len(unit_codes) else 0
+    answer_codes = np.repeat(np.arange(answer_count), cell_count)
+    fixed_counts = None
+    if minimum_redundancy:
+        negative_raters = missing_raters(np.bincount(unit_codes, minlength=unit_count), minimum_redundancy)
+        fixed_counts = add_constant_raters(
+            np.zeros((answer_count * unit_count, 2), dtype=np.int64), np.tile(negative_raters, answer_count), 0
+        )
+    return grouped_leave_one_out_coincidences(
+        answer_codes, answer_codes * unit_count + np.tile(unit_codes, answer_count),
+        np.tile(rater_codes, answer_count), chosen.ravel(), 2, answer_count, rater_count,
+        fixed_counts=fixed_counts,
+    )
+
+def checkbox_impact_alphas(o, impact, raters):
+    # Alpha of every answer with all raters, and without each rater.
+    alphas_with_all = binary_alpha(o)
+    alphas_without = {}
+    for contributor_uuid, rater_impact in zip(raters, np.swapaxes(impact, 0, 1)):
+        alphas_without[contributor_uuid] = binary_alpha(o - rater_impact)
+    return alphas_with_all, alphas_without
+
+def print_checkbox_alphas(answers, total_units, maximum_raters, o, pairs, bootstrap=None):
+    results = []
+    for answer, answer_o, answer_pairs, k_alpha in zip(answers, o, pairs, binary_alpha(o)):
+        pairable_values = int(round(answer_o.sum(), 0))
+        print_question_alpha(answer, total_units, maximum_raters, pairable_values, k_alpha, [0, 1])
+        if bootstrap:
+            print(bootstrap.summary(answer_o, [0, 1], answer.alpha_distance, answer_pairs))
+        results.append((answer.label, k_alpha))
+    return results
+
+# Running totals of a CheckboxVariable, like RadioTotals.
+class CheckboxTotals:
+    def __init__(self, variable):
+        self.label = variable.label
+        self.question_uuid = variable.question_uuid
+        self.answers = variable.answers
+        self.o = np.zeros((len(self.answers), 2, 2))
+        self.impact = {}
+        self.total_units = 0
+        self.maximum_raters = 0
+        self.pairs = np.zeros(len(self.answers), dtype=np.int64)
+
+    def add(self, variable):
+        value_counts, o, impact, raters = variable.rater_coincidences()
+        self.o += o
+        self.total_units += value_counts.shape[1]
+        if value_counts.shape[1]:
+            self.maximum_raters = max(self.maximum_raters, int(value_counts[0].sum(axis=1).max()))
+        self.pairs += checkbox_coincidences(value_counts)[1]
+        for contributor_uuid, rater_impact in zip(raters, np.swapaxes(impact, 0, 1)):
+            self.impact[contributor_uuid] = self.impact.get(contributor_uuid, 0) + rater_impact
+
+    def print_alpha_for_question(self, bootstrap=None):
+        return print_checkbox_alphas(
+            self.answers, self.total_units, self.maximum_raters, self.o, self.pairs, bootstrap
+        )
+
+    def rater_impacts(self):
+        alphas_with_all, alphas_without = checkbox_impact_alphas(
+            self.o, np.swapaxes(np.array(list(self.impact.values())).reshape(-1, len(self.answers), 2, 2), 0, 1),
+            list(self.impact),
+        )
+        return [
+            (answer.label, alpha_with_all, {contributor_uuid: alphas[index] for contributor_uuid, alphas in alphas_without.items()})
+            for index, (answer, alpha_with_all) in enumerate(zip(self.answers, alphas_with_all))
+        ]
+
+    def unique_raters(self):
+        return set(self.impact)
+
+# CheckboxTotals that keeps its cells for --update, like RadioState.
+class CheckboxState(CheckboxTotals):
+    def __init__(self, variable):
+        super().__init__(variable)
+        self.units = np.zeros(0, dtype=str)
+        self.contributors = np.zeros(0, dtype=str)
+        self.chosen = np.zeros((len(self.answers), 0), dtype=bool)
+
+    def add(self, variable):
+        super().add(variable)
+        cells = variable.cell_rows()
+        unit_codes, contributor_codes, chosen = variable.encode_ratings()
+        self.units = np.concatenate(
+            (self.units, variable.data.decode('quiz_task_uuid', variable.data['quiz_task_uuid'][cells]))
+        )
+        self.contributors = np.concatenate(
+            (self.contributors, variable.data.decode('contributor_uuid', contributor_codes))
+        )
+        self.chosen = np.concatenate((self.chosen, chosen), axis=1)
+        self.count_units()
+
+    def remove_units(self, unit_names):
+        removed = np.isin(self.units, unit_names)
+        if not removed.any():
+            return
+        units, unit_codes = np.unique(self.units[removed], return_inverse=True)
+        raters, rater_codes = np.unique(self.contributors[removed], return_inverse=True)
+        chosen = self.chosen[:, removed]
+        o, impact = checkbox_leave_one_out(unit_codes, rater_codes, chosen, len(raters))
+        self.o -= o
+        self.pairs -= checkbox_coincidences(checkbox_value_counts(unit_codes, chosen))[1]
+        for contributor_uuid, rater_impact in zip(raters.tolist(), np.swapaxes(impact, 0, 1)):
+            self.impact[contributor_uuid] = self.impact[contributor_uuid] - rater_impact
+        self.units = self.units[~removed]
+        self.contributors = self.contributors[~removed]
+        self.chosen = self.chosen[:, ~removed]
+        remaining = set(self.contributors.tolist())
+        self.impact = {uuid: impact for uuid, impact in self.impact.items() if uuid in remaining}
+        self.count_units()
+
+    def count_units(self):
+        units, unit_codes = np.unique(self.units, return_inverse=True)
+        self.total_units = len(units)
+        self.maximum_raters = int(np.bincount(unit_codes).max()) if len(units) else 0
+
+    def state_arrays(self, prefix):
+        return {
+            prefix + 'o': self.o,
+            prefix + 'raters': np.array(list(self.impact), dtype=str),
+            prefix + 'impact': np.array(list(self.impact.values())).reshape(-1, len(self.answers), 2, 2),
+            prefix + 'pairs': self.pairs,
+            prefix + 'units': self.units,
+            prefix + 'contributors': self.contributors,
+            prefix + 'chosen': self.chosen,
+        }
+
+    def restore(self, arrays, prefix):
+        self.o = arrays[prefix + 'o']
+        self.impact = dict(zip(arrays[prefix + 'raters'].tolist(), arrays[prefix + 'impact']))
+        self.pairs = arrays[prefix + 'pairs']
+        self.units = arrays[prefix + 'units']
+        self.contributors = arrays[prefix + 'contributors']
+        self.chosen = arrays[prefix + 'chosen']
+        self.count_units()
+
+# Classes holding running totals, and running totals that can be
+# updated, for each type of question.
+TOTALS_CLASSES = {
+    RadioVariable: (RadioTotals, RadioState),
+    CheckboxVariable: (CheckboxTotals, CheckboxState),
+}
 
 
 class Schema:
@@ -195,26 +854,96 @@ class Schema:
             radio_variable = RadioVariable(list(rows))
             lookup_key = radio_variable.question_uuid
             self.question_index[lookup_key] = radio_variable
-        # TODO: Prepare CHECKBOX questions
-
-    def add_data_rows(self, data_rows):
-        data_rows = list(data_rows)
-        for data_row in data_rows:
-            lookup_key = self.get_data_row_key(data_row)
-            if lookup_key:
-                question = self.question_index[lookup_key]
-                question.add_data_row(data_row)
-
-    def get_data_row_key(self, data_row):
-        answer_uuid = data_row['answer_uuid']
+        # Then CHECKBOX questions, all answers of a question together.
+        checkbox_rows = filter(
+            lambda x: x['question_type'] == "CHECKBOX",
+            schema_rows
+        )
+        checkbox_rows = sorted(checkbox_rows, key=sort_by_question)
+        for (topic_number, question_number), rows in groupby(checkbox_rows, key=sort_by_question):
+            checkbox_variable = CheckboxVariable(list(rows))
+            lookup_key = checkbox_variable.question_uuid
+            self.question_index[lookup_key] = checkbox_variable
+
+    def empty_copy(self):
+        # Same questions, without data.
+        schema = Schema()
+        schema.answer_index = self.answer_index
+        for lookup_key, variable in self.question_index.items():
+            schema.question_index[lookup_key] = type(variable)(variable.schema_rows)
+        return schema
+
+    def totals(self, incremental=False):
+        # Same questions, holding RadioTotals or CheckboxTotals to add
+        # partitions to, or with incremental=True their --update states.
+        schema = Schema()
+        schema.answer_index = self.answer_index
+        for lookup_key, variable in self.question_index.items():
+            totals_class, state_class = TOTALS_CLASSES[type(variable)]
+            schema.question_index[lookup_key] = (state_class if incremental else totals_class)(variable)
+        return schema
+
+    def add_partition(self, partition_schema):
+        for lookup_key, variable in partition_schema.question_index.items():
+            self.question_index[lookup_key].add(variable)
+
+    def add_data_columns(self, data):
+        # Hand each question the rows for its answers.
+        question_keys = list(self.question_index)
+        question_codes = np.array([
+            question_keys.index(lookup_key) if lookup_key else -1
+            for lookup_key in map(self.get_answer_key, data.categories['answer_uuid'])
+        ], dtype=np.int64)
+        row_questions = question_codes[data['answer_uuid']]
+        order = np.argsort(row_questions, kind='stable')
+        sorted_questions = row_questions[order]
+        starts = np.searchsorted(sorted_questions, np.arange(len(question_keys)), side='left')
+        ends = np.searchsorted(sorted_questions, np.arange(len(question_keys)), side='right')
+        for lookup_key, start, end in zip(question_keys, starts, ends):
+            self.question_index[lookup_key].add_data(data.take(order[start:end]))
+
+    def keep_questions(self, labels):
+        # Drops every RADIO or CHECKBOX question not labelled one of labels.
+        unknown = set(labels) - {variable.label for variable in self.question_index.values()}
+        if unknown:
+            raise UnknownLabelError(
+                "No RADIO or CHECKBOX question labelled {}.".format(", ".join(sorted(unknown)))
+            )
+        for lookup_key, variable in list(self.question_index.items()):
+            if variable.label not in labels:
+                del self.question_index[lookup_key]
+
+    def set_minimum_redundancy(self, minimum_redundancy):
+        # Only CHECKBOX questions have a negative answer, choosing none.
+        for variable in self.question_index.values():
+            if isinstance(variable, CheckboxVariable):
+                variable.minimum_redundancy = minimum_redundancy
+
+    def answer_uuids(self):
+        # answer_uuid of every answer of the questions.
+        return [answer_uuid for variable in self.question_index.values() for answer_uuid in variable.values_map]
+
+    def get_answer_key(self, answer_uuid):
         schema_row = self.answer_index[answer_uuid]
-        if schema_row['question_type'] == "RADIO":
+        if schema_row['question_type'] in ("RADIO", "CHECKBOX"):
             return schema_row['question_uuid']
         return None
 
-    def print_alpha_per_question(self):
-        for variable in self.question_index.values():
-            variable.print_alpha_for_question()
+    def print_alpha_per_question(self, jobs=1, bootstrap=None, approximation=None, diagnostics=None):
+        # Questions are independent, so with jobs > 1 they are computed
+        # by a pool of forked workers that inherit the schema.
+        # Returns (label, alpha) for every variable: each RADIO question
+        # and each CHECKBOX answer. With a diagnostics list, the unit
+        # diagnostic table of every variable is added to it, computed in
+        # the same pass as alpha.
+        results = []
+        shared_inputs = (self, bootstrap, approximation, diagnostics is not None)
+        for question_results, tables in run_in_order(
+                print_alpha_for_question, self.question_index, jobs, shared_inputs):
+            results.extend(question_results)
+            if diagnostics is not None:
+                diagnostics.extend(tables)
+        return results
 
     def rater_impact_on_alpha(self, report_threshold=0.01):
         print("----Rater Impact Report----")
@@ -223,19 +952,19 @@ class Schema:
         raters = self.unique_raters()
         results = defaultdict(dict)
         for variable in self.question_index.values():
-            alpha_with_all = variable.alpha_for_question()
-            results['all'][variable.label] = alpha_with_all
-            for contributor_uuid in raters:
-                alpha_without_contrib = variable.alpha_for_question(raters_to_exclude=[contributor_uuid])
-                results[contributor_uuid][variable.label] = alpha_without_contrib
-                impact = alpha_with_all - alpha_without_contrib
-                if abs(impact) > report_threshold:
-                    exceed_threshold += 1
-                    exceed_raters.add(contributor_uuid)
-                    print(
-                        "{} all: {} rater {} impact: {}"
-                        .format(variable.label, alpha_with_all, contributor_uuid, impact)
-                    )
+            for label, alpha_with_all, alpha_without in variable.rater_impacts():
+                results['all'][label] = alpha_with_all
+                for contributor_uuid in raters:
+                    alpha_without_contrib = alpha_without.get(contributor_uuid, alpha_with_all)
+                    results[contributor_uuid][label] = alpha_without_contrib
+                    impact = alpha_with_all - alpha_without_contrib
+                    if abs(impact) > report_threshold:
+                        exceed_threshold += 1
+                        exceed_raters.add(contributor_uuid)
+                        print(
+                            "{} all: {} rater {} impact: {}"
+                            .format(label, alpha_with_all, contributor_uuid, impact)
+                        )
         print(
             "{} instances of impact exceeding the report threshold."
             .format(exceed_threshold)
@@ -246,6 +975,30 @@ class Schema:
         )
         print("----End Rater Impact Report----")
 
+    def prune_raters(self, pruning):
+        # Prints and returns the raters RaterPruning removes, in order,
+        # with the alpha of every variable after each removal.
+        variables = [
+            variable for variable in self.question_index.values()
+            if pruning.question is None or variable.label == pruning.question
+        ]
+        if not variables:
+            raise UnknownLabelError("No RADIO or CHECKBOX question labelled '{}'.".format(pruning.question))
+        contributor_uuids = variables[0].data.categories['contributor_uuid']
+        impacts = []
+        for variable in variables:
+            impacts.extend(variable.incremental_impacts(len(contributor_uuids)))
+        return pruning.print_search(impacts, contributor_uuids)
+
+    def rater_pair_table(self):
+        # Rater pairs of every variable, for write_rater_pairs.
+        tables = []
+        for variable in self.question_index.values():
+            contributor_uuids = variable.data.categories['contributor_uuid']
+            for label, pairs, expected_disagreement in variable.rater_pairs():
+                tables.append(rater_pair_table(label, pairs, contributor_uuids, expected_disagreement))
+        return concatenate_tables(tables)
+
     def unique_raters(self):
         raters = set()
         for variable in self.question_index.values():
@@ -253,29 +1006,205 @@ class Schema:
         return raters
 
 
-def calculate_alphas_for_datahunt(schema_path, input_path):
+def print_alpha_for_question(shared_inputs, lookup_key):
+    # Returns the question's (label, alpha) results and, if asked for,
+    # its unit diagnostic tables. Approximate alphas build no value
+    # counts of every unit, so their diagnostics take a pass of their own.
+    schema, bootstrap, approximation, diagnostics = shared_inputs
+    variable = schema.question_index[lookup_key]
+    tables = [] if diagnostics else None
+    with stage('question_alpha'):
+        if approximation:
+            results = variable.print_approximate_alpha(approximation)
+        else:
+            results = variable.print_alpha_for_question(bootstrap=bootstrap, diagnostics=tables)
+    if approximation and diagnostics:
+        with stage('unit_diagnostics'):
+            tables.extend(variable.unit_diagnostics())
+    return results, tables
+
+def calculate_alphas_for_datahunt(
+        schema_path, input_path, jobs=1, use_cache=True, bootstrap=None, approximation=None,
+        rater_pairs_path=None, pruning=None, diagnostics_path=None, worst=10, questions=None,
+        minimum_redundancy=0
+    ):
+    # With an approximation, alphas are estimated from sampled units
+    # and the rater impact report is skipped.
+    # With questions, only those question labels are computed, and only
+    # the rows of their answers are read.
+    with stage('load_schema'):
+        schema = load_data_hunt_schema(schema_path, use_cache=use_cache)
+    schema.set_minimum_redundancy(minimum_redundancy)
+    filters = None
+    if questions:
+        schema.keep_questions(questions)
+        filters = {'answer_uuid': schema.answer_uuids()}
+    load_data_hunt(input_path, schema, use_cache=use_cache, filters=filters, jobs=jobs)
+    diagnostics = [] if diagnostics_path else None
+    with stage('print_alpha_per_question'):
+        results = schema.print_alpha_per_question(
+            jobs=jobs, bootstrap=bootstrap, approximation=approximation, diagnostics=diagnostics
+        )
+    if not approximation:
+        with stage('rater_impact_on_alpha'):
+            schema.rater_impact_on_alpha(report_threshold=0.1)
+    if rater_pairs_path:
+        with stage('rater_pairs'):
+            table = schema.rater_pair_table()
+            write_rater_pairs(table, rater_pairs_path)
+        print_rater_pair_summary(table, rater_pairs_path)
+    if pruning:
+        with stage('prune_raters'):
+            schema.prune_raters(pruning)
+    if diagnostics_path:
+        with stage('write_unit_diagnostics'):
+            table = concatenate_diagnostics(diagnostics)
+            write_unit_diagnostics(table, diagnostics_path)
+        print_unit_diagnostics(table, 'units', worst=worst)
+    return results
+
+def calculate_alphas_for_datahunt_streaming(
+        schema_path, input_path, partitions=DEFAULT_PARTITIONS, work_dir=None, bootstrap=None
+    ):
+    # Bounded memory version of calculate_alphas_for_datahunt: units are
+    # split into partition files on disk by quiz_task_uuid, and each
+    # partition's coincidences are added to running totals.
     schema = load_data_hunt_schema(schema_path)
-    load_data_hunt(input_path, schema)
-    schema.print_alpha_per_question()
-    schema.rater_impact_on_alpha(report_threshold=0.1)
+    print("Loading '{}' for Krippendorff calculation, {} partitions."
+          .format(os.path.basename(input_path), partitions)
+    )
+    totals = schema.totals()
+    with ExitStack() as stack:
+        with stage('partition'):
+            paths = stack.enter_context(partitioned_csv(
+                input_path, gunzip_if_needed, 'quiz_task_uuid', DATA_HUNT_CATEGORICAL_COLUMNS,
+                partitions, work_dir
+            ))
+        for path in paths:
+            with stage('load'), open_partition(path) as partition_file:
+                data = load_columns(partition_file, categorical_columns=DATA_HUNT_CATEGORICAL_COLUMNS)
+                record_arrays(data)
+            if len(data) == 0:
+                continue
+            with stage('add_partition'):
+                partition_schema = schema.empty_copy()
+                partition_schema.add_data_columns(data)
+                totals.add_partition(partition_schema)
+    with stage('print_alpha_per_question'):
+        results = totals.print_alpha_per_question(bootstrap=bootstrap)
+    with stage('rater_impact_on_alpha'):
+        totals.rater_impact_on_alpha(report_threshold=0.1)
+    return results
 
-def load_data_hunt_schema(input_path):
+def update_alphas_for_datahunt(schema_path, input_path, state_path, use_cache=True, bootstrap=None):
+    # Incremental version of calculate_alphas_for_datahunt. The state
+    # file keeps every question's coincidences and cells from the
+    # previous run, and only units with task runs created after the
+    # state's watermark, or with a different number of rows, are
+    # recomputed.
+    with stage('load_schema'):
+        schema = load_data_hunt_schema(schema_path, use_cache=use_cache)
+    print("Loading '{}' for Krippendorff calculation."
+          .format(os.path.basename(input_path))
+    )
+    with stage('load'):
+        data = load_columns_cached(
+            input_path, gunzip_if_needed,
+            categorical_columns=DATA_HUNT_CATEGORICAL_COLUMNS, use_cache=use_cache,
+        )
+        record_arrays(data)
+    question_keys = list(schema.question_index)
+    totals = schema.totals(incremental=True)
+    state = load_state(state_path, 'datahunt')
+    if state is not None and state[0]['questions'] != question_keys:
+        logger.warning("Ignoring state file '%s' written for another schema.", state_path)
+        state = None
+    watermark = None
+    units = np.zeros(0, dtype=str)
+    unit_rows = np.zeros(0, dtype=np.int64)
+    if state is not None:
+        metadata, arrays = state
+        watermark = metadata['watermark']
+        units = arrays['units']
+        unit_rows = arrays['unit_rows']
+        for index, variable in enumerate(totals.question_index.values()):
+            variable.restore(arrays, '{}:'.format(index))
+    changed, removed, units, unit_rows = changed_groups(data, 'quiz_task_uuid', watermark, units, unit_rows)
+    print("Updating {} changed and {} removed units of {}."
+          .format(len(changed), len(removed), len(units))
+    )
+    affected_units = np.concatenate((data.decode('quiz_task_uuid', changed), removed))
+    for variable in totals.question_index.values():
+        variable.remove_units(affected_units)
+    with stage('add_partition'):
+        changed_schema = schema.empty_copy()
+        changed_schema.add_data_columns(data.take(np.flatnonzero(np.isin(data['quiz_task_uuid'], changed))))
+        totals.add_partition(changed_schema)
+    with stage('print_alpha_per_question'):
+        results = totals.print_alpha_per_question(bootstrap=bootstrap)
+    with stage('rater_impact_on_alpha'):
+        totals.rater_impact_on_alpha(report_threshold=0.1)
+    arrays = {'units': units, 'unit_rows': unit_rows}
+    for index, variable in enumerate(totals.question_index.values()):
+        arrays.update(variable.state_arrays('{}:'.format(index)))
+    metadata = {'watermark': watermark_of(data), 'questions': question_keys}
+    save_state(state_path, 'datahunt', metadata, arrays)
+    return results
+
+def windowed_alphas_for_datahunt(
+        schema_path, input_path, windows, use_cache=True, window_path=None, minimum_redundancy=0
+    ):
+    # Alpha of every question for every time window, from the
+    # coincidences of the units added up per time bucket.
+    with stage('load_schema'):
+        schema = load_data_hunt_schema(schema_path, use_cache=use_cache)
+    schema.set_minimum_redundancy(minimum_redundancy)
+    data = load_data_hunt(input_path, schema, use_cache=use_cache)
+    unit_buckets, bucket_count = windows.bucket_codes(group_times(data, 'quiz_task_uuid'))
+    print_undated(data, 'quiz_task_uuid', unit_buckets, 'units')
+    rows = []
+    for variable in schema.question_index.values():
+        with stage('question_alpha'):
+            bucket_o, bucket_units = variable.bucket_coincidences(unit_buckets, bucket_count)
+            window_o = windows.window_totals(bucket_o)
+            window_units = windows.window_totals(bucket_units)
+            bounds = windows.window_bounds(len(window_o))
+            for label, alphas in variable.window_alphas(window_o):
+                rows.extend(window_rows(label, bounds, window_units, alphas))
+    print_window_rows(rows, 'units')
+    if window_path:
+        write_window_rows(rows, window_path)
+    return rows
+
+def load_data_hunt_schema(input_path, use_cache=True):
     print("Loading schema for '{}' for Krippendorff calculation."
           .format(os.path.basename(input_path))
     )
-    with closing(gunzip_if_needed(input_path)) as csv_file:
-        reader = csv.DictReader(csv_file)
-        schema = Schema()
-        schema.add_schema_rows(reader)
+    schema_columns = load_columns_cached(
+        input_path, gunzip_if_needed, categorical_columns=SCHEMA_COLUMNS, use_cache=use_cache
+    )
+    schema = Schema()
+    schema.add_schema_rows(schema_rows(schema_columns))
     return schema
 
-def load_data_hunt(input_path, schema):
+def schema_rows(schema_columns):
+    values = [schema_columns.decode(name).tolist() for name in SCHEMA_COLUMNS]
+    for row_values in zip(*values):
+        yield dict(zip(SCHEMA_COLUMNS, row_values))
+
+def load_data_hunt(input_path, schema, use_cache=True, filters=None, jobs=1):
     print("Loading '{}' for Krippendorff calculation."
           .format(os.path.basename(input_path))
     )
-    with closing(gunzip_if_needed(input_path)) as csv_file:
-        reader = csv.DictReader(csv_file)
-        schema.add_data_rows(reader)
+    with stage('load'):
+        data = load_columns_cached(
+            input_path, gunzip_if_needed,
+            categorical_columns=DATA_HUNT_CATEGORICAL_COLUMNS, use_cache=use_cache, filters=filters, jobs=jobs,
+        )
+        record_arrays(data)
+    with stage('add_data_columns'):
+        schema.add_data_columns(data)
+    return data
 
 # Call this by passing to contextlib.closing()
 def gunzip_if_needed(input_path):
@@ -299,9 +1228,58 @@ def load_args():
         help='Output directory')
     parser.add_argument(
         '-m', '--minimum-redundancy',
+        type=int,
         default=0,
-        help='Create negative task runs for articles below this number of task runs.'
+        help='Add negative raters, choosing none of the answers, to units of CHECKBOX questions '
+             'seen by fewer raters, up to this number.'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='Number of worker processes parsing the export and computing questions in parallel.'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always parse the CSV files instead of using or writing a parse cache next to them.'
+    )
+    add_bootstrap_args(parser)
+    add_approximate_args(parser)
+    add_window_args(parser)
+    add_rater_pair_args(parser)
+    add_pruning_args(parser)
+    add_diagnostic_args(parser)
+    parser.add_argument(
+        '--question',
+        action='append',
+        metavar='QUESTION_LABEL',
+        help='Only compute this question, e.g. T1.Q3. Repeat for more questions. With a Parquet export, '
+             'only the row groups holding its answers are read.'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Bounded memory mode: partition the export by quiz_task_uuid on disk '
+             'and process one partition at a time.'
     )
+    parser.add_argument(
+        '--partitions',
+        type=int,
+        default=DEFAULT_PARTITIONS,
+        help='Number of partition files for --stream.'
+    )
+    parser.add_argument(
+        '--work-dir',
+        help='Directory for the --stream partition files (default: system temp).'
+    )
+    parser.add_argument(
+        '--update',
+        metavar='STATE_FILE',
+        help='Only recompute units that changed since the run that wrote STATE_FILE, '
+             'creating it on the first run.'
+    )
+    add_profile_args(parser)
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -315,4 +1293,49 @@ if __name__ == "__main__":
     bare_filename, ext = os.path.splitext(os.path.basename(input_file))
     if ext == ".gz":
         bare_filename, ext = os.path.splitext(os.path.basename(bare_filename))
-    calculate_alphas_for_datahunt(schema_file, input_file)
+    if args.approximate and (args.update or args.stream):
+        raise SystemExit("--approximate can not be combined with --update or --stream.")
+    if args.question and (args.update or args.stream or args.window_days):
+        raise SystemExit("--question can not be combined with --update, --stream or --window-days.")
+    if args.stream and arrow_format(input_file):
+        raise SystemExit("--stream reads CSV exports only.")
+    if args.window_days and (args.update or args.stream or args.approximate):
+        raise SystemExit("--window-days can not be combined with --update, --stream or --approximate.")
+    if args.window_days and (args.bootstrap or args.jobs > 1):
+        raise SystemExit("--window-days can not be combined with --bootstrap or --jobs.")
+    if args.minimum_redundancy and (args.update or args.stream):
+        raise SystemExit("--minimum-redundancy can not be combined with --update or --stream.")
+    if args.prune_to is not None and (args.update or args.stream or args.window_days):
+        raise SystemExit("--prune-to can not be combined with --update, --stream or --window-days.")
+    if args.rater_pairs and (args.update or args.stream or args.window_days):
+        raise SystemExit("--rater-pairs can not be combined with --update, --stream or --window-days.")
+    if args.unit_diagnostics and (args.update or args.stream or args.window_days):
+        raise SystemExit("--unit-diagnostics can not be combined with --update, --stream or --window-days.")
+    with profile_from_args(args):
+        if args.window_days:
+            windowed_alphas_for_datahunt(
+                schema_file, input_file, windows_from_args(args),
+                use_cache=not args.no_cache, window_path=args.window_file,
+                minimum_redundancy=args.minimum_redundancy,
+            )
+        elif args.update:
+            update_alphas_for_datahunt(
+                schema_file, input_file, args.update,
+                use_cache=not args.no_cache, bootstrap=bootstrap_from_args(args),
+            )
+        elif args.stream:
+            calculate_alphas_for_datahunt_streaming(
+                schema_file, input_file, partitions=args.partitions, work_dir=args.work_dir,
+                bootstrap=bootstrap_from_args(args),
+            )
+        else:
+            try:
+                calculate_alphas_for_datahunt(
+                    schema_file, input_file,
+                    jobs=args.jobs, use_cache=not args.no_cache, bootstrap=bootstrap_from_args(args),
+                    approximation=approximation_from_args(args), rater_pairs_path=args.rater_pairs,
+                    pruning=pruning_from_args(args), diagnostics_path=args.unit_diagnostics, worst=args.worst,
+                    questions=args.question, minimum_redundancy=args.minimum_redundancy,
+                )
+            except UnknownLabelError as error:
+                raise SystemExit(str(error))
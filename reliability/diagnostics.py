@@ -0,0 +1,80 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import csv
+import numpy as np
+from pairwise import concatenate_tables
+
+# Which articles (Highlighter) or units (Data Hunt) pull alpha down.
+# Alpha is 1 - D_o / D_e, and the observed disagreement D_o is a sum
+# over units, so every unit's share of it is known from the same value
+# counts that give the coincidences (see grouped_disagreement). Each
+# unit also gets a local alpha, 1 - (its disagreement per pairable
+# value) / (the variable's expected disagreement), the alpha the
+# variable would have if every unit looked like it.
+# Units are ranked by their share of the disagreement, largest first.
+
+UNIT_DIAGNOSTIC_COLUMNS = ('variable', 'rank', 'unit', 'pairable', 'disagreement', 'share', 'local_alpha')
+
+def unit_diagnostic_table(label, unit_names, pairable, disagreement, expected_disagreement):
+    # Units without pairable values are left out.
+    units = np.flatnonzero(pairable > 0)
+    units = units[np.argsort(-disagreement[units], kind='stable')]
+    total = disagreement.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = disagreement[units] / total
+        local_alpha = 1 - disagreement[units] / pairable[units] / expected_disagreement
+    return {
+        'variable': np.full(len(units), label, dtype=object),
+        'rank': np.arange(1, len(units) + 1),
+        'unit': np.asarray(unit_names, dtype=object)[units],
+        'pairable': pairable[units],
+        'disagreement': disagreement[units],
+        'share': share,
+        'local_alpha': local_alpha,
+    }
+
+def concatenate_diagnostics(tables):
+    return concatenate_tables(tables, columns=UNIT_DIAGNOSTIC_COLUMNS)
+
+def write_unit_diagnostics(table, output_path):
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(UNIT_DIAGNOSTIC_COLUMNS)
+        writer.writerows(zip(
+            table['variable'], table['rank'].tolist(), table['unit'], np.round(table['pairable'], 6).tolist(),
+            np.round(table['disagreement'], 6).tolist(), np.round(table['share'], 6).tolist(),
+            np.round(table['local_alpha'], 6).tolist(),
+        ))
+
+def print_unit_diagnostics(table, unit_name, worst=10):
+    print("----Worst {}----".format(unit_name.capitalize()))
+    for label, rank, unit, share, local_alpha in zip(
+            table['variable'], table['rank'], table['unit'], table['share'], table['local_alpha']):
+        if rank <= worst:
+            print("{} #{} {}: {:.2%} of disagreement, local alpha {:.3f}".format(
+                label, rank, unit, share, local_alpha))
+    print("----End Worst {}----".format(unit_name.capitalize()))
+
+def add_diagnostic_args(parser):
+    parser.add_argument(
+        '--unit-diagnostics',
+        metavar='OUTPUT_FILE',
+        help='Write every article or unit\'s share of the disagreement and local alpha, per variable, '
+             'ranked worst first, to this CSV file.')
+    parser.add_argument(
+        '--worst',
+        type=int,
+        default=10,
+        help='Number of worst articles or units per variable --unit-diagnostics prints.')
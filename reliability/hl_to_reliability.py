@@ -18,32 +18,365 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 import argparse
 import gzip
-from contextlib import closing
 import csv
-from collections import defaultdict
-from operator import itemgetter
-from itertools import groupby, chain
+from functools import partial
+from contextlib import ExitStack
 import numpy as np
-from krippendorff import alpha
+from columnar import (
+    ColumnarExport, load_columns, group_starts, pair_codes, first_appearance_order,
+    last_rows, UnknownLabelError,
+)
+from coincidences import (
+    span_value_counts, coincidences_from_value_counts, grouped_coincidences, grouped_pair_counts,
+    pair_count, alpha_from_coincidences, binary_alpha, disagreement_metric, grouped_disagreement,
+    missing_raters,
+)
+from bootstrap import add_bootstrap_args, bootstrap_from_args
+from approximate import add_approximate_args, approximation_from_args, approximate_summary
+from pairwise import (
+    add_rater_pair_args, span_rater_pairs, rater_pair_table, concatenate_tables, write_rater_pairs,
+    print_rater_pair_summary,
+)
+from diagnostics import (
+    add_diagnostic_args, unit_diagnostic_table, concatenate_diagnostics, write_unit_diagnostics,
+    print_unit_diagnostics,
+)
+from windowed import (
+    add_window_args, windows_from_args, group_times, print_undated, window_rows, print_window_rows, write_window_rows,
+)
+from parallel import run_in_order
+from parse_cache import load_columns_cached
+from arrow_io import arrow_format
+from streaming import partitioned_csv, open_partition, DEFAULT_PARTITIONS
+from incremental import load_state, save_state, changed_groups, watermark_of
+from profiling import stage, record_arrays, add_profile_args, profile_from_args
 
 # Constant to use as topic for all article text not highlighted by a rater.
 NO_HIGHLIGHT = 9999
 
-def split_highlighter(input_path, output_dir, batch_name):
-    with closing(gunzip_if_needed(input_path)) as csv_file:
-        article_dict = group_by_article(csv_file)
+# uAlpha files are formatted and written this many segments at a time.
+UALPHA_CHUNK_ROWS = 65536
+UALPHA_ROW_FORMAT = 'u%d,%d,%d,,%d,%d\r\n'
+
+TRIM_LOG_COLUMNS = (
+    'article_sha256', 'contributor_uuid', 'topic_name', 'start_pos', 'end_pos', 'trimmed_start_pos', 'trimmed_end_pos',
+)
+
+HIGHLIGHTER_INT_COLUMNS = ('taskrun_count', 'article_text_length', 'start_pos', 'end_pos')
+HIGHLIGHTER_CATEGORICAL_COLUMNS = ('article_sha256', 'contributor_uuid', 'topic_name', 'created')
+
+def split_highlighter(
+        input_path, output_dir, batch_name, jobs=1, use_cache=True, bootstrap=None, compress=False,
+        approximation=None, rater_pairs_path=None, diagnostics_path=None, worst=10, trim_log_path=None,
+        topics=None
+    ):
+    # With topics, only those topic names are computed.
+    highlights, virtual_corpus_positions = prepare_highlights(
+        input_path, use_cache=use_cache, jobs=jobs, topics=topics, trim_log_path=trim_log_path
+    )
+    diagnostics = [] if diagnostics_path else None
+    with stage('output_separate_topics'):
+        results = output_separate_topics(
+            highlights, virtual_corpus_positions, output_dir, batch_name, jobs=jobs, bootstrap=bootstrap,
+            compress=compress, approximation=approximation, diagnostics=diagnostics,
+        )
+    if rater_pairs_path:
+        with stage('rater_pairs'):
+            table = rater_pair_table_for_topics(highlights, virtual_corpus_positions)
+            write_rater_pairs(table, rater_pairs_path)
+        print_rater_pair_summary(table, rater_pairs_path)
+    if diagnostics_path:
+        with stage('write_unit_diagnostics'):
+            table = concatenate_diagnostics(diagnostics)
+            write_unit_diagnostics(table, diagnostics_path)
+        print_unit_diagnostics(table, 'articles', worst=worst)
+    return results
+
+def prepare_highlights(input_path, use_cache=True, jobs=1, topics=None, trim_log_path=None):
+    # Loads an export, adds negative task runs, numbers the raters of
+    # every article and trims overlaps, ready for the alpha of any topic.
+    with stage('load'):
+        highlights = load_columns_cached(
+            input_path, gunzip_if_needed,
+            int_columns=HIGHLIGHTER_INT_COLUMNS,
+            categorical_columns=HIGHLIGHTER_CATEGORICAL_COLUMNS,
+            use_cache=use_cache,
+            jobs=jobs,
+        )
+        record_arrays(highlights)
     print("Loading '{}' for Krippendorff calculation.".format(os.path.basename(input_path)))
-    topic_map = map_topic_names(article_dict)
-    add_missing_taskruns(article_dict)
-    cumulative_length, virtual_corpus_positions = cumulative_corpus_lengths(article_dict)
-    print("Article count: {}. Corpus character length: {}.".format(len(article_dict), cumulative_length))
-    maximum_raters = user_seq_per_article(article_dict)
+    with stage('map_topic_names'):
+        topic_map = map_topic_names(highlights)
+    with stage('add_missing_taskruns'):
+        add_missing_taskruns(highlights)
+    with stage('cumulative_corpus_lengths'):
+        cumulative_length, virtual_corpus_positions = cumulative_corpus_lengths(highlights)
+    print("Article count: {}. Corpus character length: {}.".format(article_count(highlights), cumulative_length))
+    with stage('user_seq_per_article'):
+        order = highlight_order(highlights)
+        maximum_raters = user_seq_per_article(highlights, order)
     print("Maximum raters for an article: {}".format(maximum_raters))
-    remove_overlaps(article_dict, show_trims=True)
-    output_separate_topics(
-        article_dict, maximum_raters, cumulative_length, virtual_corpus_positions,
-        output_dir, batch_name
+    if topics:
+        highlights = rows_of_topics(highlights, topics)
+        order = highlight_order(highlights)
+    with stage('remove_overlaps'):
+        remove_overlaps(highlights, show_trims=True, trim_log_path=trim_log_path, order=order)
+    return highlights, virtual_corpus_positions
+
+def split_highlighter_streaming(
+        input_path, partitions=DEFAULT_PARTITIONS, work_dir=None, bootstrap=None
+    ):
+    # Bounded memory version of split_highlighter: articles are split
+    # into partition files on disk, then each partition goes through the
+    # same stages and its coincidences are added to running totals per
+    # topic. No uAlpha files are written.
+    print("Loading '{}' for Krippendorff calculation, {} partitions."
+          .format(os.path.basename(input_path), partitions))
+    topic_o = {}
+    topic_pairs = {}
+    articles = 0
+    negative_taskrun_articles = 0
+    cumulative_length = 0
+    maximum_raters = 0
+    columns = HIGHLIGHTER_INT_COLUMNS + HIGHLIGHTER_CATEGORICAL_COLUMNS
+    with ExitStack() as stack:
+        with stage('partition'):
+            paths = stack.enter_context(partitioned_csv(
+                input_path, gunzip_if_needed, 'article_sha256', columns, partitions, work_dir
+            ))
+        for path in paths:
+            with stage('load'), open_partition(path) as partition_file:
+                highlights = load_highlighter_columns(partition_file)
+                record_arrays(highlights)
+            if len(highlights) == 0:
+                continue
+            with stage('article_contributions'):
+                contributions, article_summary = article_contributions(highlights)
+            add_topic_totals(topic_o, topic_pairs, contributions, sign=1)
+            articles += len(article_summary)
+            negative_taskrun_articles += int(article_summary['negative_taskruns'].sum())
+            cumulative_length += int(article_summary['article_text_length'].sum())
+            maximum_raters = max(maximum_raters, int(article_summary['raters'].max()))
+    print("Added negative task runs to {} articles.".format(negative_taskrun_articles))
+    print("Article count: {}. Corpus character length: {}.".format(articles, cumulative_length))
+    print("Maximum raters for an article: {}".format(maximum_raters))
+    return print_topic_totals(topic_o, topic_pairs, bootstrap)
+
+def update_highlighter(input_path, state_path, use_cache=True, bootstrap=None):
+    # Incremental version of split_highlighter. The state file keeps the
+    # coincidences of every (topic, article) from the previous run, and
+    # only articles with task runs created after the state's watermark,
+    # or with a different number of rows, are recomputed.
+    # No uAlpha files are written.
+    with stage('load'):
+        highlights = load_columns_cached(
+            input_path, gunzip_if_needed,
+            int_columns=HIGHLIGHTER_INT_COLUMNS,
+            categorical_columns=HIGHLIGHTER_CATEGORICAL_COLUMNS,
+            use_cache=use_cache,
+        )
+        record_arrays(highlights)
+    print("Loading '{}' for Krippendorff calculation.".format(os.path.basename(input_path)))
+    state = load_state(state_path, 'highlighter')
+    if state is None:
+        watermark = None
+        arrays = empty_highlighter_state()
+    else:
+        metadata, arrays = state
+        watermark = metadata['watermark']
+    changed, removed, article_names, article_rows = changed_groups(
+        highlights, 'article_sha256', watermark, arrays['articles'], arrays['article_rows']
     )
+    print("Updating {} changed and {} removed articles of {}."
+          .format(len(changed), len(removed), len(article_names)))
+    affected = np.isin(arrays['contribution_articles'], np.concatenate(
+        (highlights.decode('article_sha256', changed), removed)
+    ))
+    topic_o = dict(zip(arrays['topic_names'], arrays['topic_o']))
+    topic_pairs = dict(zip(arrays['topic_names'], arrays['topic_pairs']))
+    old_contributions = ColumnarExport({
+        'topic_name': arrays['contribution_topics'][affected],
+        'o': arrays['contribution_o'][affected],
+        'pairs': arrays['contribution_pairs'][affected],
+    }, {})
+    add_topic_totals(topic_o, topic_pairs, old_contributions, sign=-1)
+    changed_rows = highlights.take(np.flatnonzero(np.isin(highlights['article_sha256'], changed)))
+    with stage('article_contributions'):
+        contributions, article_summary = article_contributions(changed_rows)
+    new_contributions = ColumnarExport({
+        'topic_name': contributions.decode('topic_name'),
+        'o': contributions['o'],
+        'pairs': contributions['pairs'],
+    }, {})
+    add_topic_totals(topic_o, topic_pairs, new_contributions, sign=1)
+    # Topics whose articles were all removed no longer count.
+    # topic_names, topic_o and topic_pairs are saved in the same order.
+    topic_names = sorted(set(arrays['contribution_topics'][~affected]) | set(new_contributions['topic_name']))
+    topic_o = {name: topic_o[name] for name in topic_names}
+    topic_pairs = {name: topic_pairs[name] for name in topic_names}
+    # Articles, their lengths and raters, kept sorted by name.
+    kept_articles = ~np.isin(arrays['articles'], np.concatenate(
+        (highlights.decode('article_sha256', changed), removed)
+    ))
+    articles = np.concatenate((arrays['articles'][kept_articles], article_summary.decode('article_sha256')))
+    order = np.argsort(articles)
+    arrays = {
+        'articles': articles[order],
+        'article_rows': article_rows[np.searchsorted(article_names, articles[order])],
+        'article_text_lengths': np.concatenate((
+            arrays['article_text_lengths'][kept_articles], article_summary['article_text_length']
+        ))[order],
+        'article_raters': np.concatenate((
+            arrays['article_raters'][kept_articles], article_summary['raters']
+        ))[order],
+        'contribution_topics': np.concatenate((
+            arrays['contribution_topics'][~affected], new_contributions['topic_name']
+        )),
+        'contribution_articles': np.concatenate((
+            arrays['contribution_articles'][~affected], contributions.decode('article_sha256')
+        )),
+        'contribution_o': np.concatenate((arrays['contribution_o'][~affected], contributions['o'])),
+        'contribution_pairs': np.concatenate((arrays['contribution_pairs'][~affected], contributions['pairs'])),
+        'topic_names': np.array(topic_names, dtype=str),
+        'topic_o': np.array([topic_o[name] for name in topic_names]).reshape(-1, 2, 2),
+        'topic_pairs': np.array([topic_pairs[name] for name in topic_names], dtype=np.int64),
+    }
+    maximum_raters = int(arrays['article_raters'].max()) if len(arrays['article_raters']) else 0
+    print("Article count: {}. Corpus character length: {}."
+          .format(len(arrays['articles']), int(arrays['article_text_lengths'].sum())))
+    print("Maximum raters for an article: {}".format(maximum_raters))
+    results = print_topic_totals(topic_o, topic_pairs, bootstrap)
+    save_state(state_path, 'highlighter', {'watermark': watermark_of(highlights)}, arrays)
+    return results
+
+def windowed_highlighter(input_path, windows, use_cache=True, window_path=None):
+    # Alpha of every topic for every time window, from the coincidences
+    # of each (topic, article) added up per time bucket.
+    # No uAlpha files are written.
+    with stage('load'):
+        highlights = load_columns_cached(
+            input_path, gunzip_if_needed,
+            int_columns=HIGHLIGHTER_INT_COLUMNS,
+            categorical_columns=HIGHLIGHTER_CATEGORICAL_COLUMNS,
+            use_cache=use_cache,
+        )
+        record_arrays(highlights)
+    print("Loading '{}' for Krippendorff calculation.".format(os.path.basename(input_path)))
+    article_buckets, bucket_count = windows.bucket_codes(group_times(highlights, 'article_sha256'))
+    print_undated(highlights, 'article_sha256', article_buckets, 'articles')
+    with stage('article_contributions'):
+        contributions, article_summary = article_contributions(highlights)
+    topics, topic_codes = np.unique(contributions['topic_name'], return_inverse=True)
+    buckets = article_buckets[contributions['article_sha256']]
+    dated = buckets >= 0
+    bucket_o = np.zeros((bucket_count, len(topics), 2, 2))
+    bucket_articles = np.zeros((bucket_count, len(topics)), dtype=np.int64)
+    np.add.at(bucket_o, (buckets[dated], topic_codes[dated]), contributions['o'][dated])
+    np.add.at(bucket_articles, (buckets[dated], topic_codes[dated]), 1)
+    window_o = windows.window_totals(bucket_o)
+    window_articles = windows.window_totals(bucket_articles)
+    alphas = binary_alpha(window_o)
+    bounds = windows.window_bounds(len(window_o))
+    rows = []
+    for index, topic_name in enumerate(contributions.decode('topic_name', topics)):
+        rows.extend(window_rows(topic_name, bounds, window_articles[:, index], alphas[:, index]))
+    print_window_rows(rows, 'articles')
+    if window_path:
+        write_window_rows(rows, window_path)
+    return rows
+
+def empty_highlighter_state():
+    strings = np.zeros(0, dtype=str)
+    counts = np.zeros(0, dtype=np.int64)
+    return {
+        'articles': strings, 'article_rows': counts, 'article_text_lengths': counts, 'article_raters': counts,
+        'contribution_topics': strings, 'contribution_articles': strings,
+        'contribution_o': np.zeros((0, 2, 2)), 'contribution_pairs': counts,
+        'topic_names': strings, 'topic_o': np.zeros((0, 2, 2)), 'topic_pairs': counts,
+    }
+
+def article_contributions(highlights):
+    # Runs the stages on highlights holding all rows of their articles
+    # and returns the coincidences and pair counts of every (topic,
+    # article), plus the length, number of raters and whether negative
+    # task runs were added for every article.
+    # Topic numbers are local to highlights, so each topic counts as
+    # value 0 and NO_HIGHLIGHT as value 1.
+    map_topic_names(highlights)
+    negative_taskrun_articles = add_missing_taskruns(highlights, show_added=False)
+    cumulative_length, virtual_corpus_positions = cumulative_corpus_lengths(highlights)
+    order = highlight_order(highlights)
+    user_seq_per_article(highlights, order)
+    remove_overlaps(highlights, show_trims=False, order=order)
+    articles, article_text_lengths, by_position = article_positions(highlights, virtual_corpus_positions)
+    topic_codes = []
+    article_codes = []
+    article_o = []
+    article_pairs = []
+    for topic_name, rows in split_topics(highlights):
+        segments = topic_segments(rows, virtual_corpus_positions, show_skipped=False)
+        value_codes = (segments['topic_number'] == NO_HIGHLIGHT).astype(np.int64)
+        value_counts, lengths, run_starts = span_value_counts(
+            segments['start_pos'], segments['end_pos'], value_codes, 2
+        )
+        run_articles = articles_of_runs(run_starts, articles, by_position, virtual_corpus_positions)
+        topic_articles = np.unique(np.searchsorted(articles, rows['article_sha256']))
+        o = grouped_coincidences(value_counts, run_articles, len(articles), weights=lengths)
+        pairs = grouped_pair_counts(value_counts, run_articles, len(articles), weights=lengths)
+        topic_codes.append(np.full(len(topic_articles), rows['topic_name'][0]))
+        article_codes.append(articles[topic_articles])
+        article_o.append(o[topic_articles])
+        article_pairs.append(pairs[topic_articles])
+    contributions = ColumnarExport({
+        'topic_name': np.concatenate(topic_codes) if topic_codes else np.zeros(0, dtype=np.int64),
+        'article_sha256': np.concatenate(article_codes) if article_codes else np.zeros(0, dtype=np.int64),
+        'o': np.concatenate(article_o) if article_o else np.zeros((0, 2, 2)),
+        'pairs': np.concatenate(article_pairs) if article_pairs else np.zeros(0, dtype=np.int64),
+    }, highlights.categories)
+    article_summary = ColumnarExport({
+        'article_sha256': articles,
+        'article_text_length': article_text_lengths,
+        'raters': article_raters(highlights)[articles],
+        'negative_taskruns': np.isin(highlights.decode('article_sha256', articles), list(negative_taskrun_articles)),
+    }, highlights.categories)
+    return contributions, article_summary
+
+def article_positions(highlights, virtual_corpus_positions):
+    # The article codes of highlights, their lengths, and the order of
+    # the articles on the virtual corpus.
+    articles, first_rows = np.unique(highlights['article_sha256'], return_index=True)
+    article_text_lengths = highlights['article_text_length'][first_rows]
+    # Zero length articles go first among articles with the same start,
+    # so runs are found in the article that actually covers them.
+    by_position = np.lexsort((article_text_lengths, virtual_corpus_positions[articles]))
+    return articles, article_text_lengths, by_position
+
+def articles_of_runs(run_starts, articles, by_position, virtual_corpus_positions):
+    # Index in articles of the article each run starts in.
+    article_starts = virtual_corpus_positions[articles][by_position]
+    return by_position[np.searchsorted(article_starts, run_starts, side='right') - 1]
+
+def add_topic_totals(topic_o, topic_pairs, contributions, sign=1):
+    # Adds (or with sign=-1 subtracts) contributions to running totals
+    # per topic name.
+    topic_names = contributions['topic_name']
+    if contributions.categories:
+        topic_names = contributions.decode('topic_name')
+    for topic_name, o, pairs in zip(topic_names.tolist(), contributions['o'], contributions['pairs']):
+        topic_o[topic_name] = topic_o.get(topic_name, 0) + sign * o
+        topic_pairs[topic_name] = topic_pairs.get(topic_name, 0) + sign * int(pairs)
+
+def print_topic_totals(topic_o, topic_pairs, bootstrap=None):
+    results = []
+    for topic_number, topic_name in enumerate(sorted(topic_o)):
+        o = topic_o[topic_name]
+        value_domain = [topic_number, NO_HIGHLIGHT]
+        k_alpha = alpha_from_coincidences(o, value_domain, level_of_measurement='nominal')
+        print("Krippendorff alpha is {:.3f} for '{}'".format(k_alpha, topic_name))
+        if bootstrap:
+            print(bootstrap.summary(o, value_domain, 'nominal', topic_pairs[topic_name]))
+        results.append((topic_name, k_alpha))
+    return results
 
 # Call this by passing to contextlib.closing()
 def gunzip_if_needed(input_path):
@@ -54,221 +387,463 @@ def gunzip_if_needed(input_path):
         file_handle = open(input_path, mode='rt', encoding='utf-8-sig', errors='strict')
     return file_handle
 
-def group_by_article(input_file):
-    article_dict = defaultdict(list)
-    reader = csv.DictReader(input_file)
-    for row in reader:
-        fresh_row = dict(row)
-        convert_to_int(fresh_row, 'taskrun_count')
-        convert_to_int(fresh_row, 'article_text_length')
-        convert_to_int(fresh_row, 'start_pos')
-        convert_to_int(fresh_row, 'end_pos')
-        article_sha256 = fresh_row['article_sha256']
-        article_dict[article_sha256 ].append(fresh_row)
-    return article_dict
-
-def convert_to_int(row, key):
-    row[key] = int(row[key])
-
-def map_topic_names(article_dict):
-    topic_names = set()
-    for article_sha256, rows in article_dict.items():
-        for row in rows:
-            topic_names.add(row['topic_name'])
+def load_highlighter_columns(input_file):
+    # Rows of an article are found through the article_sha256 codes
+    # rather than by grouping row dicts.
+    return load_columns(
+        input_file,
+        int_columns=HIGHLIGHTER_INT_COLUMNS,
+        categorical_columns=HIGHLIGHTER_CATEGORICAL_COLUMNS,
+    )
+
+def rows_of_topics(highlights, topic_names):
+    # Only after add_missing_taskruns, which counts the raters of every
+    # topic of an article, and user_seq_per_article, which numbers them,
+    # so a topic's alpha and uAlpha file do not change. Overlaps are
+    # trimmed within a topic, so that can come after.
+    unknown = set(topic_names) - set(highlights.categories['topic_name'])
+    if unknown:
+        raise UnknownLabelError("No highlights of topic {}.".format(", ".join(sorted(unknown))))
+    codes = np.flatnonzero(np.isin(highlights.categories['topic_name'], list(topic_names)))
+    return highlights.take(np.flatnonzero(np.isin(highlights['topic_name'], codes)))
+
+def article_count(highlights):
+    return len(np.unique(highlights['article_sha256']))
+
+def map_topic_names(highlights):
+    topic_names = highlights.categories['topic_name']
     topic_map = dict(zip(topic_names, range(len(topic_names))))
-    for article_sha256, rows in article_dict.items():
-        for row in rows:
-            row['topic_number'] = topic_map[row['topic_name']]
+    highlights['topic_number'] = highlights['topic_name'].astype(np.int64)
     return topic_map
 
-def add_missing_taskruns(article_dict):
-    negative_taskrun_articles = set()
-    for article_sha256, rows in list(article_dict.items()):
-        raters = set()
-        taskrun_count = 0
-        for row in rows:
-            raters.add(row['contributor_uuid'])
-            row_template = dict(row)
-            taskrun_count = row['taskrun_count']
-        if len(raters) > 0 and len(raters) < taskrun_count:
-            negative_taskrun_articles.add(article_sha256)
-            missing_taskrun_count = taskrun_count - len(raters)
-            for i in range(8000, 8000 + missing_taskrun_count):
-                negative_taskrun = dict(row_template)
-                negative_taskrun['contributor_uuid'] = str(i)
-                negative_taskrun['start_pos'] = 0
-                negative_taskrun['end_pos'] = negative_taskrun['article_text_length']
-                negative_taskrun['topic_number'] = NO_HIGHLIGHT
-                article_dict[article_sha256].append(negative_taskrun)
-    print(
-        "Added negative task runs to {} articles to bring up to {} raters."
-        .format(len(negative_taskrun_articles), taskrun_count)
+def article_raters(highlights):
+    # Number of distinct contributors for every article code.
+    article_codes = highlights['article_sha256']
+    pairs = pair_codes(article_codes, highlights['contributor_uuid'])
+    distinct_pairs, first_rows = np.unique(pairs, return_index=True)
+    return np.bincount(
+        article_codes[first_rows], minlength=len(highlights.categories['article_sha256'])
     )
+
+def add_missing_taskruns(highlights, show_added=True):
+    article_codes = highlights['article_sha256']
+    raters = article_raters(highlights)
+    # The last row of each article is the template for its negative task
+    # runs, and its taskrun_count says how many raters there should be.
+    template_rows = last_rows(article_codes)
+    template_articles = article_codes[template_rows]
+    rater_counts = raters[template_articles]
+    taskrun_counts = highlights['taskrun_count'][template_rows]
+    missing_taskrun_counts = missing_raters(rater_counts, taskrun_counts)
+    needs_negatives = missing_taskrun_counts > 0
+    negative_taskrun_articles = set(highlights.decode('article_sha256', template_articles[needs_negatives]))
+    if needs_negatives.any():
+        negative_contributors = np.array([
+            highlights.encode('contributor_uuid', str(i))
+            for i in range(8000, 8000 + missing_taskrun_counts.max())
+        ])
+        negative_taskruns = highlights.take(np.repeat(template_rows, missing_taskrun_counts))
+        run_starts = np.repeat(np.cumsum(missing_taskrun_counts) - missing_taskrun_counts, missing_taskrun_counts)
+        negative_taskruns['contributor_uuid'] = negative_contributors[
+            np.arange(len(negative_taskruns)) - run_starts
+        ]
+        negative_taskruns['start_pos'] = np.zeros(len(negative_taskruns), dtype=np.int64)
+        negative_taskruns['end_pos'] = negative_taskruns['article_text_length']
+        negative_taskruns['topic_number'] = np.full(len(negative_taskruns), NO_HIGHLIGHT, dtype=np.int64)
+        highlights.append(negative_taskruns.columns)
+    # Report the taskrun_count of the article that appears last.
+    taskrun_count = 0
+    if len(template_rows):
+        last_article = first_appearance_order(article_codes)[-1]
+        taskrun_count = taskrun_counts[template_articles == last_article][0]
+    if show_added:
+        print(
+            "Added negative task runs to {} articles to bring up to {} raters."
+            .format(len(negative_taskrun_articles), taskrun_count)
+        )
     return negative_taskrun_articles
 
-def remove_if_not_pairable(article_dict):
-    removed_articles = set()
-    for article_sha256, rows in list(article_dict.items()):
-        raters = set()
-        for row in rows:
-            raters.add(row['contributor_uuid'])
-        if len(raters) < 2:
-            removed_articles.add(article_sha256)
-            del article_dict[article_sha256]
+def remove_if_not_pairable(highlights):
+    raters = article_raters(highlights)
+    pairable = raters[highlights['article_sha256']] >= 2
+    removed_articles = set(highlights.decode('article_sha256', np.flatnonzero((raters > 0) & (raters < 2))))
+    highlights.columns = highlights.take(np.flatnonzero(pairable)).columns
     print("Removing {} articles with less than two raters.".format(len(removed_articles)))
     return removed_articles
 
-def cumulative_corpus_lengths(article_dict):
-    virtual_corpus_positions = {}
-    cumulative_length = 0
-    for article_sha256 in article_dict.keys():
-        virtual_corpus_positions[article_sha256] = cumulative_length
-        cumulative_length += article_dict[article_sha256][0]['article_text_length']
+def cumulative_corpus_lengths(highlights):
+    # Articles are laid end to end in the order they first appear in
+    # the export. virtual_corpus_positions is indexed by article code.
+    article_codes = highlights['article_sha256']
+    distinct, first_rows = np.unique(article_codes, return_index=True)
+    order = np.argsort(first_rows, kind='stable')
+    lengths = highlights['article_text_length'][first_rows[order]]
+    virtual_corpus_positions = np.zeros(len(highlights.categories['article_sha256']), dtype=np.int64)
+    virtual_corpus_positions[distinct[order]] = np.cumsum(lengths) - lengths
+    cumulative_length = int(lengths.sum())
     return cumulative_length, virtual_corpus_positions
 
-def user_seq_per_article(article_dict):
-    maximum_raters = 0
-    for article_sha256, rows in article_dict.items():
-        article_user_map = {}
-        counter = 0
-        sortkey = itemgetter('created')
-        rows_by_date = sorted(rows, key=sortkey)
-        for row in rows_by_date:
-            contributor_uuid = row['contributor_uuid']
-            if contributor_uuid not in article_user_map:
-                article_user_map[contributor_uuid] = counter
-                counter += 1
-        for row in rows:
-            row['user_sequence_id'] = article_user_map[row['contributor_uuid']]
-        maximum_raters = max(counter, maximum_raters)
-    return maximum_raters
-
-def remove_overlaps(article_dict, show_trims=True):
-    sortkeys = itemgetter('article_sha256', 'contributor_uuid', 'topic_name')
-    for article_rows in article_dict.values():
-        grouped_rows = sorted(article_rows, key=sortkeys)
-        for (article_sha256, contributor_uuid, topic_name), mergeable_rows in groupby(grouped_rows, key=sortkeys):
-            first_row = True
-            sort_by_pos = itemgetter('start_pos', 'end_pos')
-            for row in sorted(mergeable_rows, key=sort_by_pos):
-                if first_row:
-                    first_row = False
-                    max_pos = row['end_pos']
-                    continue
-                trimmed = False
-                initial = ("{}:{}".format(row['start_pos'], row['end_pos']))
-                if row['start_pos'] < max_pos:
-                    row['start_pos'] = max_pos
-                    trimmed = True
-                if row['end_pos'] < max_pos:
-                    row['end_pos'] = max_pos
-                    trimmed = True
-                if trimmed and show_trims:
-                    print("{} trimmed to {}:{}".format(initial, row['start_pos'], row['end_pos']))
-                max_pos = max(row['end_pos'], max_pos)
+def highlight_order(highlights):
+    # Rows sorted by (article, contributor, topic, start, end, row). The
+    # one sort serves both user_seq_per_article, which needs the rows of
+    # every task run together, and remove_overlaps.
+    return np.lexsort((
+        np.arange(len(highlights)), highlights['end_pos'], highlights['start_pos'],
+        highlights['topic_name'], highlights['contributor_uuid'], highlights['article_sha256'],
+    ))
+
+def user_seq_per_article(highlights, order=None):
+    # Number the raters of each article 0, 1, 2... in the order of their
+    # first row by created time, ties broken by row order, like
+    # sequence_raters. Only the task runs are sorted by created time,
+    # as the rows are already grouped by task run in highlight_order.
+    if order is None:
+        order = highlight_order(highlights)
+    if len(order) == 0:
+        highlights['user_sequence_id'] = np.zeros(0, dtype=np.int64)
+        return 0
+    article_codes = highlights['article_sha256'][order]
+    taskrun_starts = group_starts(pair_codes(article_codes, highlights['contributor_uuid'][order]))
+    first_created = np.minimum.reduceat(
+        highlights['created'][order].astype(np.int64) * len(order) + order, taskrun_starts
+    )
+    taskrun_articles = article_codes[taskrun_starts]
+    taskrun_order = np.lexsort((first_created, taskrun_articles))
+    article_starts = group_starts(taskrun_articles[taskrun_order])
+    sizes = np.diff(np.append(article_starts, len(taskrun_order)))
+    taskrun_sequence = np.empty(len(taskrun_order), dtype=np.int64)
+    taskrun_sequence[taskrun_order] = np.arange(len(taskrun_order)) - np.repeat(article_starts, sizes)
+    user_sequence_ids = np.empty(len(order), dtype=np.int64)
+    user_sequence_ids[order] = np.repeat(taskrun_sequence, np.diff(np.append(taskrun_starts, len(order))))
+    highlights['user_sequence_id'] = user_sequence_ids
+    return int(sizes.max())
+
+def remove_overlaps(highlights, show_trims=True, trim_log_path=None, order=None):
+    # Within each (article, contributor, topic) ordered by position, a
+    # highlight may not start before the end of any earlier highlight.
+    # Trims are counted instead of printed one by one, and can be
+    # written to a CSV file at trim_log_path.
+    start_pos = highlights['start_pos']
+    end_pos = highlights['end_pos']
+    if order is None:
+        order = highlight_order(highlights)
+    group_keys = np.stack((
+        highlights['article_sha256'][order],
+        highlights['contributor_uuid'][order],
+        highlights['topic_name'][order],
+    ))
+    first_row = np.concatenate(([True], (group_keys[:, 1:] != group_keys[:, :-1]).any(axis=0)))
+    starts = start_pos[order]
+    ends = end_pos[order]
+    # Segmented running maximum: offsetting every group above the whole
+    # range of the previous one keeps the maximum from leaking across.
+    offsets = (np.cumsum(first_row) - 1) * (int(ends.max()) + 1 if len(ends) else 1)
+    max_pos = np.maximum.accumulate(ends + offsets) - offsets
+    previous_max = np.concatenate(([0], max_pos[:-1]))
+    trimmed_starts = np.where(first_row, starts, np.maximum(starts, previous_max))
+    trimmed_ends = np.where(first_row, ends, np.maximum(ends, previous_max))
+    trimmed = np.flatnonzero((trimmed_starts != starts) | (trimmed_ends != ends))
+    if show_trims:
+        print("Trimmed {} overlapping highlights in {} articles.".format(
+            len(trimmed), len(np.unique(group_keys[0, trimmed]))
+        ))
+    if trim_log_path:
+        write_trim_log(
+            highlights, order[trimmed], starts[trimmed], ends[trimmed],
+            trimmed_starts[trimmed], trimmed_ends[trimmed], trim_log_path,
+        )
+    start_pos[order] = trimmed_starts
+    end_pos[order] = trimmed_ends
+
+def write_trim_log(highlights, rows, starts, ends, trimmed_starts, trimmed_ends, output_path):
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(TRIM_LOG_COLUMNS)
+        writer.writerows(zip(
+            highlights.decode('article_sha256', highlights['article_sha256'][rows]),
+            highlights.decode('contributor_uuid', highlights['contributor_uuid'][rows]),
+            highlights.decode('topic_name', highlights['topic_name'][rows]),
+            starts.tolist(), ends.tolist(), trimmed_starts.tolist(), trimmed_ends.tolist(),
+        ))
 
 def output_separate_topics(
-        article_dict, maximum_raters, cumulative_length, virtual_corpus_positions,
-        output_dir=None, batch_name=None
+        highlights, virtual_corpus_positions, output_dir=None, batch_name=None, jobs=1, bootstrap=None,
+        compress=False, approximation=None, diagnostics=None
     ):
-    sort_by_topic = itemgetter('topic_name')
-    sorted_rows = sorted(chain.from_iterable(article_dict.values()), key=sort_by_topic)
-    for topic_name, rows in groupby(sorted_rows, key=sort_by_topic):
-        rows = list(rows) # copy since we want to iterate over twice
-        print_alpha_for_topic(topic_name, rows, maximum_raters, cumulative_length, virtual_corpus_positions)
-        if output_dir and batch_name:
-            out_filename = batch_name.format(topic_name)
-            print("Saving topic '{}' to '{}'".format(topic_name, out_filename))
-            save_ualpha_format(rows, virtual_corpus_positions, output_dir, out_filename)
-
-def print_alpha_for_topic(topic_name, rows, maximum_raters, cumulative_length, virtual_corpus_positions):
-    dtype=float
-    reliability_data = np.full((maximum_raters, cumulative_length), np.nan, dtype=dtype)
-    for row_count, output_row in output_generator(rows, virtual_corpus_positions):
-        start_pos = output_row['start_pos']
-        end_pos = output_row['end_pos']
-        user_sequence_id = output_row['user_sequence_id']
-        topic_number = output_row['topic_number']
-        reliability_data[user_sequence_id][start_pos:end_pos] = dtype(topic_number)
-    k_alpha = alpha(reliability_data=reliability_data, level_of_measurement='nominal')
-    print("Krippendorff alpha is {:.3f} for '{}'".format(k_alpha, topic_name))
+    # Topics are independent, so with jobs > 1 they are computed by a
+    # pool of forked workers that inherit the highlights.
+    # With an approximation, alphas are estimated from sampled articles
+    # and no uAlpha files are written.
+    # With a diagnostics list, the unit diagnostic table of every topic
+    # is added to it, computed from the same runs as the topic's alpha.
+    order, topic_ranges = topic_order(highlights)
+    shared_inputs = (
+        highlights, order, virtual_corpus_positions, output_dir, batch_name, bootstrap, compress, approximation,
+        diagnostics is not None,
+    )
+    # Returns (topic_name, alpha) for every topic.
+    results = []
+    for topic_name, k_alpha, table in run_in_order(output_topic, topic_ranges, jobs, shared_inputs):
+        results.append((topic_name, k_alpha))
+        if diagnostics is not None:
+            diagnostics.append(table)
+    return results
+
+def output_topic(shared_inputs, topic_range):
+    (highlights, order, virtual_corpus_positions, output_dir, batch_name, bootstrap, compress,
+     approximation, diagnostics) = shared_inputs
+    topic_name, start, end = topic_range
+    rows = highlights.take(order[start:end])
+    table = None
+    if approximation:
+        with stage('topic_alpha'):
+            estimate = approximate_alpha_for_topic(rows, virtual_corpus_positions, approximation)
+        print(approximate_summary(topic_name, estimate, 'articles'))
+        # Sampled articles give no runs of every article.
+        if diagnostics:
+            with stage('unit_diagnostics'):
+                runs = segment_runs(topic_segments(rows, virtual_corpus_positions, show_skipped=False))
+                value_domain, value_counts, lengths, run_starts = runs
+                o = coincidences_from_value_counts(value_counts, weights=lengths)
+                table = topic_unit_diagnostics(topic_name, rows, virtual_corpus_positions, runs, o)
+        return topic_name, estimate.alpha, table
+    # The segments are sorted once, for alpha, the unit diagnostics and
+    # the uAlpha file.
+    with stage('topic_alpha'):
+        segments = topic_segments(rows, virtual_corpus_positions)
+        runs = segment_runs(segments)
+        k_alpha, o = print_alpha_for_runs(topic_name, runs, bootstrap=bootstrap)
+    if diagnostics:
+        with stage('unit_diagnostics'):
+            table = topic_unit_diagnostics(topic_name, rows, virtual_corpus_positions, runs, o)
+    if output_dir and batch_name:
+        out_filename = batch_name.format(topic_name)
+        if compress:
+            out_filename += '.gz'
+        print("Saving topic '{}' to '{}'".format(topic_name, out_filename))
+        with stage('save_ualpha_format'):
+            write_ualpha_segments(segments, os.path.join(output_dir, out_filename), compress=compress)
+    return topic_name, k_alpha, table
 
-def save_ualpha_format(rows, virtual_corpus_positions, output_dir, out_filename):
-    fieldnames = [
-        'row_label',
-        'user_sequence_id',
-        'topic_number',
-        'empty_col',
-        'start_pos',
-        'end_pos',
+def topic_order(highlights):
+    # Row order sorted by topic, and the (topic_name, start, end) range
+    # of every topic within that order.
+    topic_codes = highlights['topic_name']
+    order = np.argsort(topic_codes, kind='stable')
+    starts = group_starts(topic_codes[order])
+    topic_ranges = [
+        (highlights.decode('topic_name', topic_codes[order[start]]), start, end)
+        for start, end in zip(starts, np.append(starts[1:], len(order)))
     ]
-    output_path = os.path.join(output_dir, out_filename)
-    with open(output_path, 'w') as output_file:
-        writer = csv.DictWriter(output_file, fieldnames=fieldnames)
-        for row_count, output_row in output_generator(rows, virtual_corpus_positions):
-            writer.writerow(output_row)
+    return order, topic_ranges
+
+def split_topics(highlights):
+    order, topic_ranges = topic_order(highlights)
+    for topic_name, start, end in topic_ranges:
+        yield topic_name, highlights.take(order[start:end])
+
+def print_alpha_for_topic(topic_name, rows, virtual_corpus_positions, bootstrap=None):
+    segments = topic_segments(rows, virtual_corpus_positions)
+    return print_alpha_for_segments(topic_name, segments, bootstrap=bootstrap)
+
+def print_alpha_for_segments(topic_name, segments, bootstrap=None):
+    k_alpha, o = print_alpha_for_runs(topic_name, segment_runs(segments), bootstrap=bootstrap)
+    return k_alpha
+
+def print_alpha_for_runs(topic_name, runs, bootstrap=None):
+    # Returns alpha and the coincidences.
+    value_domain, value_counts, lengths, run_starts = runs
+    o = coincidences_from_value_counts(value_counts, weights=lengths)
+    k_alpha = alpha_from_coincidences(o, value_domain, level_of_measurement='nominal')
+    print("Krippendorff alpha is {:.3f} for '{}'".format(k_alpha, topic_name))
+    if bootstrap:
+        print(bootstrap.summary(o, value_domain, 'nominal', pair_count(value_counts, weights=lengths)))
+    return k_alpha, o
+
+def alpha_for_topic(rows, virtual_corpus_positions):
+    o, value_domain, pairs = topic_coincidences(rows, virtual_corpus_positions)
+    return alpha_from_coincidences(o, value_domain, level_of_measurement='nominal')
+
+def approximate_alpha_for_topic(rows, virtual_corpus_positions, approximation):
+    # Samples whole articles of the topic.
+    topic_articles, article_codes = np.unique(rows['article_sha256'], return_inverse=True)
+    return approximation.estimate(
+        len(topic_articles),
+        partial(topic_fold_coincidences, rows, topic_articles, article_codes, virtual_corpus_positions),
+        binary_alpha,
+    )
+
+def topic_fold_coincidences(rows, topic_articles, article_codes, virtual_corpus_positions, groups, folds, fold_count):
+    # Coincidences of the sampled articles added up per fold. A topic
+    # only has two values, the topic and NO_HIGHLIGHT.
+    sample = rows.take(np.flatnonzero(np.isin(article_codes, groups)))
+    segments = topic_segments(sample, virtual_corpus_positions, show_skipped=False)
+    value_codes = (segments['topic_number'] == NO_HIGHLIGHT).astype(np.int64)
+    value_counts, lengths, run_starts = span_value_counts(
+        segments['start_pos'], segments['end_pos'], value_codes, 2
+    )
+    articles, article_text_lengths, by_position = article_positions(sample, virtual_corpus_positions)
+    run_articles = articles_of_runs(run_starts, articles, by_position, virtual_corpus_positions)
+    fold_of_article = np.zeros(len(topic_articles), dtype=np.int64)
+    fold_of_article[groups] = folds
+    run_folds = fold_of_article[np.searchsorted(topic_articles, articles)][run_articles]
+    return grouped_coincidences(value_counts, run_folds, fold_count, weights=lengths)
+
+def rater_pair_table_for_topics(highlights, virtual_corpus_positions):
+    # Characters shared and characters disagreed on by every two raters
+    # of an article, per topic.
+    tables = []
+    contributor_uuids = highlights.categories['contributor_uuid']
+    for topic_name, rows in split_topics(highlights):
+        segments = topic_segments(rows, virtual_corpus_positions, show_skipped=False)
+        highlighted = segments['topic_number'] != NO_HIGHLIGHT
+        o, value_domain, pairs = segment_coincidences(segments)
+        d, expected_disagreement = disagreement_metric(o, value_domain, 'nominal')
+        rater_pairs = span_rater_pairs(
+            segments['article_sha256'], segments['contributor_uuid'],
+            segments['start_pos'], segments['end_pos'], highlighted,
+        )
+        tables.append(rater_pair_table(topic_name, rater_pairs, contributor_uuids, expected_disagreement))
+    return concatenate_tables(tables)
+
+def topic_unit_diagnostics(topic_name, rows, virtual_corpus_positions, runs, o):
+    # Every article's share of the disagreement of the topic, in
+    # characters, from the runs and coincidences of the topic's alpha.
+    value_domain, value_counts, lengths, run_starts = runs
+    d, expected_disagreement = disagreement_metric(o, value_domain, 'nominal')
+    articles, article_text_lengths, by_position = article_positions(rows, virtual_corpus_positions)
+    run_articles = articles_of_runs(run_starts, articles, by_position, virtual_corpus_positions)
+    pairable, disagreement = grouped_disagreement(value_counts, d, run_articles, len(articles), weights=lengths)
+    return unit_diagnostic_table(
+        topic_name, rows.decode('article_sha256', articles), pairable, disagreement, expected_disagreement
+    )
+
+def topic_coincidences(rows, virtual_corpus_positions):
+    # Instead of painting a (raters x corpus characters) matrix, compute
+    # the coincidences directly from the highlight spans, so memory
+    # scales with the number of highlights rather than corpus length.
+    # Also returns the value domain and the number of pairs of values.
+    return segment_coincidences(topic_segments(rows, virtual_corpus_positions))
+
+def segment_coincidences(segments):
+    value_domain, value_counts, lengths, run_starts = segment_runs(segments)
+    o = coincidences_from_value_counts(value_counts, weights=lengths)
+    return o, value_domain, pair_count(value_counts, weights=lengths)
+
+def segment_runs(segments):
+    # The value domain, and the value counts, length and start position
+    # of every run of the segments (see span_value_counts).
+    value_domain, value_codes = np.unique(segments['topic_number'], return_inverse=True)
+    value_counts, lengths, run_starts = span_value_counts(
+        segments['start_pos'], segments['end_pos'], value_codes, len(value_domain)
+    )
+    return value_domain, value_counts, lengths, run_starts
+
+def save_ualpha_format(rows, virtual_corpus_positions, output_dir, out_filename, compress=False):
+    segments = topic_segments(rows, virtual_corpus_positions)
+    write_ualpha_segments(segments, os.path.join(output_dir, out_filename), compress=compress)
+
+def write_ualpha_segments(segments, output_path, compress=False):
+    # Same bytes as csv.DictWriter writing one row per segment, but a
+    # whole chunk of segments is formatted by one % operation on a
+    # repeated row format, and written as one buffer.
+    if compress:
+        output_file = gzip.open(output_path, 'wb', compresslevel=6)
+    else:
+        output_file = open(output_path, 'wb', buffering=2**20)
+    with output_file:
+        for chunk in ualpha_chunks(segments):
+            output_file.write(chunk)
+
+def ualpha_chunks(segments, chunk_rows=UALPHA_CHUNK_ROWS):
+    # Rows are labelled u0, u1, ... in segment order.
+    columns = (
+        segments['user_sequence_id'], segments['topic_number'], segments['start_pos'], segments['end_pos'],
+    )
+    for start in range(0, len(segments), chunk_rows):
+        end = min(start + chunk_rows, len(segments))
+        values = np.column_stack((np.arange(start, end),) + tuple(column[start:end] for column in columns))
+        yield ((UALPHA_ROW_FORMAT * (end - start)) % tuple(values.ravel().tolist())).encode('ascii')
 
 def output_generator(rows, virtual_corpus_positions):
-    sort_by_article = itemgetter('article_sha256')
-    sorted_rows = sorted(rows, key=sort_by_article)
-    sort_by_rater = itemgetter('user_sequence_id')
-    sort_by_pos = itemgetter('start_pos', 'end_pos')
-    row_count = 0
-    skipped_articles = set()
-    for article_sha256, article_rows_sorted in groupby(sorted_rows, key=sort_by_article):
-        rows_by_rater = sorted(article_rows_sorted, key=sort_by_rater)
-        raters = unique_raters(rows_by_rater)
-        if len(raters) < 2:
-            skipped_articles.add(article_sha256)
-            continue
-        for user_sequence_id, taskrun_rows_sorted  in groupby(rows_by_rater, key=sort_by_rater):
-            rows_by_pos = sorted(taskrun_rows_sorted, key=sort_by_pos)
-            virtual_position = virtual_corpus_positions[article_sha256]
-            current_pos = 0
-            for row in rows_by_pos:
-                if current_pos < row['start_pos']:
-                    negative_highlight = {
-                        'row_label': "u{}".format(row_count),
-                        'user_sequence_id': row['user_sequence_id'],
-                        'topic_number': NO_HIGHLIGHT,
-                        'empty_col': '',
-                        'start_pos': virtual_position + current_pos,
-                        'end_pos': virtual_position + row['start_pos'],
-                    }
-                    yield row_count, negative_highlight
-                    row_count += 1
-                output_row = {
-                    'row_label': "u{}".format(row_count),
-                    'user_sequence_id': row['user_sequence_id'],
-                    'topic_number': row['topic_number'],
-                    'empty_col': '',
-                    'start_pos': virtual_position + row['start_pos'],
-                    'end_pos': virtual_position + row['end_pos'],
-                }
-                yield row_count, output_row
-                row_count += 1
-                current_pos = row['end_pos']
-            article_text_length = row['article_text_length']
-            if current_pos < article_text_length:
-                negative_highlight = {
-                    'row_label': "u{}".format(row_count),
-                    'user_sequence_id': row['user_sequence_id'],
-                    'topic_number': NO_HIGHLIGHT,
-                    'empty_col': '',
-                    'start_pos': virtual_position + current_pos,
-                    'end_pos': virtual_position + article_text_length,
-                }
-                yield row_count, negative_highlight
-                row_count += 1
-                current_pos = article_text_length
-    if len(skipped_articles):
-        print("Skipped {} articles with less than two raters.".format(len(skipped_articles)))
+    # One dict per uAlpha row, for checking the bulk writer.
+    segments = topic_segments(rows, virtual_corpus_positions)
+    columns = zip(
+        segments['user_sequence_id'].tolist(),
+        segments['topic_number'].tolist(),
+        segments['start_pos'].tolist(),
+        segments['end_pos'].tolist(),
+    )
+    for row_count, (user_sequence_id, topic_number, start_pos, end_pos) in enumerate(columns):
+        output_row = {
+            'row_label': "u{}".format(row_count),
+            'user_sequence_id': user_sequence_id,
+            'topic_number': topic_number,
+            'empty_col': '',
+            'start_pos': start_pos,
+            'end_pos': end_pos,
+        }
+        yield row_count, output_row
 
-def unique_raters(rows):
-    raters = set()
-    for row in rows:
-        raters.add(row['contributor_uuid'])
-    return raters
+def topic_segments(rows, virtual_corpus_positions, show_skipped=True):
+    # One topic's highlights as uAlpha segments on the virtual corpus.
+    # Every rater of an article covers the whole article: the text
+    # between and after their highlights becomes NO_HIGHLIGHT segments.
+    # Articles with less than two raters for the topic are skipped.
+    article_codes = rows['article_sha256']
+    raters = article_raters(rows)
+    skipped_articles = np.flatnonzero((raters > 0) & (raters < 2))
+    kept = np.flatnonzero(raters[article_codes] >= 2)
+    order = kept[np.lexsort((
+        kept, rows['end_pos'][kept], rows['start_pos'][kept],
+        rows['user_sequence_id'][kept], article_codes[kept],
+    ))]
+    article_codes = article_codes[order]
+    user_sequence_ids = rows['user_sequence_id'][order]
+    topic_numbers = rows['topic_number'][order]
+    starts = rows['start_pos'][order]
+    ends = rows['end_pos'][order]
+    article_text_lengths = rows['article_text_length'][order]
+    taskrun_keys = pair_codes(article_codes, user_sequence_ids)
+    first_row = np.concatenate(([True], taskrun_keys[1:] != taskrun_keys[:-1]))
+    last_row = np.concatenate((taskrun_keys[1:] != taskrun_keys[:-1], [True]))
+    previous_ends = np.where(first_row, 0, np.concatenate(([0], ends[:-1])))
+    has_gap = previous_ends < starts
+    has_tail = last_row & (ends < article_text_lengths)
+    # Emit, for every row, the gap before it, the row itself and, after
+    # the last row of a task run, the rest of the article.
+    segment_rows = np.concatenate((
+        np.flatnonzero(has_gap), np.arange(len(order)), np.flatnonzero(has_tail)
+    ))
+    segment_kinds = np.concatenate((
+        np.zeros(has_gap.sum(), dtype=np.int64),
+        np.ones(len(order), dtype=np.int64),
+        np.full(has_tail.sum(), 2, dtype=np.int64),
+    ))
+    segment_order = np.lexsort((segment_kinds, segment_rows))
+    segment_rows = segment_rows[segment_order]
+    segment_kinds = segment_kinds[segment_order]
+    segment_starts = np.select(
+        [segment_kinds == 0, segment_kinds == 1],
+        [previous_ends[segment_rows], starts[segment_rows]],
+        ends[segment_rows],
+    )
+    segment_ends = np.select(
+        [segment_kinds == 0, segment_kinds == 1],
+        [starts[segment_rows], ends[segment_rows]],
+        article_text_lengths[segment_rows],
+    )
+    virtual_positions = virtual_corpus_positions[article_codes[segment_rows]]
+    if len(skipped_articles) and show_skipped:
+        print("Skipped {} articles with less than two raters.".format(len(skipped_articles)))
+    return ColumnarExport({
+        'article_sha256': article_codes[segment_rows],
+        'contributor_uuid': rows['contributor_uuid'][order][segment_rows],
+        'user_sequence_id': user_sequence_ids[segment_rows],
+        'topic_number': np.where(segment_kinds == 1, topic_numbers[segment_rows], NO_HIGHLIGHT),
+        'start_pos': virtual_positions + segment_starts,
+        'end_pos': virtual_positions + segment_ends,
+    }, {})
 
 def load_args():
     parser = argparse.ArgumentParser()
@@ -278,6 +853,52 @@ def load_args():
     parser.add_argument(
         '-o', '--output-dir',
         help='Output directory')
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='Number of worker processes parsing the export and computing topics in parallel.')
+    parser.add_argument(
+        '--gzip',
+        action='store_true',
+        help='Write gzip compressed uAlpha files (.csv.gz).')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always parse the CSV file instead of using or writing a parse cache next to it.')
+    add_bootstrap_args(parser)
+    add_approximate_args(parser)
+    add_window_args(parser)
+    add_rater_pair_args(parser)
+    add_diagnostic_args(parser)
+    parser.add_argument(
+        '--topic',
+        action='append',
+        metavar='TOPIC_NAME',
+        help='Only compute this topic. Repeat for more topics.')
+    parser.add_argument(
+        '--trim-log',
+        metavar='OUTPUT_FILE',
+        help='Write every overlapping highlight that was trimmed, before and after, to this CSV file.')
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Bounded memory mode: partition the export by article on disk and '
+             'process one partition at a time. Does not write uAlpha files.')
+    parser.add_argument(
+        '--partitions',
+        type=int,
+        default=DEFAULT_PARTITIONS,
+        help='Number of partition files for --stream.')
+    parser.add_argument(
+        '--work-dir',
+        help='Directory for the --stream partition files (default: system temp).')
+    parser.add_argument(
+        '--update',
+        metavar='STATE_FILE',
+        help='Only recompute articles that changed since the run that wrote STATE_FILE, '
+             'creating it on the first run. Does not write uAlpha files.')
+    add_profile_args(parser)
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -291,6 +912,42 @@ if __name__ == "__main__":
     output_dir = os.path.dirname(input_file)
     if args.output_dir:
         output_dir = args.output_dir
-    split_highlighter(
-        input_file, output_dir, bare_filename + "-uAlpha-{}.csv",
-    )
+    if args.approximate and (args.update or args.stream):
+        raise SystemExit("--approximate can not be combined with --update or --stream.")
+    if args.topic and (args.update or args.stream or args.window_days):
+        raise SystemExit("--topic can not be combined with --update, --stream or --window-days.")
+    if args.stream and arrow_format(input_file):
+        raise SystemExit("--stream reads CSV exports only.")
+    if args.window_days and (args.update or args.stream or args.approximate):
+        raise SystemExit("--window-days can not be combined with --update, --stream or --approximate.")
+    if args.window_days and (args.bootstrap or args.jobs > 1):
+        raise SystemExit("--window-days can not be combined with --bootstrap or --jobs.")
+    if args.rater_pairs and (args.update or args.stream or args.window_days):
+        raise SystemExit("--rater-pairs can not be combined with --update, --stream or --window-days.")
+    if args.unit_diagnostics and (args.update or args.stream or args.window_days):
+        raise SystemExit("--unit-diagnostics can not be combined with --update, --stream or --window-days.")
+    with profile_from_args(args):
+        if args.window_days:
+            windowed_highlighter(
+                input_file, windows_from_args(args), use_cache=not args.no_cache, window_path=args.window_file,
+            )
+        elif args.update:
+            update_highlighter(
+                input_file, args.update, use_cache=not args.no_cache, bootstrap=bootstrap_from_args(args),
+            )
+        elif args.stream:
+            split_highlighter_streaming(
+                input_file, partitions=args.partitions, work_dir=args.work_dir,
+                bootstrap=bootstrap_from_args(args),
+            )
+        else:
+            try:
+                split_highlighter(
+                    input_file, output_dir, bare_filename + "-uAlpha-{}.csv",
+                    jobs=args.jobs, use_cache=not args.no_cache, bootstrap=bootstrap_from_args(args),
+                    compress=args.gzip, approximation=approximation_from_args(args),
+                    rater_pairs_path=args.rater_pairs, diagnostics_path=args.unit_diagnostics, worst=args.worst,
+                    trim_log_path=args.trim_log, topics=args.topic,
+                )
+            except UnknownLabelError as error:
+                raise SystemExit(str(error))
@@ -0,0 +1,75 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A state file keeps the coincidence contributions of every article or
+# unit from the previous run, so a newer export of the same project only
+# needs the articles or units whose task runs changed to be recomputed.
+# It is an uncompressed .npz file with a JSON 'metadata' entry.
+STATE_VERSION = 1
+
+def load_state(state_path, kind):
+    # Returns (metadata, arrays), or None if there is no usable state.
+    if not state_path or not os.path.exists(state_path):
+        return None
+    with np.load(state_path, allow_pickle=False) as state:
+        metadata = json.loads(str(state['metadata']))
+        if metadata.get('state_version') != STATE_VERSION or metadata.get('kind') != kind:
+            logger.warning("Ignoring state file '%s' from another version or project type.", state_path)
+            return None
+        arrays = {key: state[key] for key in state.files if key != 'metadata'}
+    return metadata, arrays
+
+def save_state(state_path, kind, metadata, arrays):
+    metadata = dict(metadata, state_version=STATE_VERSION, kind=kind)
+    temporary_path = state_path + '.tmp'
+    with open(temporary_path, 'wb') as state_file:
+        np.savez(state_file, metadata=np.array(json.dumps(metadata)), **arrays)
+    os.replace(temporary_path, state_path)
+
+def changed_groups(export, group_column, watermark, stored_groups, stored_row_counts):
+    # Compares an export with the groups (articles or units) of a state.
+    # A group changed if it has rows created after the watermark or a
+    # different number of rows than before, and it was removed if it is
+    # no longer in the export.
+    # Returns the changed group codes, the removed group names, and the
+    # names and row counts of all groups now in the export.
+    names = export.categories[group_column]
+    codes = export[group_column]
+    row_counts = np.bincount(codes, minlength=len(names))
+    newer = np.zeros(len(names), dtype=bool)
+    if watermark is not None:
+        newer_created = export.categories['created'] > watermark
+        newer[codes[newer_created[export['created']]]] = True
+    stored_counts = np.full(len(names), -1, dtype=np.int64)
+    if len(stored_groups):
+        found = np.searchsorted(stored_groups, names).clip(0, len(stored_groups) - 1)
+        matches = stored_groups[found] == names
+        stored_counts[matches] = stored_row_counts[found[matches]]
+    present = row_counts > 0
+    changed = np.flatnonzero(present & (newer | (row_counts != stored_counts)))
+    removed = stored_groups[~np.isin(stored_groups, names[present])]
+    return changed, removed, names[present], row_counts[present]
+
+def watermark_of(export):
+    # Latest created timestamp in the export.
+    if len(export) == 0:
+        return None
+    return str(export.categories['created'][export['created'].max()])
@@ -0,0 +1,148 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import csv
+import numpy as np
+from columnar import group_starts, pair_codes
+
+# Agreement between every two raters of a variable: how many values they
+# could be paired on (units both rated, or characters of articles both
+# highlighted) and the total distance between their values there. Only
+# pairs of raters that share a unit are kept, so the result stays sparse
+# with thousands of contributors. The pairs of every unit are found for
+# all units with the same number of raters at once, as index arrays of
+# shape (units x pairs), instead of looping over units or rater pairs.
+# pair_alpha is 1 - (mean distance of the pair) / (expected disagreement
+# of the variable), alpha as if the whole variable looked like the pair.
+
+RATER_PAIR_COLUMNS = ('variable', 'rater_a', 'rater_b', 'shared', 'disagreement', 'pair_alpha')
+
+def pairs_within_groups(group_codes):
+    # Row indices (first, second) of every two rows with the same group
+    # code.
+    group_codes = np.asarray(group_codes)
+    order = np.argsort(group_codes, kind='stable')
+    starts = group_starts(group_codes[order])
+    sizes = np.diff(np.append(starts, len(order)))
+    firsts = [np.zeros(0, dtype=np.int64)]
+    seconds = [np.zeros(0, dtype=np.int64)]
+    for size in np.unique(sizes[sizes >= 2]):
+        block = starts[sizes == size][:, np.newaxis] + np.arange(size)
+        first, second = np.triu_indices(size, 1)
+        firsts.append(order[block[:, first]].ravel())
+        seconds.append(order[block[:, second]].ravel())
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+def rater_pair_totals(rater_a, rater_b, shared, disagreement):
+    # Adds up shared values and disagreement per unordered rater pair,
+    # with rater_a < rater_b.
+    low = np.minimum(rater_a, rater_b)
+    high = np.maximum(rater_a, rater_b)
+    keys, inverse = np.unique(pair_codes(low, high), return_inverse=True)
+    first_rows = np.zeros(len(keys), dtype=np.int64)
+    first_rows[inverse] = np.arange(len(inverse))
+    return {
+        'rater_a': low[first_rows],
+        'rater_b': high[first_rows],
+        'shared': np.rint(np.bincount(inverse, weights=shared, minlength=len(keys))).astype(np.int64),
+        'disagreement': np.bincount(inverse, weights=disagreement, minlength=len(keys)),
+    }
+
+def rating_rater_pairs(unit_codes, rater_codes, value_codes, distances):
+    # From one rating per (unit, rater): each pair of raters of a unit
+    # shares one value, and disagrees by the distance between theirs.
+    first, second = pairs_within_groups(unit_codes)
+    return rater_pair_totals(
+        rater_codes[first], rater_codes[second], np.ones(len(first)),
+        distances[value_codes[first], value_codes[second]],
+    )
+
+def span_rater_pairs(article_codes, rater_codes, starts, ends, highlighted):
+    # From segments where every rater of an article covers the whole
+    # article: two raters share the article's characters and disagree on
+    # the characters only one of them highlighted, |A| + |B| - 2 |A & B|.
+    # A rater's highlights do not overlap each other, so |A & B| is the
+    # sum of the overlaps of every highlight of A with every one of B.
+    lengths = ends - starts
+    taskruns, first_rows, taskrun_codes = np.unique(
+        pair_codes(article_codes, rater_codes), return_index=True, return_inverse=True
+    )
+    article_length = np.bincount(taskrun_codes, weights=lengths, minlength=len(taskruns))
+    highlighted_length = np.bincount(taskrun_codes, weights=lengths * highlighted, minlength=len(taskruns))
+    first, second = pairs_within_groups(article_codes[first_rows])
+    taskrun_raters = rater_codes[first_rows]
+    highlights = np.flatnonzero(highlighted)
+    highlight_first, highlight_second = pairs_within_groups(article_codes[highlights])
+    highlight_first = highlights[highlight_first]
+    highlight_second = highlights[highlight_second]
+    different = rater_codes[highlight_first] != rater_codes[highlight_second]
+    highlight_first = highlight_first[different]
+    highlight_second = highlight_second[different]
+    overlaps = np.clip(
+        np.minimum(ends[highlight_first], ends[highlight_second])
+        - np.maximum(starts[highlight_first], starts[highlight_second]), 0, None
+    )
+    return rater_pair_totals(
+        np.concatenate((taskrun_raters[first], rater_codes[highlight_first])),
+        np.concatenate((taskrun_raters[second], rater_codes[highlight_second])),
+        np.concatenate((article_length[first], np.zeros(len(overlaps)))),
+        np.concatenate((highlighted_length[first] + highlighted_length[second], -2 * overlaps)),
+    )
+
+def rater_pair_table(label, pairs, rater_names, expected_disagreement):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pair_alpha = 1 - pairs['disagreement'] / pairs['shared'] / expected_disagreement
+    return {
+        'variable': np.full(len(pairs['shared']), label, dtype=object),
+        'rater_a': rater_names[pairs['rater_a']],
+        'rater_b': rater_names[pairs['rater_b']],
+        'shared': pairs['shared'],
+        'disagreement': pairs['disagreement'],
+        'pair_alpha': pair_alpha,
+    }
+
+def concatenate_tables(tables, columns=RATER_PAIR_COLUMNS):
+    if not tables:
+        return {name: np.zeros(0) for name in columns}
+    return {name: np.concatenate([table[name] for table in tables]) for name in columns}
+
+def write_rater_pairs(table, output_path):
+    # An .npz output path gets one array per column, anything else a CSV.
+    if output_path.endswith('.npz'):
+        arrays = {name: table[name] for name in RATER_PAIR_COLUMNS}
+        for name in ('variable', 'rater_a', 'rater_b'):
+            arrays[name] = np.asarray(table[name], dtype=str)
+        np.savez_compressed(output_path, **arrays)
+        return
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(RATER_PAIR_COLUMNS)
+        writer.writerows(zip(
+            table['variable'], table['rater_a'], table['rater_b'], table['shared'].tolist(),
+            table['disagreement'].tolist(), np.round(table['pair_alpha'], 6).tolist(),
+        ))
+
+def print_rater_pair_summary(table, output_path):
+    variables = len(set(table['variable']))
+    print("----Rater Pair Report----")
+    print("{} rater pairs sharing values in {} variables written to '{}'."
+          .format(len(table['shared']), variables, output_path))
+    print("----End Rater Pair Report----")
+
+def add_rater_pair_args(parser):
+    parser.add_argument(
+        '--rater-pairs',
+        metavar='OUTPUT_FILE',
+        help='Write the values shared and the disagreement of every pair of raters, per variable, '
+             'to this CSV file, or .npz file.')
@@ -0,0 +1,54 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+import sys
+import multiprocessing
+from contextlib import redirect_stdout
+
+# Runs independent tasks (topics, questions) in a pool of forked worker
+# processes. The large shared inputs are stored in a module global right
+# before the pool is created, so workers inherit them through fork and
+# only the small task descriptions are pickled.
+# Anything a task prints is captured in the worker and written by the
+# parent in task order, so the output is the same as a serial run.
+
+_shared_inputs = None
+
+def run_in_order(function, tasks, jobs=1, shared_inputs=None):
+    # Calls function(shared_inputs, task) for every task and yields the
+    # results in the order of tasks.
+    global _shared_inputs
+    tasks = list(tasks)
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield function(shared_inputs, task)
+        return
+    _shared_inputs = shared_inputs
+    try:
+        context = multiprocessing.get_context('fork')
+        with context.Pool(min(jobs, len(tasks))) as pool:
+            work = [(function, task) for task in tasks]
+            for output, result in pool.imap(_run_captured, work):
+                sys.stdout.write(output)
+                yield result
+    finally:
+        _shared_inputs = None
+
+def _run_captured(work):
+    function, task = work
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = function(_shared_inputs, task)
+    return output.getvalue(), result
@@ -0,0 +1,129 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import json
+import hashlib
+import logging
+from contextlib import closing
+import numpy as np
+from columnar import ColumnarExport, load_columns, filter_rows
+from arrow_io import arrow_format, load_arrow_columns
+from chunked_csv import load_columns_parallel
+
+logger = logging.getLogger(__name__)
+
+# Parsed exports are cached as uncompressed .npz files next to the
+# export, so re-running on the same export skips decompressing and
+# parsing the CSV. The cache is used when it was written by the same
+# PARSER_VERSION for the same columns, and the export has the same size
+# and either the same mtime or, if only the mtime changed, the same
+# SHA-256 of its bytes, in which case the cache is rewritten with the
+# new mtime.
+# Bump PARSER_VERSION whenever load_columns changes what it produces.
+# Parquet and Arrow files are read directly, without a cache.
+PARSER_VERSION = 1
+CACHE_SUFFIX = '.columns.npz'
+
+def load_columns_cached(
+        input_path, open_file, int_columns=(), categorical_columns=(), use_cache=True, filters=None, jobs=1
+    ):
+    # open_file(input_path) returns the text file handle to parse, e.g.
+    # gunzip_if_needed. filters maps categorical columns to the values
+    # of the rows to keep (see filter_rows). With jobs > 1 a CSV export
+    # that is not cached is parsed in jobs processes, reading the file
+    # itself rather than through open_file.
+    if arrow_format(input_path):
+        return load_arrow_columns(input_path, int_columns, categorical_columns, filters)
+    return filter_rows(
+        load_csv_columns(input_path, open_file, int_columns, categorical_columns, use_cache, jobs), filters
+    )
+
+def load_csv_columns(input_path, open_file, int_columns, categorical_columns, use_cache, jobs=1):
+    if not use_cache:
+        return parse_columns(input_path, open_file, int_columns, categorical_columns, jobs)
+    cache_path = input_path + CACHE_SUFFIX
+    stat = os.stat(input_path)
+    spec = {
+        'parser_version': PARSER_VERSION,
+        'int_columns': list(int_columns),
+        'categorical_columns': list(categorical_columns),
+    }
+    cached = read_cache(cache_path, input_path, stat, spec)
+    if cached is not None:
+        return cached
+    columns = parse_columns(input_path, open_file, int_columns, categorical_columns, jobs)
+    metadata = dict(
+        spec, size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=file_sha256(input_path)
+    )
+    write_cache(cache_path, columns, metadata)
+    return columns
+
+def parse_columns(input_path, open_file, int_columns, categorical_columns, jobs=1):
+    if jobs > 1:
+        return load_columns_parallel(input_path, int_columns, categorical_columns, jobs=jobs)
+    with closing(open_file(input_path)) as csv_file:
+        return load_columns(csv_file, int_columns=int_columns, categorical_columns=categorical_columns)
+
+def read_cache(cache_path, input_path, stat, spec):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as cache:
+            metadata = json.loads(str(cache['metadata']))
+            if any(metadata.get(key) != value for key, value in spec.items()):
+                return None
+            if metadata['size'] != stat.st_size:
+                return None
+            touched = metadata['mtime_ns'] != stat.st_mtime_ns
+            if touched and metadata['sha256'] != file_sha256(input_path):
+                return None
+            columns = {}
+            categories = {}
+            for key in cache.files:
+                kind, _, name = key.partition(':')
+                if kind == 'column':
+                    columns[name] = cache[key]
+                elif kind == 'category':
+                    categories[name] = cache[key]
+    except (OSError, ValueError, KeyError) as error:
+        logger.warning("Ignoring unreadable parse cache '%s': %s", cache_path, error)
+        return None
+    export = ColumnarExport(columns, categories)
+    if touched:
+        # Same bytes under a new mtime, e.g. after a copy: record the new
+        # mtime so later runs skip the hash.
+        write_cache(cache_path, export, dict(metadata, mtime_ns=stat.st_mtime_ns))
+    return export
+
+def write_cache(cache_path, columns, metadata):
+    arrays = {'metadata': np.array(json.dumps(metadata))}
+    for name, values in columns.columns.items():
+        arrays['column:' + name] = values
+    for name, values in columns.categories.items():
+        arrays['category:' + name] = values
+    temporary_path = cache_path + '.tmp'
+    try:
+        with open(temporary_path, 'wb') as cache_file:
+            np.savez(cache_file, **arrays)
+        os.replace(temporary_path, cache_path)
+    except OSError as error:
+        logger.warning("Could not write parse cache '%s': %s", cache_path, error)
+
+def file_sha256(input_path):
+    digest = hashlib.sha256()
+    with open(input_path, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
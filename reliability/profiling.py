@@ -0,0 +1,228 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import resource
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+
+# Pipeline stages are wrapped in `with stage('name'):` blocks. They cost
+# nothing unless a Profiler was started with --profile, in which case
+# every stage records its wall and CPU time, the process peak RSS when
+# it ended, the change in current RSS, and the bytes of the arrays it
+# handed to record_arrays. Stages called more than once (per topic, per
+# question) are added up under one name, and nested stages are also
+# included in the stage around them.
+# One stage can additionally be run under cProfile or tracemalloc.
+# Stages run in --jobs worker processes only count towards the stage
+# that started the pool.
+
+_profiler = None
+
+class Profiler:
+    def __init__(self, detail_stage=None, detail_mode='cprofile', top=20):
+        self.detail_stage = detail_stage
+        self.detail_mode = detail_mode
+        self.top = top
+        self.stages = {}
+        self.open_stages = []
+        self.detail = None
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        record = self.stages.setdefault(name, {
+            'name': name, 'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0,
+            'rss_change_mb': 0.0, 'peak_rss_mb': 0.0, 'array_bytes': 0,
+        })
+        detail = name == self.detail_stage and self.detail is None
+        if detail:
+            detail_profiler = self.start_detail()
+        rss = current_rss_mb()
+        started = time.perf_counter()
+        started_cpu = time.process_time()
+        self.open_stages.append(record)
+        try:
+            yield record
+        finally:
+            self.open_stages.pop()
+            record['calls'] += 1
+            record['seconds'] += time.perf_counter() - started
+            record['cpu_seconds'] += time.process_time() - started_cpu
+            if rss is not None:
+                record['rss_change_mb'] += current_rss_mb() - rss
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], peak_rss_mb())
+            if detail:
+                self.detail = self.stop_detail(detail_profiler)
+
+    def record_arrays(self, *values):
+        # Adds the bytes of numpy arrays, or of every column of a
+        # ColumnarExport, to the innermost open stage.
+        if not self.open_stages:
+            return
+        total = 0
+        for value in values:
+            if hasattr(value, 'columns'):
+                total += sum(column.nbytes for column in value.columns.values())
+                total += sum(category.nbytes for category in value.categories.values())
+            else:
+                total += np.asarray(value).nbytes
+        self.open_stages[-1]['array_bytes'] += total
+
+    def start_detail(self):
+        if self.detail_mode == 'tracemalloc':
+            tracemalloc.start()
+            return None
+        detail_profiler = cProfile.Profile()
+        detail_profiler.enable()
+        return detail_profiler
+
+    def stop_detail(self, detail_profiler):
+        if self.detail_mode == 'tracemalloc':
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__)])
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return {
+                'stage': self.detail_stage,
+                'mode': 'tracemalloc',
+                'peak_traced_mb': peak / 2**20,
+                'top': [
+                    {'location': str(statistic.traceback), 'mb': statistic.size / 2**20, 'count': statistic.count}
+                    for statistic in snapshot.statistics('lineno')[:self.top]
+                ],
+            }
+        detail_profiler.disable()
+        stats = pstats.Stats(detail_profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return {
+            'stage': self.detail_stage,
+            'mode': 'cprofile',
+            'top': [
+                {
+                    'function': '{}:{}({})'.format(os.path.basename(filename), line, function),
+                    'calls': calls, 'seconds': own_seconds, 'cumulative_seconds': cumulative_seconds,
+                }
+                for (filename, line, function), (primitive_calls, calls, own_seconds, cumulative_seconds, callers)
+                in rows[:self.top]
+            ],
+        }
+
+    def report(self):
+        return {
+            'command': sys.argv,
+            'seconds': time.perf_counter() - self.started,
+            'cpu_seconds': time.process_time() - self.started_cpu,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': list(self.stages.values()),
+            'detail': self.detail,
+        }
+
+    def write_report(self, report_path):
+        report = self.report()
+        with open(report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        return report
+
+    def summary(self):
+        report = self.report()
+        output = io.StringIO()
+        output.write("----Profile: {:.2f}s wall, {:.2f}s CPU, peak RSS {:.1f} MB----\n"
+                     .format(report['seconds'], report['cpu_seconds'], report['peak_rss_mb']))
+        output.write("{:<28} {:>6} {:>9} {:>9} {:>10} {:>10} {:>10}\n".format(
+            'stage', 'calls', 'wall s', 'cpu s', 'peak MB', 'RSS +MB', 'arrays MB'))
+        for record in report['stages']:
+            output.write("{:<28} {:>6} {:>9.3f} {:>9.3f} {:>10.1f} {:>10.1f} {:>10.1f}\n".format(
+                record['name'], record['calls'], record['seconds'], record['cpu_seconds'],
+                record['peak_rss_mb'], record['rss_change_mb'], record['array_bytes'] / 2**20))
+        if self.detail and self.detail['mode'] == 'cprofile':
+            output.write("----cProfile of '{}' by cumulative time----\n".format(self.detail['stage']))
+            for row in self.detail['top']:
+                output.write("{:>9.3f} {:>9.3f} {:>8} {}\n".format(
+                    row['cumulative_seconds'], row['seconds'], row['calls'], row['function']))
+        elif self.detail:
+            output.write("----tracemalloc of '{}': peak {:.1f} MB----\n"
+                         .format(self.detail['stage'], self.detail['peak_traced_mb']))
+            for row in self.detail['top']:
+                output.write("{:>9.3f} MB {:>8} {}\n".format(row['mb'], row['count'], row['location']))
+        output.write("----End Profile----")
+        return output.getvalue()
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / 2**20
+    return peak / 2**10
+
+def current_rss_mb():
+    # Only available where /proc is.
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+@contextmanager
+def stage(name):
+    if _profiler is None:
+        yield None
+        return
+    with _profiler.stage(name) as record:
+        yield record
+
+def record_arrays(*values):
+    if _profiler is not None:
+        _profiler.record_arrays(*values)
+
+@contextmanager
+def profile(report_path, detail_stage=None, detail_mode='cprofile'):
+    # Profiles the stages run inside the block, then writes the JSON
+    # report and prints the summary. Does nothing without a report_path.
+    global _profiler
+    if not report_path:
+        yield None
+        return
+    _profiler = Profiler(detail_stage=detail_stage, detail_mode=detail_mode)
+    try:
+        yield _profiler
+        _profiler.write_report(report_path)
+        print(_profiler.summary())
+    finally:
+        _profiler = None
+
+def add_profile_args(parser):
+    parser.add_argument(
+        '--profile',
+        metavar='REPORT_JSON',
+        help='Time every stage and record its memory use, write a JSON report and print a summary.')
+    parser.add_argument(
+        '--profile-stage',
+        metavar='STAGE',
+        help='Also run this --profile stage under cProfile or tracemalloc.')
+    parser.add_argument(
+        '--profile-mode',
+        choices=('cprofile', 'tracemalloc'),
+        default='cprofile',
+        help='Detail profiler for --profile-stage.')
+
+def profile_from_args(args):
+    return profile(args.profile, detail_stage=args.profile_stage, detail_mode=args.profile_mode)
@@ -0,0 +1,157 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import numpy as np
+from coincidences import (
+    value_counts_from_ratings, coincidences_from_value_counts, leave_one_out_coincidences,
+    leave_one_out_deltas,
+)
+
+# Greedy search for the raters to exclude: repeatedly remove the rater
+# whose removal raises alpha the most, until alpha reaches a target, no
+# removal raises it, or the maximum number of removals is reached. With
+# several variables (all questions, or the answers of a CHECKBOX
+# question) the mean of their alphas is raised.
+# Every variable keeps its coincidences and each rater's leave-one-out
+# share of them (see leave_one_out_coincidences). Removing a rater only
+# changes the units that rater rated, so only those units' shares are
+# subtracted, recomputed without the rater and added back.
+
+class IncrementalImpact:
+    def __init__(
+            self, unit_codes, rater_codes, value_codes, value_count, rater_count, alphas_of, fixed_counts=None
+        ):
+        # alphas_of returns the alpha of every matrix in a stack of
+        # coincidence matrices. fixed_counts, if given, holds the value
+        # counts per unit of raters without ratings, which are never
+        # removed (see add_constant_raters).
+        self.unit_codes = np.asarray(unit_codes, dtype=np.int64)
+        self.rater_codes = np.asarray(rater_codes, dtype=np.int64)
+        self.value_codes = np.asarray(value_codes, dtype=np.int64)
+        self.rater_count = rater_count
+        self.alphas_of = alphas_of
+        self.active = np.ones(len(self.unit_codes), dtype=bool)
+        if fixed_counts is None:
+            self.value_counts = value_counts_from_ratings(self.unit_codes, self.value_codes, value_count)
+            self.o, self.impact = leave_one_out_coincidences(
+                self.unit_codes, self.rater_codes, self.value_codes, value_count, rater_count
+            )
+        else:
+            self.value_counts = fixed_counts + value_counts_from_ratings(
+                self.unit_codes, self.value_codes, value_count, unit_count=len(fixed_counts)
+            )
+            self.o = np.zeros((value_count, value_count))
+            self.impact = np.zeros((rater_count, value_count, value_count))
+            self.add_units(np.arange(len(fixed_counts)), self.active, sign=1)
+        self.rater_cells = np.bincount(self.rater_codes, minlength=rater_count)
+
+    def alpha(self):
+        return self.alphas_of(self.o[np.newaxis])[0]
+
+    def alphas_without(self):
+        # Alpha without each rater. Raters without ratings leave it as is.
+        alphas = np.full(self.rater_count, self.alpha())
+        raters = np.flatnonzero(self.rater_cells > 0)
+        if len(raters):
+            alphas[raters] = self.alphas_of(self.o - self.impact[raters])
+        return alphas
+
+    def remove_rater(self, rater):
+        removed = self.active & (self.rater_codes == rater)
+        if not removed.any():
+            return
+        units = np.unique(self.unit_codes[removed])
+        affected = self.active & np.isin(self.unit_codes, units)
+        self.add_units(units, affected, sign=-1)
+        self.active &= ~removed
+        np.subtract.at(self.value_counts, (self.unit_codes[removed], self.value_codes[removed]), 1)
+        self.add_units(units, affected & ~removed, sign=1)
+        self.rater_cells[rater] = 0
+
+    def add_units(self, units, cells, sign):
+        self.o += sign * coincidences_from_value_counts(self.value_counts[units])
+        rater_codes = self.rater_codes[cells]
+        for i, j, delta in leave_one_out_deltas(self.value_counts, self.unit_codes[cells], self.value_codes[cells]):
+            self.impact[:, i, j] += sign * np.bincount(rater_codes, weights=delta, minlength=self.rater_count)
+
+def mean_alpha(alphas, axis=None):
+    # Mean of the alphas that are not nan, or nan if there are none.
+    valid = ~np.isnan(alphas)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, alphas, 0).sum(axis=axis) / valid.sum(axis=axis)
+
+class RaterPruning:
+    def __init__(self, target=None, max_removals=10, question=None):
+        self.target = target
+        self.max_removals = max_removals
+        self.question = question
+
+    def search(self, impacts):
+        # impacts: (label, IncrementalImpact) of every variable, all with
+        # the same rater codes. Returns the alphas before any removal and
+        # (rater, alphas) after every removal, and why the search stopped.
+        start = np.array([impact.alpha() for label, impact in impacts])
+        alphas = start
+        steps = []
+        removed = []
+        while True:
+            if self.target is not None and mean_alpha(alphas) >= self.target:
+                return start, steps, 'target reached'
+            if len(removed) >= self.max_removals:
+                return start, steps, 'maximum removals reached'
+            scores = mean_alpha(np.stack([impact.alphas_without() for label, impact in impacts]), axis=0)
+            scores[removed] = np.nan
+            if np.isnan(scores).all() or not np.nanmax(scores) > mean_alpha(alphas):
+                return start, steps, 'no removal raises alpha'
+            rater = int(np.nanargmax(scores))
+            for label, impact in impacts:
+                impact.remove_rater(rater)
+            removed.append(rater)
+            after = np.array([impact.alpha() for label, impact in impacts])
+            steps.append((rater, after))
+            alphas = after
+
+    def print_search(self, impacts, rater_names):
+        labels = [label for label, impact in impacts]
+        start_alphas, steps, stopped = self.search(impacts)
+        print("----Rater Pruning----")
+        print("Mean alpha of {} variables before removing raters: {:.3f}".format(len(labels), mean_alpha(start_alphas)))
+        for number, (rater, alphas) in enumerate(steps, 1):
+            print("{}. removed {}: mean alpha {:.3f} ({})".format(
+                number, rater_names[rater], mean_alpha(alphas),
+                ", ".join("{} {:.3f}".format(label, k_alpha) for label, k_alpha in zip(labels, alphas))))
+        print("Stopped: {}.".format(stopped))
+        print("----End Rater Pruning----")
+        return [(rater_names[rater], alphas) for rater, alphas in steps]
+
+def add_pruning_args(parser):
+    parser.add_argument(
+        '--prune-to',
+        type=float,
+        metavar='TARGET_ALPHA',
+        help='Remove the rater whose removal raises alpha most, one at a time, until alpha reaches TARGET_ALPHA.')
+    parser.add_argument(
+        '--max-removals',
+        type=int,
+        default=10,
+        help='Most raters --prune-to removes.')
+    parser.add_argument(
+        '--prune-question',
+        metavar='QUESTION_LABEL',
+        help='Only prune for this question (default: the mean alpha of all questions).')
+
+def pruning_from_args(args):
+    if args.prune_to is not None:
+        return RaterPruning(target=args.prune_to, max_removals=args.max_removals, question=args.prune_question)
+    return None
@@ -0,0 +1,296 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+import os
+import json
+import math
+import argparse
+import socketserver
+from functools import partial
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from hl_to_reliability import prepare_highlights, topic_order, alpha_for_topic
+from dh_to_reliability import load_data_hunt_schema, load_data_hunt, CheckboxVariable
+
+# A long running service answering reliability queries with JSON, so
+# dashboards do not pay for starting Python and parsing an export on
+# every request. Projects are loaded once, ready for alpha (negative
+# task runs added, overlaps trimmed, rows handed to their questions),
+# and kept in an LRU cache holding at most --memory-mb of arrays. An
+# export that changes on disk is loaded again. Every project memoizes
+# its results per topic or question and excluded raters.
+# Queries are answered one at a time, GET requests with parameters
+# input (the export), schema (Data Hunts only), topic or question
+# (default: all), and exclude (a contributor_uuid, repeatable):
+#   /alpha          alpha of every topic or question variable
+#   /rater-impact   Data Hunt alpha with all raters and without each one
+#   /projects       the cached projects and their size
+# Paths are relative to --data-dir, and must stay inside it.
+
+DEFAULT_MEMORY_MB = 2048
+RESULT_CACHE_ENTRIES = 4096
+
+class LRUCache:
+    def __init__(self, capacity, size_of=lambda value: 1):
+        # Holds values of total size at most capacity, as measured by
+        # size_of, evicting the least recently used first. The newest
+        # value is kept even if it alone is larger.
+        self.capacity = capacity
+        self.size_of = size_of
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        # The value for key, from compute() the first time.
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+        self.misses += 1
+        value = compute()
+        size = self.size_of(value)
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.capacity and len(self.entries) > 1:
+            evicted_value, evicted_size = self.entries.popitem(last=False)[1]
+            self.size -= evicted_size
+        return value
+
+def export_nbytes(export):
+    return (
+        sum(values.nbytes for values in export.columns.values())
+        + sum(names.nbytes for names in export.categories.values())
+    )
+
+class HighlighterProject:
+    def __init__(self, input_path, use_cache=True):
+        self.highlights, self.virtual_corpus_positions = prepare_highlights(input_path, use_cache=use_cache)
+        self.order, topic_ranges = topic_order(self.highlights)
+        self.topic_ranges = OrderedDict((topic_name, (start, end)) for topic_name, start, end in topic_ranges)
+        self.results = LRUCache(RESULT_CACHE_ENTRIES)
+
+    def nbytes(self):
+        return export_nbytes(self.highlights) + self.virtual_corpus_positions.nbytes + self.order.nbytes
+
+    def alphas(self, topic=None, exclude=()):
+        if topic is not None and topic not in self.topic_ranges:
+            raise LookupError("No highlights of topic '{}'.".format(topic))
+        topic_names = [topic] if topic is not None else list(self.topic_ranges)
+        return {
+            topic_name: self.results.get(
+                ('alpha', topic_name, frozenset(exclude)), partial(self.topic_alpha, topic_name, exclude)
+            )
+            for topic_name in topic_names
+        }
+
+    def topic_alpha(self, topic_name, exclude):
+        start, end = self.topic_ranges[topic_name]
+        rows = self.highlights.take(self.order[start:end])
+        if exclude:
+            excluded = np.flatnonzero(np.isin(self.highlights.categories['contributor_uuid'], list(exclude)))
+            rows = rows.take(np.flatnonzero(~np.isin(rows['contributor_uuid'], excluded)))
+        return alpha_for_topic(rows, self.virtual_corpus_positions)
+
+    def rater_impact(self, question=None):
+        raise ValueError("The rater impact report is only available for Data Hunts.")
+
+class DataHuntProject:
+    def __init__(self, schema_path, input_path, use_cache=True):
+        self.schema = load_data_hunt_schema(schema_path, use_cache=use_cache)
+        load_data_hunt(input_path, self.schema, use_cache=use_cache)
+        self.results = LRUCache(RESULT_CACHE_ENTRIES)
+
+    def nbytes(self):
+        return sum(export_nbytes(variable.data) for variable in self.schema.question_index.values())
+
+    def variables(self, question=None):
+        variables = [
+            variable for variable in self.schema.question_index.values()
+            if question is None or variable.label == question
+        ]
+        if not variables:
+            raise LookupError("No RADIO or CHECKBOX question labelled '{}'.".format(question))
+        return variables
+
+    def alphas(self, question=None, exclude=()):
+        # Alpha of every RADIO question and every CHECKBOX answer.
+        results = {}
+        for variable in self.variables(question):
+            results.update(self.results.get(
+                ('alpha', variable.label, frozenset(exclude)), partial(variable_alphas, variable, set(exclude))
+            ))
+        return results
+
+    def rater_impact(self, question=None):
+        results = {}
+        for variable in self.variables(question):
+            for label, alpha_with_all, alpha_without in self.results.get(
+                    ('rater_impact', variable.label), variable.rater_impacts):
+                results[label] = {'alpha': alpha_with_all, 'alpha_without': alpha_without}
+        return results
+
+def variable_alphas(variable, raters_to_exclude):
+    alpha = variable.alpha_for_question(raters_to_exclude)
+    if isinstance(variable, CheckboxVariable):
+        return {answer.label: answer_alpha for answer, answer_alpha in zip(variable.answers, alpha)}
+    return {variable.label: alpha}
+
+class ReliabilityService:
+    def __init__(self, data_dir='.', memory_mb=DEFAULT_MEMORY_MB, use_cache=True):
+        self.data_dir = os.path.realpath(data_dir)
+        self.use_cache = use_cache
+        self.projects = LRUCache(memory_mb << 20, size_of=lambda project: project.nbytes())
+
+    def answer(self, path, query):
+        # JSON ready result of a query, given its URL path and parameters
+        # as parsed by parse_qs.
+        if path == '/projects':
+            return {
+                'memory_mb': self.projects.size / (1 << 20),
+                'hits': self.projects.hits,
+                'misses': self.projects.misses,
+                'projects': [
+                    {'files': list(key[1]), 'memory_mb': size / (1 << 20)}
+                    for key, (project, size) in self.projects.entries.items()
+                ],
+            }
+        if path not in ('/alpha', '/rater-impact'):
+            raise LookupError("Unknown query '{}'.".format(path))
+        project = self.project(single_value(query, 'input'), single_value(query, 'schema'))
+        variable = single_value(query, 'topic') or single_value(query, 'question')
+        if path == '/alpha':
+            return {'alpha': project.alphas(variable, exclude=sorted(query.get('exclude', [])))}
+        return {'rater_impact': project.rater_impact(variable)}
+
+    def project(self, input_path, schema_path=None):
+        # A Data Hunt if there is a schema, else a Highlighter export.
+        if not input_path:
+            raise ValueError("The input parameter is required.")
+        paths = tuple(self.resolve(path) for path in (schema_path, input_path) if path)
+        stamps = tuple((os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in paths)
+        if schema_path:
+            load = partial(DataHuntProject, *paths, use_cache=self.use_cache)
+        else:
+            load = partial(HighlighterProject, *paths, use_cache=self.use_cache)
+        return self.projects.get((bool(schema_path), paths, stamps), load)
+
+    def resolve(self, path):
+        resolved = os.path.realpath(os.path.join(self.data_dir, path))
+        if os.path.commonpath((self.data_dir, resolved)) != self.data_dir:
+            raise ValueError("'{}' is outside the data directory.".format(path))
+        return resolved
+
+def single_value(query, name):
+    values = query.get(name)
+    return values[-1] if values else None
+
+def json_ready(value):
+    # NumPy values as plain Python ones, and nan alphas as null.
+    if isinstance(value, dict):
+        return {str(key): json_ready(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_ready(item) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+class QueryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            # The loaders and alpha functions print progress.
+            with redirect_stdout(io.StringIO()):
+                status, body = 200, self.server.service.answer(url.path, parse_qs(url.query))
+        except (LookupError, FileNotFoundError) as error:
+            status, body = 404, {'error': str(error)}
+        except ValueError as error:
+            status, body = 400, {'error': str(error)}
+        except Exception as error:
+            self.log_error("%s failed: %r", self.path, error)
+            status, body = 500, {'error': str(error)}
+        payload = json.dumps(json_ready(body)).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'local'
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+def make_server(service, host='127.0.0.1', port=0, socket_path=None):
+    if socket_path:
+        server = UnixHTTPServer(socket_path, QueryHandler)
+    else:
+        server = HTTPServer((host, port), QueryHandler)
+    server.service = service
+    return server
+
+def load_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-d', '--data-dir',
+        default='.',
+        help='Directory holding the exports and schemas queries may name.')
+    parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Address to listen on.')
+    parser.add_argument(
+        '-p', '--port',
+        type=int,
+        default=8765,
+        help='Port to listen on.')
+    parser.add_argument(
+        '--socket',
+        metavar='SOCKET_PATH',
+        help='Listen on this Unix socket instead of a port.')
+    parser.add_argument(
+        '--memory-mb',
+        type=int,
+        default=DEFAULT_MEMORY_MB,
+        help='Most memory the cached projects may hold, in MB.')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always parse the CSV files instead of using or writing a parse cache next to them.')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = load_args()
+    service = ReliabilityService(args.data_dir, memory_mb=args.memory_mb, use_cache=not args.no_cache)
+    server = make_server(service, host=args.host, port=args.port, socket_path=args.socket)
+    print("Serving reliability queries for '{}' on {}.".format(
+        service.data_dir, args.socket or "http://{}:{}".format(*server.server_address[:2])))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
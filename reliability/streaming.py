@@ -0,0 +1,59 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import csv
+import zlib
+import tempfile
+from contextlib import closing, contextmanager, ExitStack
+
+# For exports that do not fit in memory, rows are first split into
+# partition files on disk by hashing a key column (article_sha256 or
+# quiz_task_uuid), so every article or unit lands in exactly one
+# partition. Partitions can then be loaded and analyzed one at a time
+# and their coincidences added up. Rows keep their export order within
+# a partition, and only the requested columns are written.
+
+DEFAULT_PARTITIONS = 64
+
+@contextmanager
+def partitioned_csv(input_path, open_file, key_column, columns, partitions=DEFAULT_PARTITIONS, work_dir=None):
+    # Yields the paths of the partition files, which are deleted on exit.
+    with tempfile.TemporaryDirectory(prefix='tagworks-partitions-', dir=work_dir) as directory:
+        paths = [
+            os.path.join(directory, 'partition-{:04d}.csv'.format(partition))
+            for partition in range(partitions)
+        ]
+        with ExitStack() as stack:
+            writers = []
+            for path in paths:
+                partition_file = stack.enter_context(open(path, 'w', newline='', encoding='utf-8'))
+                writer = csv.writer(partition_file)
+                writer.writerow(columns)
+                writers.append(writer)
+            with closing(open_file(input_path)) as csv_file:
+                reader = csv.reader(csv_file)
+                header = next(reader, [])
+                missing = [name for name in columns if name not in header]
+                if missing:
+                    raise ValueError("Missing columns {} in CSV header.".format(", ".join(missing)))
+                indices = [header.index(name) for name in columns]
+                key_index = header.index(key_column)
+                for row in reader:
+                    partition = zlib.crc32(row[key_index].encode('utf-8')) % partitions
+                    writers[partition].writerow([row[index] for index in indices])
+        yield paths
+
+def open_partition(path):
+    return open(path, mode='rt', newline='', encoding='utf-8')
@@ -0,0 +1,236 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import csv
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+
+# Writes synthetic Highlighter and Data Hunt exports, with the columns
+# hl_to_reliability.py and dh_to_reliability.py read, for benchmarks
+# and tests. The same arguments and seed always write the same files.
+# Raters agree with a hidden reference answer with probability
+# `agreement`, so alphas land somewhere between chance and 1.
+
+HIGHLIGHTER_COLUMNS = (
+    'article_sha256', 'contributor_uuid', 'topic_name', 'start_pos', 'end_pos',
+    'taskrun_count', 'article_text_length', 'created',
+)
+DATA_HUNT_COLUMNS = ('answer_uuid', 'quiz_task_uuid', 'contributor_uuid', 'created')
+SCHEMA_COLUMNS = (
+    'answer_uuid', 'answer_label', 'question_type', 'question_label',
+    'question_uuid', 'alpha_distance', 'question_text',
+)
+ALPHA_DISTANCES = ('nominal', 'ordinal', 'interval')
+START_TIME = datetime(2021, 3, 1)
+
+def synthetic_id(kind, number):
+    # Stable uuid-looking id.
+    digest = hashlib.sha256('{}-{}'.format(kind, number).encode('ascii')).hexdigest()
+    return '{}-{}-{}-{}-{}'.format(digest[:8], digest[8:12], digest[12:16], digest[16:20], digest[20:32])
+
+def timestamp(minutes):
+    return (START_TIME + timedelta(minutes=int(minutes))).strftime('%Y-%m-%d %H:%M:%S')
+
+def write_highlighter_export(
+        output_path, articles=100, article_length=2000, raters=5, topics=4,
+        highlights_per_topic=3, overlap_rate=0.1, agreement=0.7, contributors=None, seed=0
+    ):
+    # Each article gets `raters` task runs. For every topic a rater
+    # highlights about highlights_per_topic spans, near the reference
+    # spans with probability `agreement`. With probability overlap_rate
+    # a span starts inside the rater's previous span, so remove_overlaps
+    # has something to trim.
+    rng = np.random.default_rng(seed)
+    contributors = contributors or raters * 4
+    contributor_uuids = [synthetic_id('contributor', number) for number in range(contributors)]
+    topic_names = ['Topic {}'.format(topic) for topic in range(topics)]
+    rows = 0
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(HIGHLIGHTER_COLUMNS)
+        for article in range(articles):
+            article_sha256 = hashlib.sha256('article-{}'.format(article).encode('ascii')).hexdigest()
+            length = max(1, int(rng.integers(article_length // 2, article_length * 3 // 2 + 1)))
+            span_length = max(1, length // (4 * max(1, highlights_per_topic * topics)))
+            reference_starts = rng.integers(0, length, size=(topics, highlights_per_topic))
+            article_raters = rng.choice(contributors, size=min(raters, contributors), replace=False)
+            for rater_number, contributor in enumerate(article_raters):
+                created = timestamp(article * 60 + rater_number * 7)
+                previous_end = None
+                for topic in range(topics):
+                    count = rng.poisson(highlights_per_topic)
+                    for highlight in range(count):
+                        if rng.random() < agreement:
+                            start = reference_starts[topic, highlight % highlights_per_topic]
+                            start += int(rng.integers(-span_length // 4, span_length // 4 + 1))
+                        else:
+                            start = int(rng.integers(0, length))
+                        if previous_end is not None and rng.random() < overlap_rate:
+                            start = previous_end - int(rng.integers(1, span_length + 1))
+                        start = int(min(max(start, 0), length - 1))
+                        end = min(length, start + int(rng.integers(span_length // 2, span_length * 2 + 1)))
+                        writer.writerow((
+                            article_sha256, contributor_uuids[contributor], topic_names[topic],
+                            start, end, raters, length, created,
+                        ))
+                        previous_end = end
+                        rows += 1
+    return rows
+
+def write_data_hunt_export(
+        schema_path, output_path, units=500, raters=5, questions=10, answers=4,
+        checkbox_questions=0, answer_rate=0.9, agreement=0.7, contributors=None, seed=0
+    ):
+    # RADIO questions T1.Q1 ... with answers A1 ..., followed by
+    # checkbox_questions CHECKBOX questions. The alpha distance cycles
+    # through nominal, ordinal and interval. Each unit gets `raters`
+    # task runs, and each rater answers each question with probability
+    # answer_rate. A CHECKBOX answer is chosen with probability 1/2.
+    rng = np.random.default_rng(seed)
+    contributors = contributors or raters * 4
+    contributor_uuids = [synthetic_id('contributor', number) for number in range(contributors)]
+    answer_uuids = [
+        [synthetic_id('answer', question * answers + answer) for answer in range(answers)]
+        for question in range(questions + checkbox_questions)
+    ]
+    with open(schema_path, 'w', newline='') as schema_file:
+        writer = csv.writer(schema_file)
+        writer.writerow(SCHEMA_COLUMNS)
+        for question in range(questions + checkbox_questions):
+            for answer in range(answers):
+                writer.writerow((
+                    answer_uuids[question][answer],
+                    'T1.Q{}.A{}'.format(question + 1, answer + 1),
+                    'RADIO' if question < questions else 'CHECKBOX',
+                    'T1.Q{}'.format(question + 1),
+                    synthetic_id('question', question),
+                    ALPHA_DISTANCES[question % len(ALPHA_DISTANCES)],
+                    'Synthetic question {}?'.format(question + 1),
+                ))
+    rows = 0
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(DATA_HUNT_COLUMNS)
+        for unit in range(units):
+            quiz_task_uuid = synthetic_id('quiz-task', unit)
+            reference_answers = rng.integers(0, answers, size=questions)
+            reference_choices = rng.random((checkbox_questions, answers)) < 0.5
+            unit_raters = rng.choice(contributors, size=min(raters, contributors), replace=False)
+            for rater_number, contributor in enumerate(unit_raters):
+                created = timestamp(unit * 30 + rater_number * 3)
+                answered = rng.random(questions) < answer_rate
+                agrees = rng.random(questions) < agreement
+                random_answers = rng.integers(0, answers, size=questions)
+                for question in np.flatnonzero(answered):
+                    answer = reference_answers[question] if agrees[question] else random_answers[question]
+                    writer.writerow((
+                        answer_uuids[question][answer], quiz_task_uuid, contributor_uuids[contributor], created,
+                    ))
+                    rows += 1
+                checkbox_answered = rng.random(checkbox_questions) < answer_rate
+                checkbox_agrees = rng.random((checkbox_questions, answers)) < agreement
+                random_choices = rng.random((checkbox_questions, answers)) < 0.5
+                choices = np.where(checkbox_agrees, reference_choices, random_choices)
+                for question, answer in zip(*np.nonzero(choices & checkbox_answered[:, np.newaxis])):
+                    writer.writerow((
+                        answer_uuids[questions + question][answer], quiz_task_uuid,
+                        contributor_uuids[contributor], created,
+                    ))
+                    rows += 1
+    return rows
+
+def load_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'kind',
+        choices=('highlighter', 'datahunt'),
+        help='Type of export to write.')
+    parser.add_argument(
+        '-o', '--output-file',
+        required=True,
+        help='Export CSV file to write.')
+    parser.add_argument(
+        '-s', '--schema-file',
+        help='Schema CSV file to write for datahunt.')
+    parser.add_argument(
+        '--articles',
+        type=int,
+        default=100,
+        help='Number of articles (highlighter) or units (datahunt).')
+    parser.add_argument(
+        '--article-length',
+        type=int,
+        default=2000,
+        help='Average article length in characters (highlighter).')
+    parser.add_argument(
+        '--raters',
+        type=int,
+        default=5,
+        help='Task runs per article or unit.')
+    parser.add_argument(
+        '--topics',
+        type=int,
+        default=4,
+        help='Number of topics (highlighter).')
+    parser.add_argument(
+        '--overlap-rate',
+        type=float,
+        default=0.1,
+        help='Probability that a highlight overlaps the same rater\'s previous one (highlighter).')
+    parser.add_argument(
+        '--questions',
+        type=int,
+        default=10,
+        help='Number of RADIO questions (datahunt).')
+    parser.add_argument(
+        '--checkbox-questions',
+        type=int,
+        default=0,
+        help='Number of CHECKBOX questions after the RADIO ones (datahunt).')
+    parser.add_argument(
+        '--answers',
+        type=int,
+        default=4,
+        help='Answers per question (datahunt).')
+    parser.add_argument(
+        '--agreement',
+        type=float,
+        default=0.7,
+        help='Probability that a rater gives the reference answer.')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Random seed.')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = load_args()
+    if args.kind == 'highlighter':
+        rows = write_highlighter_export(
+            args.output_file, articles=args.articles, article_length=args.article_length,
+            raters=args.raters, topics=args.topics, overlap_rate=args.overlap_rate,
+            agreement=args.agreement, seed=args.seed,
+        )
+    else:
+        if not args.schema_file:
+            raise SystemExit("--schema-file is required for datahunt exports.")
+        rows = write_data_hunt_export(
+            args.schema_file, args.output_file, units=args.articles, raters=args.raters,
+            questions=args.questions, answers=args.answers, checkbox_questions=args.checkbox_questions,
+            agreement=args.agreement, seed=args.seed,
+        )
+    print("Wrote {} rows to '{}'.".format(rows, args.output_file))
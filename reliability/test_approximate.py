@@ -0,0 +1,55 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+import numpy as np
+from synthetic_exports import write_highlighter_export, write_data_hunt_export
+from hl_to_reliability import split_highlighter
+from dh_to_reliability import calculate_alphas_for_datahunt, load_data_hunt_schema, load_data_hunt
+from approximate import Approximation
+
+def run(function, *args, **kwargs):
+    with redirect_stdout(io.StringIO()):
+        return dict(function(*args, **kwargs))
+
+def load_schema(schema_path, data_hunt_path):
+    schema = load_data_hunt_schema(schema_path, use_cache=False)
+    load_data_hunt(data_hunt_path, schema, use_cache=False)
+    return schema
+
+def test_approximate_alpha_of_everything_is_exact():
+    # A negative tolerance is never reached, so every unit is sampled.
+    approximation = Approximation(tolerance=-1, seed=3, first_batch=7)
+    with tempfile.TemporaryDirectory() as directory:
+        highlighter_path = os.path.join(directory, 'Highlighter.csv')
+        schema_path = os.path.join(directory, 'Schema.csv')
+        data_hunt_path = os.path.join(directory, 'DataHunt.csv')
+        write_highlighter_export(highlighter_path, articles=30, article_length=300, raters=3, topics=2, seed=1)
+        write_data_hunt_export(
+            schema_path, data_hunt_path, units=60, raters=3, questions=3, answers=3, checkbox_questions=1, seed=1
+        )
+        for function, args in (
+                (split_highlighter, (highlighter_path, None, None)),
+                (calculate_alphas_for_datahunt, (schema_path, data_hunt_path))):
+            exact = run(function, *args, use_cache=False)
+            approximate = run(function, *args, use_cache=False, approximation=approximation)
+            assert list(approximate) == list(exact)
+            assert np.allclose(list(approximate.values()), list(exact.values()))
+
+def test_approximate_alpha_stops_at_tolerance():
+    approximation = Approximation(tolerance=0.02, seed=3)
+    with tempfile.TemporaryDirectory() as directory:
+        schema_path = os.path.join(directory, 'Schema.csv')
+        data_hunt_path = os.path.join(directory, 'DataHunt.csv')
+        write_data_hunt_export(schema_path, data_hunt_path, units=5000, raters=3, questions=1, answers=3, seed=2)
+        exact = run(calculate_alphas_for_datahunt, schema_path, data_hunt_path, use_cache=False)
+        variable = next(iter(load_schema(schema_path, data_hunt_path).question_index.values()))
+    estimate = variable.approximate_alpha(approximation)
+    assert estimate.stopped == 'tolerance'
+    assert estimate.groups_used < estimate.group_count
+    assert 0 < estimate.standard_error <= 0.02
+    assert abs(estimate.alpha - exact[variable.label]) < 4 * estimate.standard_error
+
+if __name__ == "__main__":
+    test_approximate_alpha_of_everything_is_exact()
+    test_approximate_alpha_stops_at_tolerance()
@@ -0,0 +1,115 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+import numpy as np
+import csv
+import pytest
+from synthetic_exports import write_highlighter_export, write_data_hunt_export
+from hl_to_reliability import split_highlighter
+from dh_to_reliability import calculate_alphas_for_datahunt
+from arrow_io import load_arrow_columns, write_arrow_columns, ARROW_ROW_GROUP_ROWS
+from parse_cache import load_columns_cached
+from to_arrow import convert_export
+
+def run(function, *args, **kwargs):
+    with redirect_stdout(io.StringIO()):
+        return dict(function(*args, **kwargs))
+
+def test_arrow_exports_give_the_same_alphas():
+    pytest.importorskip('pyarrow')
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {name: os.path.join(directory, name) for name in (
+            'Highlighter.csv', 'Schema.csv', 'DataHunt.csv',
+            'Highlighter.parquet', 'Schema.arrow', 'DataHunt.parquet',
+        )}
+        write_highlighter_export(paths['Highlighter.csv'], articles=30, article_length=300, raters=3, topics=3, seed=7)
+        write_data_hunt_export(
+            paths['Schema.csv'], paths['DataHunt.csv'], units=60, raters=3, questions=3, answers=3,
+            checkbox_questions=1, seed=7
+        )
+        assert convert_export(paths['Highlighter.csv'], paths['Highlighter.parquet'])[0] == 'highlighter'
+        assert convert_export(paths['Schema.csv'], paths['Schema.arrow'])[0] == 'schema'
+        assert convert_export(paths['DataHunt.csv'], paths['DataHunt.parquet'])[0] == 'datahunt'
+        csv_alphas = run(split_highlighter, paths['Highlighter.csv'], None, None, use_cache=False)
+        arrow_alphas = run(split_highlighter, paths['Highlighter.parquet'], None, None, use_cache=False)
+        assert csv_alphas == arrow_alphas
+        topic = sorted(csv_alphas)[1]
+        for path in (paths['Highlighter.csv'], paths['Highlighter.parquet']):
+            assert run(split_highlighter, path, None, None, use_cache=False, topics=[topic]) == {topic: csv_alphas[topic]}
+        csv_alphas = run(calculate_alphas_for_datahunt, paths['Schema.csv'], paths['DataHunt.csv'], use_cache=False)
+        arrow_alphas = run(calculate_alphas_for_datahunt, paths['Schema.arrow'], paths['DataHunt.parquet'], use_cache=False)
+        assert list(csv_alphas) == list(arrow_alphas)
+        assert np.allclose(list(csv_alphas.values()), list(arrow_alphas.values()))
+        question = run(
+            calculate_alphas_for_datahunt, paths['Schema.arrow'], paths['DataHunt.parquet'],
+            use_cache=False, questions=['T1.Q2'],
+        )
+        assert list(question) == ['T1.Q2'] and np.isclose(question['T1.Q2'], csv_alphas['T1.Q2'])
+
+def test_filters_read_only_matching_rows():
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'Highlighter.csv')
+        parquet_path = os.path.join(directory, 'Highlighter.parquet')
+        write_highlighter_export(csv_path, articles=200, article_length=300, raters=3, topics=4, seed=8)
+        export = load_columns_cached(
+            csv_path, open, int_columns=('start_pos',), categorical_columns=('topic_name', 'contributor_uuid'),
+            use_cache=False,
+        )
+        # Sorted by topic, like a warehouse file, so filters skip row groups.
+        order = np.argsort(export['topic_name'], kind='stable')
+        write_arrow_columns(export.take(order), parquet_path, row_group_rows=100)
+        assert pyarrow.parquet.ParquetFile(parquet_path).num_row_groups > 4
+        topic = export.categories['topic_name'][2]
+        expected = load_columns_cached(
+            csv_path, open, int_columns=('start_pos',), categorical_columns=('topic_name', 'contributor_uuid'),
+            use_cache=False, filters={'topic_name': [topic]},
+        )
+        loaded = load_arrow_columns(
+            parquet_path, int_columns=('start_pos',), categorical_columns=('topic_name', 'contributor_uuid'),
+            filters={'topic_name': [topic]},
+        )
+        assert list(loaded.categories['topic_name']) == [topic]
+        for name in ('topic_name', 'contributor_uuid'):
+            assert list(loaded.categories[name]) == list(expected.categories[name])
+        expected_rows = sorted(zip(expected['start_pos'], expected.decode('contributor_uuid')))
+        assert sorted(zip(loaded['start_pos'], loaded.decode('contributor_uuid'))) == expected_rows
+    assert ARROW_ROW_GROUP_ROWS > 100
+
+def test_filtered_rows_match_a_smaller_export():
+    # filter_rows is what the Parquet and Arrow filters must match: the
+    # codes and categories of a CSV holding only the matching rows.
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'Highlighter.csv')
+        smaller_path = os.path.join(directory, 'Smaller.csv')
+        write_highlighter_export(csv_path, articles=60, article_length=300, raters=4, topics=4, seed=9)
+        with open(csv_path, newline='') as input_file:
+            rows = list(csv.DictReader(input_file))
+        topics = sorted({row['topic_name'] for row in rows})[1:3]
+        next(row for row in rows if row['topic_name'] in topics)['contributor_uuid'] = ''
+        with open(csv_path, 'w', newline='') as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        raters = sorted({row['contributor_uuid'] for row in rows})[:3]
+        with open(smaller_path, 'w', newline='') as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(row for row in rows if row['topic_name'] in topics and row['contributor_uuid'] in raters)
+        columns = dict(int_columns=('start_pos',), categorical_columns=('topic_name', 'contributor_uuid'), use_cache=False)
+        loaded = load_columns_cached(
+            csv_path, open, filters={'topic_name': topics, 'contributor_uuid': raters}, **columns
+        )
+        expected = load_columns_cached(smaller_path, open, **columns)
+    assert '' in list(loaded.categories['contributor_uuid'])
+    for name in ('topic_name', 'contributor_uuid'):
+        assert list(loaded.categories[name]) == list(expected.categories[name])
+        assert np.array_equal(loaded[name], expected[name])
+    assert np.array_equal(loaded['start_pos'], expected['start_pos'])
+
+if __name__ == "__main__":
+    test_arrow_exports_give_the_same_alphas()
+    test_filters_read_only_matching_rows()
+    test_filtered_rows_match_a_smaller_export()
@@ -0,0 +1,35 @@
+import os
+import io
+import tempfile
+from contextlib import redirect_stdout
+from batch_reliability import find_projects, run_batch
+from test_span_alpha import HIGHLIGHTER_CSV
+from test_rater_impact import SCHEMA_CSV, DATA_CSV
+
+def test_batch_finds_and_runs_projects():
+    with tempfile.TemporaryDirectory() as directory:
+        exports = {
+            'Claims-2021-03-29T1811-Highlighter.csv': HIGHLIGHTER_CSV,
+            'Strength-2021-03-29T1811-DataHunt.csv': DATA_CSV,
+            'Strength-Schema.csv': SCHEMA_CSV,
+        }
+        for filename, contents in exports.items():
+            with open(os.path.join(directory, filename), 'w') as export_file:
+                export_file.write(contents)
+        projects = find_projects(directory)
+        assert [(project.name, project.kind) for project in projects] == [
+            ('Claims-2021-03-29T1811-Highlighter', 'highlighter'),
+            ('Strength-2021-03-29T1811-DataHunt', 'datahunt'),
+        ]
+        assert projects[1].schema_file.endswith('Strength-Schema.csv')
+        output_dir = os.path.join(directory, 'output')
+        with redirect_stdout(io.StringIO()):
+            summary = run_batch(projects, output_dir, workers=2, use_cache=False)
+        assert os.path.exists(os.path.join(output_dir, 'Strength-2021-03-29T1811-DataHunt.log'))
+    assert [(row['project'][:5], row['variable']) for row in summary] == [
+        ('Claim', 'Claim'), ('Claim', 'Evidence'), ('Stren', 'T1.Q1'), ('Stren', 'T1.Q2'),
+    ]
+    assert all(row['status'] == 'ok' for row in summary)
+
+if __name__ == "__main__":
+    test_batch_finds_and_runs_projects()
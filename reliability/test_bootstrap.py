@@ -0,0 +1,25 @@
+import numpy as np
+from coincidences import (
+    value_counts_from_ratings, coincidences_from_value_counts, pair_count, alpha_from_coincidences,
+)
+from bootstrap import Bootstrap
+from test_kalpha import reliability_data
+
+def textbook_coincidences():
+    raters, units = np.nonzero(~np.isnan(reliability_data))
+    value_domain, value_codes = np.unique(reliability_data[raters, units], return_inverse=True)
+    value_counts = value_counts_from_ratings(units, value_codes, len(value_domain))
+    return coincidences_from_value_counts(value_counts), value_domain, pair_count(value_counts)
+
+def test_bootstrap_is_centered_on_alpha_and_seedable():
+    o, value_domain, pairs = textbook_coincidences()
+    k_alpha = alpha_from_coincidences(o, value_domain, 'nominal')
+    assert np.isclose(k_alpha, 0.743421052631579)
+    bootstrap = Bootstrap(20000, seed=7)
+    alphas = bootstrap.sample_alphas(o, value_domain, 'nominal', pairs)
+    assert alphas.shape == (20000,)
+    assert abs(alphas.mean() - k_alpha) < 0.01
+    assert np.array_equal(alphas, bootstrap.sample_alphas(o, value_domain, 'nominal', pairs))
+
+if __name__ == "__main__":
+    test_bootstrap_is_centered_on_alpha_and_seedable()
@@ -0,0 +1,99 @@
+import csv
+import io
+import numpy as np
+from krippendorff import alpha
+from columnar import load_columns
+from coincidences import missing_code
+from dh_to_reliability import Schema, CheckboxVariable, DATA_HUNT_CATEGORICAL_COLUMNS
+
+SCHEMA_CSV = """answer_uuid,answer_label,question_type,question_label,question_uuid,alpha_distance,question_text
+c11,T1.Q1.A1,CHECKBOX,T1.Q1,q1,nominal,Which apply?
+c12,T1.Q1.A2,CHECKBOX,T1.Q1,q1,nominal,Which apply?
+c13,T1.Q1.A3,CHECKBOX,T1.Q1,q1,nominal,Which apply?
+"""
+
+# r3 saw the question in t2 but chose nothing, which looks the same as
+# not seeing it, so r3 does not count for t2.
+DATA_CSV = """answer_uuid,quiz_task_uuid,contributor_uuid,created
+c11,t1,r1,2021-03-01 10:00:00
+c12,t1,r1,2021-03-01 10:00:00
+c11,t1,r2,2021-03-01 10:01:00
+c13,t1,r3,2021-03-01 10:02:00
+c12,t2,r1,2021-03-01 10:03:00
+c12,t2,r2,2021-03-01 10:04:00
+c11,t2,r4,2021-03-01 10:05:00
+c12,t2,r4,2021-03-01 10:05:00
+c11,t3,r3,2021-03-01 10:06:00
+c11,t3,r4,2021-03-01 10:07:00
+c13,t3,r1,2021-03-01 10:08:00
+c12,t4,r2,2021-03-01 10:09:00
+"""
+
+def load_variable():
+    schema = Schema()
+    schema.add_schema_rows(csv.DictReader(io.StringIO(SCHEMA_CSV)))
+    data = load_columns(io.StringIO(DATA_CSV), categorical_columns=DATA_HUNT_CATEGORICAL_COLUMNS)
+    schema.add_data_columns(data)
+    variable = schema.question_index['q1']
+    assert isinstance(variable, CheckboxVariable)
+    return variable
+
+def test_checkbox_alpha_matches_binary_reliability_matrices():
+    variable = load_variable()
+    reliability_codes = variable.to_reliability()
+    assert reliability_codes.shape == (3, 3, 4)
+    expected = []
+    for answer_codes in reliability_codes:
+        reliability_data = np.where(answer_codes == missing_code(answer_codes.dtype), np.nan, answer_codes)
+        expected.append(alpha(reliability_data=reliability_data, value_domain=[0, 1], level_of_measurement='nominal'))
+    assert np.allclose(variable.alpha_for_question(), expected)
+
+def test_checkbox_rater_impact_matches_recomputed_alpha():
+    variable = load_variable()
+    alphas_with_all, alphas_without = variable.rater_impact()
+    for contributor_uuid in variable.unique_raters():
+        expected = variable.alpha_for_question(raters_to_exclude=[contributor_uuid])
+        assert np.allclose(alphas_without[contributor_uuid], expected, equal_nan=True), contributor_uuid
+
+def padded_alphas(variable, padding, raters_to_exclude=()):
+    # Alpha of every answer from reliability matrices with padding[unit]
+    # extra rows of raters that chose nothing.
+    reliability_codes = variable.to_reliability(raters_to_exclude=set(raters_to_exclude))
+    reliability_data = np.where(reliability_codes == missing_code(reliability_codes.dtype), np.nan, reliability_codes)
+    negative_rows = np.where(np.arange(padding.max())[:, np.newaxis] < padding, 0.0, np.nan)
+    return [
+        alpha(reliability_data=np.vstack((answer_data, negative_rows)), value_domain=[0, 1], level_of_measurement='nominal')
+        for answer_data in reliability_data
+    ]
+
+def test_minimum_redundancy_matches_explicit_negative_raters():
+    variable = load_variable()
+    variable.minimum_redundancy = 4
+    # t1, t2 and t3 were seen by three raters, t4 by one.
+    padding = np.array([1, 1, 1, 3])
+    assert np.allclose(variable.alpha_for_question(), padded_alphas(variable, padding))
+    # Negative raters stay when a rater is left out.
+    alphas_with_all, alphas_without = variable.rater_impact()
+    assert np.allclose(alphas_with_all, padded_alphas(variable, padding))
+    for contributor_uuid in variable.unique_raters():
+        expected = padded_alphas(variable, padding, raters_to_exclude=[contributor_uuid])
+        assert np.allclose(alphas_without[contributor_uuid], expected, equal_nan=True), contributor_uuid
+
+def test_pruning_keeps_negative_raters():
+    variable = load_variable()
+    variable.minimum_redundancy = 4
+    padding = np.array([1, 1, 1, 3])
+    raters = variable.data.categories['contributor_uuid']
+    impacts = [impact for label, impact in variable.incremental_impacts(len(raters))]
+    assert np.allclose([impact.alpha() for impact in impacts], padded_alphas(variable, padding))
+    rater = int(np.flatnonzero(raters == 'r4')[0])
+    for impact in impacts:
+        impact.remove_rater(rater)
+    expected = padded_alphas(variable, padding, raters_to_exclude=['r4'])
+    assert np.allclose([impact.alpha() for impact in impacts], expected, equal_nan=True)
+
+if __name__ == "__main__":
+    test_checkbox_alpha_matches_binary_reliability_matrices()
+    test_checkbox_rater_impact_matches_recomputed_alpha()
+    test_minimum_redundancy_matches_explicit_negative_raters()
+    test_pruning_keeps_negative_raters()
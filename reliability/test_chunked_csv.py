@@ -0,0 +1,73 @@
+import io
+import os
+import csv
+import gzip
+import random
+import tempfile
+from contextlib import closing
+import numpy as np
+from columnar import load_columns
+from hl_to_reliability import gunzip_if_needed
+from chunked_csv import load_columns_parallel, record_ends
+
+COLUMNS = ('article_sha256', 'contributor_uuid', 'start_pos', 'comment')
+
+def export_rows(count, seed=0):
+    # Comments hold commas, doubled quotes and newlines inside quoted
+    # fields, and non ASCII text.
+    generator = random.Random(seed)
+    comments = ['plain', 'a, b', 'say "hi"', 'two\nlines', 'é\r\n"x",\ny', '']
+    for row in range(count):
+        yield [
+            'a{}'.format(generator.randrange(50)), 'r{}'.format(generator.randrange(9)),
+            str(generator.randrange(1000)), generator.choice(comments),
+        ]
+
+def write_export(input_path, rows, members=1):
+    # With members > 1, a gzip file of several members, like files
+    # compressed in parallel.
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+    writer.writerows(rows)
+    data = ('﻿' + text.getvalue()).encode('utf-8')
+    if not input_path.endswith('.gz'):
+        with open(input_path, 'wb') as export_file:
+            export_file.write(data)
+        return
+    step = len(data) // members + 1
+    with open(input_path, 'wb') as export_file:
+        for start in range(0, len(data), step):
+            export_file.write(gzip.compress(data[start:start + step]))
+
+def assert_same_columns(parsed, expected):
+    assert list(parsed.columns) == list(expected.columns)
+    for name in expected.columns:
+        assert np.array_equal(parsed[name], expected[name])
+    for name in expected.categories:
+        assert np.array_equal(parsed.categories[name], expected.categories[name])
+
+def test_record_ends_skip_newlines_in_quoted_fields():
+    data = b'a,"x\ny",1\nb,"""q""\n",2\nc'
+    assert record_ends(data).tolist() == [10, 23]
+
+def test_parallel_parse_matches_load_columns():
+    rows = list(export_rows(3000))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, members in (('Export.csv', 1), ('Export.csv.gz', 1), ('Export.csv.gz', 7)):
+            input_path = os.path.join(directory, name)
+            write_export(input_path, rows, members)
+            with closing(gunzip_if_needed(input_path)) as export_file:
+                expected = load_columns(
+                    export_file, int_columns=('start_pos',), categorical_columns=('comment', 'article_sha256'),
+                )
+            for chunk_bytes in (1 << 20, 997, 64):
+                parsed = load_columns_parallel(
+                    input_path, int_columns=('start_pos',), categorical_columns=('comment', 'article_sha256'),
+                    jobs=3, chunk_bytes=chunk_bytes,
+                )
+                assert_same_columns(parsed, expected)
+
+if __name__ == "__main__":
+    test_record_ends_skip_newlines_in_quoted_fields()
+    test_parallel_parse_matches_load_columns()
@@ -0,0 +1,39 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+from hl_to_reliability import update_highlighter, split_highlighter_streaming
+from bootstrap import Bootstrap
+from test_span_alpha import HIGHLIGHTER_CSV
+
+def alpha_lines(function, *args, **kwargs):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        function(*args, **kwargs)
+    return [line for line in output.getvalue().splitlines() if line.startswith(("Krippendorff", "Article count", "Bootstrap"))]
+
+def test_update_matches_full_run():
+    header, *rows = HIGHLIGHTER_CSV.splitlines()
+    first_export = [row for row in rows if not row.startswith('a3')]
+    # a3 is new, a2 gets another task run, a1 is unchanged.
+    second_export = rows + ["a2,r5,Claim,1,6,2,25,2021-03-04 09:00:00"]
+    # Claim is dropped, so a3 is removed; then the saved totals are read back.
+    third_export = [row for row in second_export if ',Claim,' not in row]
+    fourth_export = third_export + ["a2,r5,Evidence,12,20,2,25,2021-03-05 09:00:00"]
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'Export-Highlighter.csv')
+        state_path = os.path.join(directory, 'state.npz')
+        for export_rows in (first_export, second_export, third_export, fourth_export):
+            with open(input_path, 'w') as export_file:
+                export_file.write("\n".join([header] + export_rows) + "\n")
+            updated = alpha_lines(
+                update_highlighter, input_path, state_path, use_cache=False, bootstrap=Bootstrap(200, seed=1),
+            )
+            expected = alpha_lines(
+                split_highlighter_streaming, input_path, partitions=2, work_dir=directory,
+                bootstrap=Bootstrap(200, seed=1),
+            )
+            assert updated == expected
+
+if __name__ == "__main__":
+    test_update_matches_full_run()
@@ -1,5 +1,6 @@
 import numpy as np
 from krippendorff import alpha
+from coincidences import alpha_from_ratings, alpha_from_coincidences, coincidences_from_value_counts
 
 # Example from: Krippendorff, Klaus. "Content Analysis: An Introduction to Its Methodology".
 # Fourth Edition. 2019. SAGE Publishing.
@@ -13,7 +14,32 @@ reliability_data = np.array([
     [ 1.,  2.,  3.,  3.,  2.,  4.,  4.,  1.,  2.,  5.,  1.]
 ])
 
+def test_alpha_from_ratings_matches_krippendorff():
+    # The example above as (unit, value) pairs, and a random stack of
+    # variables, at every level of measurement.
+    raters, units = np.nonzero(~np.isnan(reliability_data))
+    value_domain, value_codes = np.unique(reliability_data[raters, units], return_inverse=True)
+    rng = np.random.default_rng(1)
+    stack = rng.integers(1, 4, (3, 5, 40)).astype(float)
+    stack[rng.random(stack.shape) < 0.2] = np.nan
+    for level_of_measurement in ('nominal', 'ordinal', 'interval', 'ratio'):
+        ratings_alpha = alpha_from_ratings(units, value_codes, value_domain, level_of_measurement)
+        expected = alpha(reliability_data=reliability_data, level_of_measurement=level_of_measurement)
+        assert np.isclose(ratings_alpha.alpha, expected)
+        assert ratings_alpha.pairable_values == 40
+        o = np.stack([
+            coincidences_from_value_counts((data[:, :, np.newaxis] == np.arange(1, 4)).sum(axis=0))
+            for data in stack
+        ])
+        expected = [
+            alpha(reliability_data=data, level_of_measurement=level_of_measurement, value_domain=[1, 2, 3])
+            for data in stack
+        ]
+        assert np.allclose(alpha_from_coincidences(o, [1, 2, 3], level_of_measurement), expected)
+
 if __name__ == "__main__":
+    test_alpha_from_ratings_matches_krippendorff()
+
     alpha_nominal = alpha(reliability_data=reliability_data,level_of_measurement='nominal')
     print(f"Nominal: {alpha_nominal}")
     assert(np.isclose(alpha_nominal, 0.743421052631579))
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import numpy as np
+import parse_cache
+from parse_cache import load_columns_cached, CACHE_SUFFIX
+
+EXPORT_CSV = """article_sha256,contributor_uuid,start_pos
+a1,r1,3
+a2,r2,5
+a1,r2,7
+"""
+
+def open_text(input_path):
+    return open(input_path, mode='rt', encoding='utf-8-sig')
+
+def load(input_path):
+    return load_columns_cached(
+        input_path, open_text,
+        int_columns=('start_pos',), categorical_columns=('article_sha256', 'contributor_uuid'),
+    )
+
+def test_cache_is_reused_until_export_changes():
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'Export-Highlighter.csv')
+        with open(input_path, 'w') as export_file:
+            export_file.write(EXPORT_CSV)
+        parsed = load(input_path)
+        assert os.path.exists(input_path + CACHE_SUFFIX)
+        cached = load(input_path)
+        assert np.array_equal(cached['start_pos'], [3, 5, 7])
+        assert np.array_equal(cached.decode('article_sha256'), parsed.decode('article_sha256'))
+        # Touching the export without changing it keeps the cache valid.
+        os.utime(input_path, ns=(0, 0))
+        assert np.array_equal(load(input_path)['start_pos'], [3, 5, 7])
+        with open(input_path, 'w') as export_file:
+            export_file.write(EXPORT_CSV.replace('a2,r2,5', 'a2,r2,6'))
+        assert np.array_equal(load(input_path)['start_pos'], [3, 6, 7])
+
+def test_touched_export_is_hashed_once():
+    hashed = []
+    file_sha256 = parse_cache.file_sha256
+    def counting_sha256(input_path):
+        hashed.append(input_path)
+        return file_sha256(input_path)
+    parse_cache.file_sha256 = counting_sha256
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'Export-Highlighter.csv')
+            with open(input_path, 'w') as export_file:
+                export_file.write(EXPORT_CSV)
+            load(input_path)
+            assert len(hashed) == 1
+            os.utime(input_path, ns=(0, 0))
+            assert np.array_equal(load(input_path)['start_pos'], [3, 5, 7])
+            assert len(hashed) == 2
+            assert np.array_equal(load(input_path)['start_pos'], [3, 5, 7])
+            assert len(hashed) == 2
+    finally:
+        parse_cache.file_sha256 = file_sha256
+
+if __name__ == "__main__":
+    test_cache_is_reused_until_export_changes()
+    test_touched_export_is_hashed_once()
@@ -0,0 +1,32 @@
+import io
+import os
+import json
+import tempfile
+from contextlib import redirect_stdout
+from hl_to_reliability import split_highlighter
+from profiling import profile
+from test_span_alpha import HIGHLIGHTER_CSV
+
+def test_profile_report_has_every_stage():
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'Export-Highlighter.csv')
+        report_path = os.path.join(directory, 'profile.json')
+        with open(input_path, 'w') as export_file:
+            export_file.write(HIGHLIGHTER_CSV)
+        output = io.StringIO()
+        with redirect_stdout(output), profile(report_path, detail_stage='remove_overlaps'):
+            split_highlighter(input_path, None, None, use_cache=False)
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+    stages = {record['name']: record for record in report['stages']}
+    assert list(stages) == [
+        'load', 'map_topic_names', 'add_missing_taskruns', 'cumulative_corpus_lengths',
+        'user_seq_per_article', 'remove_overlaps', 'output_separate_topics', 'topic_alpha',
+    ]
+    assert stages['topic_alpha']['calls'] == 2
+    assert stages['load']['array_bytes'] > 0
+    assert report['detail']['stage'] == 'remove_overlaps'
+    assert "----End Profile----" in output.getvalue()
+
+if __name__ == "__main__":
+    test_profile_report_has_every_stage()
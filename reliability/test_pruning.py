@@ -0,0 +1,69 @@
+import io
+import os
+import tempfile
+from functools import partial
+from contextlib import redirect_stdout
+import numpy as np
+from synthetic_exports import write_data_hunt_export
+from dh_to_reliability import load_data_hunt_schema, load_data_hunt
+from coincidences import leave_one_out_coincidences, alpha_from_coincidences
+from pruning import IncrementalImpact, RaterPruning, mean_alpha
+
+def test_removing_raters_matches_recomputation():
+    rng = np.random.default_rng(4)
+    unit_codes = np.repeat(np.arange(300), 4)
+    rater_codes = np.concatenate([rng.choice(10, 4, replace=False) for unit in range(300)])
+    value_codes = rng.integers(0, 3, len(unit_codes))
+    alphas_of = partial(alpha_from_coincidences, value_domain=[0, 1, 2], level_of_measurement='nominal')
+    impact = IncrementalImpact(unit_codes, rater_codes, value_codes, 3, 10, alphas_of)
+    kept = np.ones(len(unit_codes), dtype=bool)
+    for rater in (3, 7, 0):
+        predicted = impact.alphas_without()[rater]
+        impact.remove_rater(rater)
+        kept &= rater_codes != rater
+        o, loo = leave_one_out_coincidences(unit_codes[kept], rater_codes[kept], value_codes[kept], 3, 10)
+        assert np.allclose(impact.o, o)
+        assert np.allclose(impact.impact, loo)
+        assert np.isclose(impact.alpha(), predicted)
+
+def test_pruning_raises_mean_alpha_until_target():
+    with tempfile.TemporaryDirectory() as directory, redirect_stdout(io.StringIO()):
+        schema_path = os.path.join(directory, 'Schema.csv')
+        data_hunt_path = os.path.join(directory, 'DataHunt.csv')
+        write_data_hunt_export(
+            schema_path, data_hunt_path, units=200, raters=4, questions=2, answers=3, checkbox_questions=1, seed=5
+        )
+        schema = load_data_hunt_schema(schema_path, use_cache=False)
+        load_data_hunt(data_hunt_path, schema, use_cache=False)
+        rater_count = len(next(iter(schema.question_index.values())).data.categories['contributor_uuid'])
+        start = mean_alpha(np.array([
+            impact.alpha() for variable in schema.question_index.values()
+            for label, impact in variable.incremental_impacts(rater_count)
+        ]))
+        steps = schema.prune_raters(RaterPruning(target=start + 0.02, max_removals=5))
+    assert steps
+    means = [start] + [mean_alpha(alphas) for rater, alphas in steps]
+    assert all(before < after for before, after in zip(means, means[1:]))
+    assert len({rater for rater, alphas in steps}) == len(steps)
+    if len(steps) < 5:
+        assert means[-1] >= start + 0.02
+
+def test_search_returns_alphas_before_pruning():
+    rng = np.random.default_rng(6)
+    impacts = []
+    for question in range(2):
+        unit_codes = np.repeat(np.arange(200), 4)
+        rater_codes = np.concatenate([rng.choice(8, 4, replace=False) for unit in range(200)])
+        value_codes = np.where(rater_codes < 2, rng.integers(0, 3, len(unit_codes)), unit_codes % 3)
+        alphas_of = partial(alpha_from_coincidences, value_domain=[0, 1, 2], level_of_measurement='nominal')
+        impacts.append(('Q{}'.format(question), IncrementalImpact(unit_codes, rater_codes, value_codes, 3, 8, alphas_of)))
+    before = np.array([impact.alpha() for label, impact in impacts])
+    start, steps, stopped = RaterPruning(target=1.0, max_removals=3).search(impacts)
+    assert len(steps) > 1
+    assert np.allclose(start, before)
+    assert mean_alpha(steps[-1][1]) > mean_alpha(start)
+
+if __name__ == "__main__":
+    test_removing_raters_matches_recomputation()
+    test_pruning_raises_mean_alpha_until_target()
+    test_search_returns_alphas_before_pruning()
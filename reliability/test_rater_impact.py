@@ -0,0 +1,75 @@
+import csv
+import io
+import numpy as np
+from krippendorff import alpha
+from columnar import load_columns
+from coincidences import missing_code
+from dh_to_reliability import Schema, DATA_HUNT_CATEGORICAL_COLUMNS
+
+SCHEMA_CSV = """answer_uuid,answer_label,question_type,question_label,question_uuid,alpha_distance,question_text
+a11,T1.Q1.A1,RADIO,T1.Q1,q1,nominal,Is it a claim?
+a12,T1.Q1.A2,RADIO,T1.Q1,q1,nominal,Is it a claim?
+a13,T1.Q1.A3,RADIO,T1.Q1,q1,nominal,Is it a claim?
+a21,T1.Q2.A1,RADIO,T1.Q2,q2,ordinal,How strong?
+a22,T1.Q2.A2,RADIO,T1.Q2,q2,ordinal,How strong?
+a23,T1.Q2.A3,RADIO,T1.Q2,q2,ordinal,How strong?
+a24,T1.Q2.A4,RADIO,T1.Q2,q2,ordinal,How strong?
+"""
+
+DATA_CSV = """answer_uuid,quiz_task_uuid,contributor_uuid,created
+a11,t1,r1,2021-03-01 10:00:00
+a11,t1,r2,2021-03-01 10:01:00
+a12,t1,r3,2021-03-01 10:02:00
+a12,t2,r1,2021-03-01 10:03:00
+a12,t2,r2,2021-03-01 10:04:00
+a13,t2,r4,2021-03-01 10:05:00
+a13,t3,r3,2021-03-01 10:06:00
+a13,t3,r4,2021-03-01 10:07:00
+a11,t3,r4,2021-03-01 10:08:00
+a11,t4,r1,2021-03-01 10:09:00
+a21,t1,r1,2021-03-01 10:00:00
+a22,t1,r2,2021-03-01 10:01:00
+a22,t1,r3,2021-03-01 10:02:00
+a24,t2,r1,2021-03-01 10:03:00
+a23,t2,r2,2021-03-01 10:04:00
+a24,t2,r4,2021-03-01 10:05:00
+a21,t3,r3,2021-03-01 10:06:00
+a21,t3,r4,2021-03-01 10:07:00
+a22,t3,r2,2021-03-01 10:08:00
+"""
+
+def load_schema():
+    schema = Schema()
+    schema.add_schema_rows(csv.DictReader(io.StringIO(SCHEMA_CSV)))
+    data = load_columns(io.StringIO(DATA_CSV), categorical_columns=DATA_HUNT_CATEGORICAL_COLUMNS)
+    schema.add_data_columns(data)
+    return schema
+
+def test_rater_impact_matches_recomputed_alpha():
+    schema = load_schema()
+    raters = schema.unique_raters()
+    for variable in schema.question_index.values():
+        alpha_with_all, alpha_without = variable.rater_impact()
+        assert np.isclose(alpha_with_all, variable.alpha_for_question())
+        for contributor_uuid in raters:
+            expected = variable.alpha_for_question(raters_to_exclude=[contributor_uuid])
+            k_alpha = alpha_without.get(contributor_uuid, alpha_with_all)
+            assert np.isclose(k_alpha, expected, equal_nan=True), (variable.label, contributor_uuid)
+
+def test_compact_reliability_codes_match_float_matrix():
+    schema = load_schema()
+    for variable in schema.question_index.values():
+        value_domain = sorted(variable.values_map.values())
+        reliability_codes = variable.to_reliability()
+        assert reliability_codes.dtype == np.uint8
+        missing = reliability_codes == missing_code(reliability_codes.dtype)
+        reliability_data = np.where(missing, np.nan, np.asarray(value_domain)[np.where(missing, 0, reliability_codes)])
+        expected = alpha(
+            reliability_data=reliability_data, value_domain=value_domain,
+            level_of_measurement=variable.alpha_distance,
+        )
+        assert np.isclose(variable.alpha_for_question(), expected)
+
+if __name__ == "__main__":
+    test_rater_impact_matches_recomputed_alpha()
+    test_compact_reliability_codes_match_float_matrix()
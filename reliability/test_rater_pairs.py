@@ -0,0 +1,78 @@
+import io
+import os
+import tempfile
+from itertools import combinations
+from collections import defaultdict
+from contextlib import redirect_stdout
+import numpy as np
+from synthetic_exports import write_highlighter_export, write_data_hunt_export
+from hl_to_reliability import (
+    load_highlighter_columns, map_topic_names, add_missing_taskruns, cumulative_corpus_lengths,
+    user_seq_per_article, remove_overlaps, split_topics, topic_segments, NO_HIGHLIGHT,
+)
+from dh_to_reliability import load_data_hunt_schema, load_data_hunt
+from pairwise import span_rater_pairs, rating_rater_pairs
+
+def pair_dict(pairs):
+    return {
+        (a, b): (shared, disagreement) for a, b, shared, disagreement
+        in zip(pairs['rater_a'], pairs['rater_b'], pairs['shared'], pairs['disagreement'])
+    }
+
+def test_rating_rater_pairs_match_pair_loop():
+    with tempfile.TemporaryDirectory() as directory, redirect_stdout(io.StringIO()):
+        schema_path = os.path.join(directory, 'Schema.csv')
+        data_hunt_path = os.path.join(directory, 'DataHunt.csv')
+        write_data_hunt_export(schema_path, data_hunt_path, units=80, raters=4, questions=2, answers=4, seed=3)
+        schema = load_data_hunt_schema(schema_path, use_cache=False)
+        load_data_hunt(data_hunt_path, schema, use_cache=False)
+    distances = np.abs(np.subtract.outer(np.arange(4), np.arange(4))) ** 2
+    for variable in schema.question_index.values():
+        unit_codes, contributor_codes, value_codes = variable.encode_ratings(sorted(variable.values_map.values()))
+        ratings = defaultdict(dict)
+        for unit, contributor, value in zip(unit_codes, contributor_codes, value_codes):
+            ratings[unit][contributor] = value
+        expected = defaultdict(lambda: [0, 0])
+        for unit_ratings in ratings.values():
+            for a, b in combinations(sorted(unit_ratings), 2):
+                expected[a, b][0] += 1
+                expected[a, b][1] += distances[unit_ratings[a], unit_ratings[b]]
+        pairs = pair_dict(rating_rater_pairs(unit_codes, contributor_codes, value_codes, distances))
+        assert pairs == {key: tuple(value) for key, value in expected.items()}
+
+def test_span_rater_pairs_match_painted_characters():
+    with tempfile.TemporaryDirectory() as directory, redirect_stdout(io.StringIO()):
+        highlighter_path = os.path.join(directory, 'Highlighter.csv')
+        write_highlighter_export(highlighter_path, articles=12, article_length=200, raters=4, topics=2, seed=3)
+        with open(highlighter_path) as highlighter_file:
+            highlights = load_highlighter_columns(highlighter_file)
+        map_topic_names(highlights)
+        add_missing_taskruns(highlights)
+        cumulative_length, virtual_corpus_positions = cumulative_corpus_lengths(highlights)
+        user_seq_per_article(highlights)
+        remove_overlaps(highlights)
+        topics = list(split_topics(highlights))
+    for topic_name, rows in topics:
+        segments = topic_segments(rows, virtual_corpus_positions, show_skipped=False)
+        highlighted = segments['topic_number'] != NO_HIGHLIGHT
+        painted = defaultdict(lambda: np.zeros(cumulative_length, dtype=bool))
+        covered = defaultdict(lambda: np.zeros(cumulative_length, dtype=bool))
+        for article, contributor, start, end, chosen in zip(
+                segments['article_sha256'], segments['contributor_uuid'],
+                segments['start_pos'], segments['end_pos'], highlighted):
+            painted[article, contributor][start:end] = chosen
+            covered[article, contributor][start:end] = True
+        expected = defaultdict(lambda: [0, 0])
+        for (article, a), (other_article, b) in combinations(sorted(painted), 2):
+            if article == other_article:
+                expected[a, b][0] += int((covered[article, a] & covered[article, b]).sum())
+                expected[a, b][1] += int((painted[article, a] != painted[article, b]).sum())
+        pairs = pair_dict(span_rater_pairs(
+            segments['article_sha256'], segments['contributor_uuid'],
+            segments['start_pos'], segments['end_pos'], highlighted,
+        ))
+        assert pairs == {key: tuple(value) for key, value in expected.items()}, topic_name
+
+if __name__ == "__main__":
+    test_rating_rater_pairs_match_pair_loop()
+    test_span_rater_pairs_match_painted_characters()
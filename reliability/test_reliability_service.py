@@ -0,0 +1,68 @@
+import io
+import os
+import json
+import tempfile
+import threading
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from contextlib import redirect_stdout
+import numpy as np
+from synthetic_exports import write_highlighter_export, write_data_hunt_export
+from hl_to_reliability import split_highlighter
+from dh_to_reliability import load_data_hunt_schema, load_data_hunt
+from reliability_service import ReliabilityService, LRUCache, make_server
+
+def query(server, path, **parameters):
+    url = 'http://{}:{}{}?{}'.format(*server.server_address[:2], path, urlencode(parameters, doseq=True))
+    try:
+        with urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as error:
+        return error.code, json.loads(error.read())
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(10, size_of=len)
+    cache.get('a', lambda: 'aaaa')
+    cache.get('b', lambda: 'bbbb')
+    cache.get('a', lambda: 'never')
+    cache.get('c', lambda: 'cccc')
+    assert list(cache.entries) == ['a', 'c']
+    assert (cache.hits, cache.misses, cache.size) == (1, 3, 8)
+
+def test_service_answers_like_the_scripts():
+    with tempfile.TemporaryDirectory() as directory, redirect_stdout(io.StringIO()):
+        write_highlighter_export(os.path.join(directory, 'Highlighter.csv'), articles=30, raters=4, seed=2)
+        write_data_hunt_export(
+            os.path.join(directory, 'Schema.csv'), os.path.join(directory, 'DataHunt.csv'),
+            units=60, raters=4, questions=2, answers=3, checkbox_questions=1, seed=2,
+        )
+        expected_topics = dict(split_highlighter(os.path.join(directory, 'Highlighter.csv'), None, None, use_cache=False))
+        schema = load_data_hunt_schema(os.path.join(directory, 'Schema.csv'), use_cache=False)
+        load_data_hunt(os.path.join(directory, 'DataHunt.csv'), schema, use_cache=False)
+        radio = next(iter(schema.question_index.values()))
+        rater = radio.data.categories['contributor_uuid'][0]
+        server = make_server(ReliabilityService(directory, use_cache=False), port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            status, body = query(server, '/alpha', input='Highlighter.csv')
+            assert status == 200
+            assert np.allclose([body['alpha'][name] for name in expected_topics], list(expected_topics.values()))
+            data_hunt = {'input': 'DataHunt.csv', 'schema': 'Schema.csv'}
+            status, body = query(server, '/alpha', question=radio.label, exclude=[rater], **data_hunt)
+            assert np.isclose(body['alpha'][radio.label], radio.alpha_for_question({rater}))
+            status, body = query(server, '/rater-impact', question=radio.label, **data_hunt)
+            assert np.isclose(body['rater_impact'][radio.label]['alpha_without'][rater], radio.rater_impact()[1][rater])
+            assert query(server, '/alpha', question='T9.Q9', **data_hunt)[0] == 404
+            assert query(server, '/alpha', input='../Highlighter.csv')[0] == 400
+            status, body = query(server, '/projects')
+            assert (body['misses'], len(body['projects'])) == (2, 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+if __name__ == "__main__":
+    test_lru_cache_evicts_least_recently_used()
+    test_service_answers_like_the_scripts()
@@ -0,0 +1,129 @@
+import io
+import os
+import csv
+import gzip
+from contextlib import redirect_stdout
+import numpy as np
+from krippendorff import alpha
+from hl_to_reliability import (
+    load_highlighter_columns, map_topic_names, add_missing_taskruns, cumulative_corpus_lengths,
+    user_seq_per_article, remove_overlaps, split_topics, output_generator, alpha_for_topic,
+    topic_segments, ualpha_chunks, write_ualpha_segments, highlight_order, split_highlighter,
+)
+from columnar import sequence_raters
+from synthetic_exports import write_highlighter_export
+
+HIGHLIGHTER_CSV = """article_sha256,contributor_uuid,topic_name,start_pos,end_pos,taskrun_count,article_text_length,created
+a1,r1,Claim,0,10,3,40,2021-03-01 10:00:00
+a1,r1,Claim,5,18,3,40,2021-03-01 10:00:00
+a1,r2,Claim,2,12,3,40,2021-03-01 11:00:00
+a1,r3,Evidence,20,30,3,40,2021-03-01 12:00:00
+a1,r2,Evidence,22,35,3,40,2021-03-01 11:00:00
+a2,r2,Claim,0,7,2,25,2021-03-02 09:00:00
+a2,r4,Claim,3,9,2,25,2021-03-02 08:00:00
+a2,r4,Evidence,10,25,2,25,2021-03-02 08:00:00
+a3,r1,Claim,4,8,3,30,2021-03-03 09:00:00
+"""
+
+def load_topics():
+    highlights = load_highlighter_columns(io.StringIO(HIGHLIGHTER_CSV))
+    map_topic_names(highlights)
+    add_missing_taskruns(highlights)
+    cumulative_length, virtual_corpus_positions = cumulative_corpus_lengths(highlights)
+    maximum_raters = user_seq_per_article(highlights)
+    remove_overlaps(highlights, show_trims=False)
+    topics = dict(split_topics(highlights))
+    return topics, maximum_raters, cumulative_length, virtual_corpus_positions
+
+def dense_alpha(rows, maximum_raters, cumulative_length, virtual_corpus_positions):
+    # The original per-character reliability matrix.
+    reliability_data = np.full((maximum_raters, cumulative_length), np.nan)
+    for row_count, output_row in output_generator(rows, virtual_corpus_positions):
+        reliability_data[output_row['user_sequence_id']][output_row['start_pos']:output_row['end_pos']] = \
+            output_row['topic_number']
+    return alpha(reliability_data=reliability_data, level_of_measurement='nominal')
+
+def test_span_alpha_matches_per_character_alpha():
+    topics, maximum_raters, cumulative_length, virtual_corpus_positions = load_topics()
+    for topic_name, rows in topics.items():
+        expected = dense_alpha(rows, maximum_raters, cumulative_length, virtual_corpus_positions)
+        k_alpha = alpha_for_topic(rows, virtual_corpus_positions)
+        assert np.isclose(k_alpha, expected), topic_name
+
+def test_bulk_ualpha_writer_matches_dict_writer(tmp_path):
+    topics, maximum_raters, cumulative_length, virtual_corpus_positions = load_topics()
+    for topic_name, rows in topics.items():
+        expected = io.StringIO()
+        writer = csv.DictWriter(expected, fieldnames=[
+            'row_label', 'user_sequence_id', 'topic_number', 'empty_col', 'start_pos', 'end_pos',
+        ])
+        for row_count, output_row in output_generator(rows, virtual_corpus_positions):
+            writer.writerow(output_row)
+        segments = topic_segments(rows, virtual_corpus_positions)
+        assert b''.join(ualpha_chunks(segments, chunk_rows=3)).decode('ascii') == expected.getvalue()
+        output_path = os.path.join(str(tmp_path), topic_name + '.csv.gz')
+        write_ualpha_segments(segments, output_path, compress=True)
+        with gzip.open(output_path, 'rt', newline='') as output_file:
+            assert output_file.read() == expected.getvalue()
+
+def test_fused_sequencing_and_trimming(tmp_path):
+    input_path = os.path.join(tmp_path, 'Highlighter.csv')
+    trim_log_path = os.path.join(tmp_path, 'trims.csv')
+    write_highlighter_export(input_path, articles=40, article_length=200, raters=4, topics=3, seed=6)
+    with open(input_path, newline='') as input_file:
+        highlights = load_highlighter_columns(input_file)
+    map_topic_names(highlights)
+    expected_sequence, expected_maximum = sequence_raters(
+        highlights['article_sha256'], highlights['contributor_uuid'], highlights['created']
+    )
+    # Overlaps trimmed one task run and topic at a time.
+    expected_trims = []
+    rows = highlights.take(np.arange(len(highlights)))
+    for key in sorted(set(zip(rows['article_sha256'], rows['contributor_uuid'], rows['topic_name']))):
+        group = np.flatnonzero(
+            (rows['article_sha256'] == key[0]) & (rows['contributor_uuid'] == key[1]) & (rows['topic_name'] == key[2])
+        )
+        group = group[np.lexsort((group, rows['end_pos'][group], rows['start_pos'][group]))]
+        max_pos = None
+        for row in group:
+            start, end = int(rows['start_pos'][row]), int(rows['end_pos'][row])
+            if max_pos is not None and (start < max_pos or end < max_pos):
+                expected_trims.append((start, end, max(start, max_pos), max(end, max_pos)))
+            max_pos = end if max_pos is None else max(max_pos, end)
+    order = highlight_order(highlights)
+    assert user_seq_per_article(highlights, order) == expected_maximum
+    assert np.array_equal(highlights['user_sequence_id'], expected_sequence)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        remove_overlaps(highlights, trim_log_path=trim_log_path, order=order)
+    assert expected_trims
+    assert output.getvalue().startswith("Trimmed {} overlapping highlights".format(len(expected_trims)))
+    with open(trim_log_path, newline='') as trim_log:
+        logged = [
+            (int(row['start_pos']), int(row['end_pos']), int(row['trimmed_start_pos']), int(row['trimmed_end_pos']))
+            for row in csv.DictReader(trim_log)
+        ]
+    assert logged == expected_trims
+
+def test_one_topic_writes_the_same_ualpha_file(tmp_path):
+    input_path = os.path.join(tmp_path, 'Highlighter.csv')
+    write_highlighter_export(input_path, articles=40, article_length=300, raters=4, topics=3, seed=3)
+    full_dir = os.path.join(tmp_path, 'full')
+    topic_dir = os.path.join(tmp_path, 'topic')
+    os.mkdir(full_dir)
+    os.mkdir(topic_dir)
+    with redirect_stdout(io.StringIO()):
+        topic_name = split_highlighter(input_path, full_dir, 'uAlpha-{}.csv', use_cache=False)[1][0]
+        split_highlighter(input_path, topic_dir, 'uAlpha-{}.csv', use_cache=False, topics=[topic_name])
+    assert os.listdir(topic_dir) == ['uAlpha-{}.csv'.format(topic_name)]
+    with open(os.path.join(full_dir, 'uAlpha-{}.csv'.format(topic_name)), 'rb') as full_file, \
+            open(os.path.join(topic_dir, 'uAlpha-{}.csv'.format(topic_name)), 'rb') as topic_file:
+        assert topic_file.read() == full_file.read()
+
+if __name__ == "__main__":
+    import tempfile
+    test_span_alpha_matches_per_character_alpha()
+    with tempfile.TemporaryDirectory() as directory:
+        test_bulk_ualpha_writer_matches_dict_writer(directory)
+        test_fused_sequencing_and_trimming(directory)
+        test_one_topic_writes_the_same_ualpha_file(directory)
@@ -0,0 +1,26 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+from hl_to_reliability import split_highlighter_streaming, alpha_for_topic
+from test_span_alpha import HIGHLIGHTER_CSV, load_topics
+
+def test_streaming_matches_in_memory_alpha():
+    topics, maximum_raters, cumulative_length, virtual_corpus_positions = load_topics()
+    expected = [
+        "Krippendorff alpha is {:.3f} for '{}'".format(alpha_for_topic(rows, virtual_corpus_positions), topic_name)
+        for topic_name, rows in topics.items()
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'Export-Highlighter.csv')
+        with open(input_path, 'w') as export_file:
+            export_file.write(HIGHLIGHTER_CSV)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            split_highlighter_streaming(input_path, partitions=3, work_dir=directory)
+    lines = output.getvalue().splitlines()
+    assert [line for line in lines if line.startswith("Krippendorff")] == expected
+    assert "Article count: 3. Corpus character length: {}.".format(cumulative_length) in lines
+
+if __name__ == "__main__":
+    test_streaming_matches_in_memory_alpha()
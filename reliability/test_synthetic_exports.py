@@ -0,0 +1,34 @@
+import io
+import os
+import re
+import tempfile
+from contextlib import redirect_stdout
+from synthetic_exports import write_highlighter_export, write_data_hunt_export
+from hl_to_reliability import split_highlighter
+from dh_to_reliability import calculate_alphas_for_datahunt
+
+ALPHA_RE = re.compile(r"Krippendorff alpha (?:for '[^']*' )?is (-?\d\.\d+)")
+
+def run(function, *args, **kwargs):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        function(*args, **kwargs)
+    return [float(alpha) for alpha in ALPHA_RE.findall(output.getvalue())]
+
+def test_synthetic_exports_load():
+    with tempfile.TemporaryDirectory() as directory:
+        highlighter_path = os.path.join(directory, 'Highlighter.csv')
+        schema_path = os.path.join(directory, 'Schema.csv')
+        data_hunt_path = os.path.join(directory, 'DataHunt.csv')
+        write_highlighter_export(highlighter_path, articles=10, article_length=300, raters=3, topics=2, seed=1)
+        write_data_hunt_export(
+            schema_path, data_hunt_path, units=40, raters=3, questions=3, answers=3, checkbox_questions=2, seed=1
+        )
+        topic_alphas = run(split_highlighter, highlighter_path, None, None, use_cache=False)
+        question_alphas = run(calculate_alphas_for_datahunt, schema_path, data_hunt_path, use_cache=False)
+    assert len(topic_alphas) == 2
+    assert len(question_alphas) == 3 + 2 * 3
+    assert all(0 < k_alpha < 1 for k_alpha in topic_alphas + question_alphas)
+
+if __name__ == "__main__":
+    test_synthetic_exports_load()
@@ -0,0 +1,65 @@
+import io
+import os
+import csv
+import tempfile
+from contextlib import redirect_stdout
+import numpy as np
+from synthetic_exports import write_highlighter_export, write_data_hunt_export
+from hl_to_reliability import split_highlighter
+from dh_to_reliability import calculate_alphas_for_datahunt
+from coincidences import grouped_coincidences, grouped_disagreement
+
+def read_diagnostics(path):
+    rows = {}
+    with open(path, newline='') as diagnostics_file:
+        for row in csv.DictReader(diagnostics_file):
+            rows.setdefault(row['variable'], []).append(row)
+    return rows
+
+def check_diagnostics(alphas, rows):
+    # Units are ranked by disagreement, and add up to the variable's alpha.
+    for label, k_alpha in alphas.items():
+        variable_rows = rows[label]
+        pairable = np.array([float(row['pairable']) for row in variable_rows])
+        disagreement = np.array([float(row['disagreement']) for row in variable_rows])
+        local_alpha = np.array([float(row['local_alpha']) for row in variable_rows])
+        assert [int(row['rank']) for row in variable_rows] == list(range(1, len(variable_rows) + 1))
+        assert np.all(np.diff(disagreement) <= 1e-6)
+        assert np.isclose(sum(float(row['share']) for row in variable_rows), 1, atol=1e-4)
+        # Local alpha is 1 - D_unit / (pairable D_e), so the pairable
+        # weighted mean of local alphas is alpha.
+        assert np.isclose(np.average(local_alpha, weights=pairable), k_alpha, atol=1e-4)
+
+def test_grouped_disagreement_matches_grouped_coincidences():
+    rng = np.random.default_rng(2)
+    value_counts = rng.integers(0, 4, (200, 5))
+    group_codes = rng.integers(0, 7, 200)
+    weights = rng.integers(1, 10, 200)
+    distances = np.abs(np.subtract.outer(np.arange(5), np.arange(5))) ** 2
+    o = grouped_coincidences(value_counts, group_codes, 7, weights=weights)
+    pairable, disagreement = grouped_disagreement(value_counts, distances, group_codes, 7, weights=weights)
+    assert np.allclose(pairable, o.sum(axis=(1, 2)))
+    assert np.allclose(disagreement, (o * distances).sum(axis=(1, 2)))
+
+def test_unit_diagnostics_add_up_to_alpha():
+    with tempfile.TemporaryDirectory() as directory, redirect_stdout(io.StringIO()):
+        highlighter_path = os.path.join(directory, 'Highlighter.csv')
+        schema_path = os.path.join(directory, 'Schema.csv')
+        data_hunt_path = os.path.join(directory, 'DataHunt.csv')
+        diagnostics_path = os.path.join(directory, 'diagnostics.csv')
+        write_highlighter_export(highlighter_path, articles=20, article_length=300, raters=3, topics=2, seed=4)
+        alphas = dict(split_highlighter(
+            highlighter_path, None, None, use_cache=False, diagnostics_path=diagnostics_path
+        ))
+        check_diagnostics(alphas, read_diagnostics(diagnostics_path))
+        write_data_hunt_export(
+            schema_path, data_hunt_path, units=80, raters=4, questions=3, answers=4, checkbox_questions=1, seed=4
+        )
+        alphas = dict(calculate_alphas_for_datahunt(
+            schema_path, data_hunt_path, use_cache=False, diagnostics_path=diagnostics_path
+        ))
+        check_diagnostics(alphas, read_diagnostics(diagnostics_path))
+
+if __name__ == "__main__":
+    test_grouped_disagreement_matches_grouped_coincidences()
+    test_unit_diagnostics_add_up_to_alpha()
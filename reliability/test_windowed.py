@@ -0,0 +1,88 @@
+import io
+import os
+import csv
+import tempfile
+from contextlib import redirect_stdout
+import numpy as np
+from synthetic_exports import write_highlighter_export, write_data_hunt_export
+from hl_to_reliability import split_highlighter, windowed_highlighter
+from dh_to_reliability import calculate_alphas_for_datahunt, windowed_alphas_for_datahunt
+from windowed import TimeWindows
+
+def run(function, *args, **kwargs):
+    with redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+def write_units_in_window(input_path, output_path, window_start, window_end):
+    # The rows of the units whose latest task run is in the window.
+    with open(input_path, newline='') as input_file:
+        rows = list(csv.DictReader(input_file))
+    latest = {}
+    for row in rows:
+        latest[row['quiz_task_uuid']] = max(latest.get(row['quiz_task_uuid'], ''), row['created'])
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        for row in rows:
+            if window_start <= latest[row['quiz_task_uuid']][:10] < window_end:
+                writer.writerow(row)
+
+def test_one_window_matches_alpha_of_everything():
+    with tempfile.TemporaryDirectory() as directory:
+        highlighter_path = os.path.join(directory, 'Highlighter.csv')
+        write_highlighter_export(highlighter_path, articles=40, article_length=300, raters=3, topics=2, seed=1)
+        exact = run(split_highlighter, highlighter_path, None, None, use_cache=False)
+        rows = run(windowed_highlighter, highlighter_path, TimeWindows(365), use_cache=False)
+    assert [row['variable'] for row in rows] == [topic_name for topic_name, k_alpha in exact]
+    assert np.allclose([row['alpha'] for row in rows], [k_alpha for topic_name, k_alpha in exact])
+
+def test_sliding_windows_match_alpha_of_their_units():
+    with tempfile.TemporaryDirectory() as directory:
+        schema_path = os.path.join(directory, 'Schema.csv')
+        data_hunt_path = os.path.join(directory, 'DataHunt.csv')
+        window_path = os.path.join(directory, 'Window.csv')
+        write_data_hunt_export(
+            schema_path, data_hunt_path, units=300, raters=3, questions=2, answers=3, checkbox_questions=1, seed=1
+        )
+        rows = run(windowed_alphas_for_datahunt, schema_path, data_hunt_path, TimeWindows(2, 1), use_cache=False)
+        windows = sorted({(row['window_start'], row['window_end']) for row in rows})
+        assert len(windows) > 2
+        for window_start, window_end in windows:
+            write_units_in_window(data_hunt_path, window_path, window_start, window_end)
+            expected = run(calculate_alphas_for_datahunt, schema_path, window_path, use_cache=False)
+            window_alphas = [row['alpha'] for row in rows if row['window_start'] == window_start]
+            assert np.allclose(window_alphas, [k_alpha for label, k_alpha in expected]), window_start
+
+def test_units_without_created_time_are_left_out():
+    with tempfile.TemporaryDirectory() as directory:
+        schema_path = os.path.join(directory, 'Schema.csv')
+        data_hunt_path = os.path.join(directory, 'DataHunt.csv')
+        undated_path = os.path.join(directory, 'Undated.csv')
+        dated_path = os.path.join(directory, 'Dated.csv')
+        write_data_hunt_export(
+            schema_path, data_hunt_path, units=200, raters=3, questions=2, answers=3, checkbox_questions=1, seed=2
+        )
+        with open(data_hunt_path, newline='') as input_file:
+            rows = list(csv.DictReader(input_file))
+        units = sorted({row['quiz_task_uuid'] for row in rows})
+        undated = set(units[::4])
+        for path, keep in ((undated_path, True), (dated_path, False)):
+            with open(path, 'w', newline='') as output_file:
+                writer = csv.DictWriter(output_file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                for row in rows:
+                    if row['quiz_task_uuid'] not in undated:
+                        writer.writerow(row)
+                    elif keep:
+                        writer.writerow(dict(row, created=''))
+        output = io.StringIO()
+        with redirect_stdout(output):
+            window_alphas = windowed_alphas_for_datahunt(schema_path, undated_path, TimeWindows(365), use_cache=False)
+        expected = run(calculate_alphas_for_datahunt, schema_path, dated_path, use_cache=False)
+    assert "Left {} units without a created time".format(len(undated)) in output.getvalue()
+    assert np.allclose([row['alpha'] for row in window_alphas], [k_alpha for label, k_alpha in expected])
+
+if __name__ == "__main__":
+    test_one_window_matches_alpha_of_everything()
+    test_sliding_windows_match_alpha_of_their_units()
+    test_units_without_created_time_are_left_out()
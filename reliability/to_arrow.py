@@ -0,0 +1,83 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import argparse
+from contextlib import closing
+from columnar import load_columns
+from arrow_io import arrow_format, write_arrow_columns
+from batch_reliability import read_header, HIGHLIGHTER_HEADER, DATA_HUNT_HEADER, SCHEMA_HEADER
+from hl_to_reliability import HIGHLIGHTER_INT_COLUMNS, HIGHLIGHTER_CATEGORICAL_COLUMNS, gunzip_if_needed
+from dh_to_reliability import DATA_HUNT_CATEGORICAL_COLUMNS, SCHEMA_COLUMNS
+
+# Converts a Highlighter export, Data Hunt export or Data Hunt schema
+# from CSV to Parquet or Arrow IPC, keeping only the columns the tools
+# read, in the same row order.
+
+# (int columns, categorical columns) of every kind.
+EXPORT_COLUMNS = {
+    'highlighter': (HIGHLIGHTER_INT_COLUMNS, HIGHLIGHTER_CATEGORICAL_COLUMNS),
+    'datahunt': ((), DATA_HUNT_CATEGORICAL_COLUMNS),
+    'schema': ((), SCHEMA_COLUMNS),
+}
+
+def export_kind(input_path):
+    header = read_header(input_path)
+    if SCHEMA_HEADER <= header:
+        return 'schema'
+    if HIGHLIGHTER_HEADER <= header:
+        return 'highlighter'
+    if DATA_HUNT_HEADER <= header:
+        return 'datahunt'
+    raise ValueError("'{}' is not a Highlighter export, Data Hunt export or schema.".format(input_path))
+
+def convert_export(input_path, output_path, kind=None):
+    # Returns the kind of export and the number of rows written.
+    kind = kind or export_kind(input_path)
+    int_columns, categorical_columns = EXPORT_COLUMNS[kind]
+    with closing(gunzip_if_needed(input_path)) as csv_file:
+        export = load_columns(csv_file, int_columns=int_columns, categorical_columns=categorical_columns)
+    write_arrow_columns(export, output_path)
+    return kind, len(export)
+
+def load_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-i', '--input-file',
+        required=True,
+        help='CSV export or schema, optionally gzip compressed.')
+    parser.add_argument(
+        '-o', '--output-file',
+        help='Parquet (.parquet) or Arrow IPC (.arrow, .feather) file '
+             '(default: the input file name with .parquet).')
+    parser.add_argument(
+        '--kind',
+        choices=sorted(EXPORT_COLUMNS),
+        help='Kind of export (default: recognized from the CSV header).')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = load_args()
+    output_file = args.output_file
+    if not output_file:
+        output_file = args.input_file
+        for extension in ('.gz', '.csv'):
+            if output_file.endswith(extension):
+                output_file = output_file[:-len(extension)]
+        output_file += '.parquet'
+    if not arrow_format(output_file):
+        raise SystemExit("The output file must end in .parquet, .pq, .arrow, .feather or .ipc.")
+    kind, rows = convert_export(args.input_file, output_file, kind=args.kind)
+    print("Wrote {} rows of the {} export '{}' to '{}'.".format(
+        rows, kind, os.path.basename(args.input_file), output_file))
@@ -0,0 +1,133 @@
+#  Copyright 2021 Thusly, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import csv
+import numpy as np
+
+# Alpha over time. Every article or unit falls in the time bucket of its
+# latest created task run, buckets are step_days long, and a window is
+# window_days / step_days consecutive buckets. The coincidences are
+# added up once per bucket, and each window's coincidences are the
+# difference of two running totals over the buckets, so sliding the
+# window by a bucket adds one bucket and subtracts another instead of
+# recomputing anything.
+# Created values are read up to the seconds, so time zone suffixes and
+# fractions of seconds are ignored.
+
+WINDOW_COLUMNS = ('variable', 'window_start', 'window_end', 'units', 'alpha')
+
+class TimeWindows:
+    def __init__(self, window_days=7, step_days=None):
+        step_days = step_days or window_days
+        if window_days % step_days != 0:
+            raise ValueError("--window-days must be a multiple of --step-days.")
+        self.window_days = window_days
+        self.step_days = step_days
+        self.window_buckets = window_days // step_days
+        self.start = None
+
+    def bucket_codes(self, times):
+        # Bucket of every time, counted from midnight of the first day,
+        # and the number of buckets. NaT times get bucket -1, and callers
+        # leave those out (see print_undated).
+        present = ~np.isnat(times)
+        codes = np.full(len(times), -1, dtype=np.int64)
+        if not present.any():
+            self.start = None
+            return codes, 0
+        self.start = times[present].min().astype('datetime64[D]').astype('datetime64[s]')
+        step = np.timedelta64(self.step_days * 86400, 's')
+        codes[present] = (times[present] - self.start) // step
+        return codes, int(codes.max()) + 1
+
+    def window_totals(self, bucket_values):
+        # Totals of every window along the first (bucket) axis. If there
+        # are fewer buckets than a window, the one window is all of them.
+        window_buckets = min(self.window_buckets, len(bucket_values))
+        if window_buckets == 0:
+            return bucket_values
+        running = np.cumsum(np.concatenate((np.zeros_like(bucket_values[:1]), bucket_values)), axis=0)
+        return running[window_buckets:] - running[:-window_buckets]
+
+    def window_bounds(self, window_count):
+        # (start, end) date strings of every window, end exclusive.
+        step = np.timedelta64(self.step_days * 86400, 's')
+        window_buckets = self.window_buckets
+        return [
+            (str((self.start + window * step).astype('datetime64[D]')),
+             str((self.start + (window + window_buckets) * step).astype('datetime64[D]')))
+            for window in range(window_count)
+        ]
+
+def created_times(created_values):
+    return np.array([value[:19] for value in created_values], dtype='datetime64[s]')
+
+def group_times(export, group_column):
+    # Latest created time of every code of group_column, or NaT if the
+    # code has no rows. Created codes sort like the timestamps.
+    latest = np.full(len(export.categories[group_column]), -1, dtype=np.int64)
+    np.maximum.at(latest, export[group_column], export['created'])
+    times = np.full(len(latest), np.datetime64('NaT'), dtype='datetime64[s]')
+    present = latest >= 0
+    times[present] = created_times(export.categories['created'][latest[present]])
+    return times
+
+def print_undated(export, group_column, codes, unit_name):
+    # Number of codes of group_column with rows but no created time,
+    # which are in no bucket.
+    has_rows = np.bincount(export[group_column], minlength=len(codes)) > 0
+    undated = np.count_nonzero(has_rows & (codes < 0))
+    if undated:
+        print("Left {} {} without a created time out of the windows.".format(undated, unit_name))
+    return undated
+
+def window_rows(label, bounds, units, alphas):
+    return [
+        {'variable': label, 'window_start': start, 'window_end': end, 'units': int(unit_count), 'alpha': k_alpha}
+        for (start, end), unit_count, k_alpha in zip(bounds, units, alphas)
+    ]
+
+def print_window_rows(rows, unit_name):
+    label = None
+    for row in rows:
+        if row['variable'] != label:
+            label = row['variable']
+            print("----Windowed alpha for '{}'".format(label))
+        print("{} to {}: alpha {:.3f} from {} {}".format(
+            row['window_start'], row['window_end'], row['alpha'], row['units'], unit_name))
+
+def write_window_rows(rows, output_path):
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=WINDOW_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, alpha='{:.6f}'.format(row['alpha'])))
+
+def add_window_args(parser):
+    parser.add_argument(
+        '--window-days',
+        type=int,
+        help='Print alpha for every window of this many days, over the created time of the task runs.')
+    parser.add_argument(
+        '--step-days',
+        type=int,
+        help='Days between the starts of consecutive windows (default: --window-days, so windows do not overlap).')
+    parser.add_argument(
+        '--window-file',
+        help='Also write the windowed alphas to this CSV file.')
+
+def windows_from_args(args):
+    if args.window_days:
+        return TimeWindows(args.window_days, args.step_days)
+    return None